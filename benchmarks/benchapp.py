@@ -0,0 +1,37 @@
+from kivy.core.window import Window
+
+from ui.jukeboxkivyapp import JukeBoxKivyApp
+
+
+class BenchmarkApp(JukeBoxKivyApp):
+    """
+    The class 'BenchmarkApp' is the JukeBoxKivyApp with a fixed window size. It reports to
+    the latency driver when the information of a track is shown on the screen and starts
+    the driver when the services of the application are started.
+    """
+
+    def __init__(self, driver, width=1024, height=600):
+        """
+        Initialize self. See help(self) for accurate signature.
+        param driver: an instance of benchmarks.latency.LatencyDriver
+        param width: the width of the window
+        param height: the height of the window
+        """
+        super(BenchmarkApp, self).__init__()
+        self.driver = driver
+        self.width = width
+        self.height = height
+
+    def init_window(self):
+        """
+        This function set the window to the fixed benchmark size instead of the monitor size.
+        """
+        Window.size = (self.width, self.height)
+
+    def on_services_started(self, dt):
+        super(BenchmarkApp, self).on_services_started(dt)
+        self.driver.start(self)
+
+    def set_now_playing(self, now_playing, dt):
+        super(BenchmarkApp, self).set_now_playing(now_playing, dt)
+        self.driver.displayed(now_playing.get('id'), final=now_playing.get('final', True))
@@ -0,0 +1,12 @@
+#!/usr/bin/env python3
+
+import signal
+import sys
+
+"""
+The fakelibrespot.py stands in for librespot in the benchmarks. It accepts the command line
+of librespot and waits until it is terminated. The events are sent by the benchmark itself.
+"""
+
+signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+signal.pause()
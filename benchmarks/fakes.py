@@ -0,0 +1,391 @@
+import io
+import os
+import json
+import time
+import queue
+import select
+import threading
+import types
+
+from urllib.parse import urlparse, parse_qs
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class FakeMqttMessage:
+    """
+    The class 'FakeMqttMessage' has the members of paho.mqtt.client.MQTTMessage which are
+    used by the application.
+    """
+
+    def __init__(self, topic, payload, retain=False):
+        self.topic = topic
+        self.payload = payload
+        self.qos = 0
+        self.retain = retain
+
+
+class FakeMqttBroker:
+    """
+    The class 'FakeMqttBroker' is an in-process stand-in for the MQTT broker. Messages are
+    delivered to the subscribed clients by one delivery thread, like the network loop of a
+    paho client delivers them. Retained messages are delivered on subscribe.
+    module() returns an object which can replace the module paho.mqtt.client.
+    """
+
+    def __init__(self):
+        """
+        Initialize self. See help(self) for accurate signature.
+        """
+        self._lock_ = threading.Lock()
+        self._clients_ = []
+        self._retained_ = {}
+        self._queue_ = queue.SimpleQueue()
+        self._thread_ = threading.Thread(target=self._run_, name="bench-broker", daemon=True)
+        self._thread_.start()
+
+    def module(self):
+        """
+        This function return a replacement of the module paho.mqtt.client whose Client
+        is connected to this broker.
+        :return: a module like object
+        """
+        module = types.ModuleType('paho.mqtt.client')
+        module.Client = lambda *args, **kwargs: FakeMqttClient(self)
+        module.MQTTMessage = FakeMqttMessage
+        return module
+
+    def connect(self, client):
+        with self._lock_:
+            if client not in self._clients_:
+                self._clients_.append(client)
+        self._queue_.put((client.deliver_connect, ()))
+
+    def disconnect(self, client):
+        with self._lock_:
+            if client in self._clients_:
+                self._clients_.remove(client)
+
+    def subscribe(self, client, topic):
+        with self._lock_:
+            retained = [(t, p) for t, p in self._retained_.items() if self.matches(topic, t)]
+        for retained_topic, payload in retained:
+            self._queue_.put((client.deliver_message, (FakeMqttMessage(retained_topic, payload, retain=True),)))
+
+    def publish(self, topic, payload=None, retain=False):
+        """
+        This function publish a message to all clients which subscribed a matching topic.
+        param topic: the topic of the message
+        param payload: the payload as string or bytes
+        param retain: True if the message is retained for future subscribers
+        """
+        if isinstance(payload, str):
+            payload = payload.encode('utf-8')
+        elif payload is None:
+            payload = b''
+
+        with self._lock_:
+            if retain:
+                if payload:
+                    self._retained_[topic] = payload
+                else:
+                    self._retained_.pop(topic, None)
+            clients = list(self._clients_)
+
+        for client in clients:
+            if client.is_subscribed(topic):
+                self._queue_.put((client.deliver_message, (FakeMqttMessage(topic, payload),)))
+
+    @staticmethod
+    def matches(subscription, topic):
+        """
+        This function check if a topic matches a subscription with the wildcards + and #.
+        :return: True if the topic matches
+        """
+        sub_parts = subscription.split('/')
+        topic_parts = topic.split('/')
+        for index, part in enumerate(sub_parts):
+            if part == '#':
+                return True
+            if index >= len(topic_parts) or (part != '+' and part != topic_parts[index]):
+                return False
+        return len(sub_parts) == len(topic_parts)
+
+    def _run_(self):
+        while True:
+            callback, args = self._queue_.get()
+            try:
+                callback(*args)
+            except Exception as err:
+                print("bench-broker: {err}".format(err=err))
+
+
+class FakeMqttClient:
+    """
+    The class 'FakeMqttClient' has the functions of paho.mqtt.client.Client which are used
+    by the application. It is connected to a FakeMqttBroker.
+    """
+
+    def __init__(self, broker):
+        self.broker = broker
+        self.on_connect = None
+        self.on_message = None
+        self.on_disconnect = None
+        self._subscriptions_ = set()
+
+    def connect(self, host, port=1883, keepalive=60, **kwargs):
+        self.broker.connect(self)
+        return 0
+
+    def connect_async(self, host, port=1883, keepalive=60, **kwargs):
+        return self.connect(host, port, keepalive)
+
+    def reconnect_delay_set(self, min_delay=1, max_delay=120):
+        pass
+
+    def will_set(self, topic, payload=None, qos=0, retain=False):
+        pass
+
+    def loop_start(self):
+        return 0
+
+    def loop_stop(self, force=False):
+        return 0
+
+    def disconnect(self):
+        self.broker.disconnect(self)
+        if self.on_disconnect is not None:
+            self.on_disconnect(self, None, 0)
+        return 0
+
+    def subscribe(self, topic, qos=0):
+        self._subscriptions_.add(topic)
+        self.broker.subscribe(self, topic)
+        return 0, 1
+
+    def publish(self, topic, payload=None, qos=0, retain=False):
+        self.broker.publish(topic, payload, retain=retain)
+
+    def is_subscribed(self, topic):
+        return any(FakeMqttBroker.matches(subscription, topic) for subscription in self._subscriptions_)
+
+    def deliver_connect(self):
+        if self.on_connect is not None:
+            self.on_connect(self, None, {}, 0)
+
+    def deliver_message(self, message):
+        if self.on_message is not None:
+            self.on_message(self, None, message)
+
+
+class FakeMixer:
+    """
+    The class 'FakeMixer' has the functions of alsaaudio.Mixer which are used by the
+    MixerService. It keeps the volume in memory. The poll descriptor never gets ready.
+    """
+
+    def __init__(self, volume=50):
+        self._volume_ = volume
+        self._mute_ = 0
+        self._read_fd_, self._write_fd_ = os.pipe()
+
+    def getvolume(self):
+        return [self._volume_]
+
+    def setvolume(self, volume, channel=None):
+        self._volume_ = volume
+
+    def getmute(self):
+        return [self._mute_]
+
+    def setmute(self, mute):
+        self._mute_ = mute
+
+    def polldescriptors(self):
+        return [(self._read_fd_, select.POLLIN)]
+
+    def handleevents(self):
+        return 0
+
+
+class _FakeWebApiHandler(BaseHTTPRequestHandler):
+    """
+    The request handler of FakeWebApi. It answers the requests of spotipy with canned
+    JSON and serves the images.
+    """
+
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        self.rfile.read(length)
+        if urlparse(self.path).path == '/api/token':
+            self._send_json_(200, {'access_token': 'benchmark', 'token_type': 'Bearer', 'expires_in': 3600})
+        else:
+            self._send_json_(404, {'error': {'status': 404, 'message': 'not found'}})
+
+    def do_GET(self):
+        api = self.server.api
+        api.count(self.path)
+        if api.delay > 0:
+            time.sleep(api.delay)
+
+        url = urlparse(self.path)
+        parts = [part for part in url.path.split('/') if part]
+        query = parse_qs(url.query)
+
+        if parts[:1] == ['images'] and len(parts) == 2:
+            self._send_image_(parts[1])
+        elif parts[:2] == ['v1', 'tracks'] and len(parts) == 3:
+            track = api.track(parts[2])
+            if track is None:
+                self._send_json_(404, {'error': {'status': 404, 'message': 'Non existing id'}})
+            else:
+                self._send_json_(200, track)
+        elif parts[:2] == ['v1', 'episodes'] and len(parts) == 3:
+            episode = api.episode(parts[2])
+            if episode is None:
+                self._send_json_(404, {'error': {'status': 404, 'message': 'Non existing id'}})
+            else:
+                self._send_json_(200, episode)
+        elif parts[:2] == ['v1', 'artists'] and len(parts) == 3:
+            self._send_json_(200, api.artist(parts[2]))
+        elif parts[:2] == ['v1', 'artists'] and len(parts) == 2:
+            ids = query.get('ids', [''])[0].split(',')
+            self._send_json_(200, {'artists': [api.artist(artist_id) for artist_id in ids if artist_id]})
+        else:
+            self._send_json_(404, {'error': {'status': 404, 'message': 'Service not found'}})
+
+    def _send_json_(self, status, value):
+        body = json.dumps(value).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_image_(self, name):
+        body = self.server.api.image(name)
+        self.send_response(200)
+        self.send_header('Content-Type', 'image/jpeg')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class FakeWebApi:
+    """
+    The class 'FakeWebApi' is a local HTTP server which stands in for the Spotify Web API
+    and the image CDN. Every track ID is answered with a canned track of two artists, IDs
+    which start with 'episode' are answered as episodes. The images are JPEG files of the
+    requested size, e.g. /images/album-<id>-640.jpg. The IDs of albums and artists are
+    base62 like the Spotify IDs, spotipy rejects other IDs. An optional delay per request
+    simulates the network latency.
+    """
+
+    IMAGE_SIZES = (640, 300, 64)
+
+    def __init__(self, delay=0.0, host='127.0.0.1', port=0):
+        """
+        Initialize self. See help(self) for accurate signature.
+        param delay: the delay in seconds of every GET request
+        param host: the address to listen on
+        param port: the port to listen on, 0 selects a free port
+        """
+        self.delay = delay
+        self.requests = {}
+        self._lock_ = threading.Lock()
+        self._images_ = {}
+        self._server_ = ThreadingHTTPServer((host, port), _FakeWebApiHandler)
+        self._server_.daemon_threads = True
+        self._server_.api = self
+        self._thread_ = None
+
+    @property
+    def url(self):
+        host, port = self._server_.server_address[:2]
+        return "http://{host}:{port}".format(host=host, port=port)
+
+    def start(self):
+        self._thread_ = threading.Thread(target=self._server_.serve_forever, name="bench-webapi", daemon=True)
+        self._thread_.start()
+
+    def stop(self):
+        self._server_.shutdown()
+        self._server_.server_close()
+
+    def count(self, path):
+        kind = urlparse(path).path.split('/')[:3]
+        key = '/'.join(kind)
+        with self._lock_:
+            self.requests[key] = self.requests.get(key, 0) + 1
+
+    def images(self, prefix):
+        return [{'url': "{url}/images/{prefix}-{size}.jpg".format(url=self.url, prefix=prefix, size=size),
+                 'width': size, 'height': size} for size in self.IMAGE_SIZES]
+
+    def track(self, track_id):
+        if track_id.startswith('episode'):
+            return None
+        return {
+            'id': track_id,
+            'type': 'track',
+            'uri': "spotify:track:{id}".format(id=track_id),
+            'name': "Track {id}".format(id=track_id),
+            'album': {'id': "album{id}".format(id=track_id),
+                      'name': "Album {id}".format(id=track_id),
+                      'images': self.images("album-{id}".format(id=track_id))},
+            # spotipy rejects IDs which are not base62
+            'artists': [{'id': "artist{id}x{n}".format(id=track_id, n=n),
+                         'name': "Artist {n}".format(n=n),
+                         'type': 'artist'} for n in range(2)]
+        }
+
+    def episode(self, episode_id):
+        if not episode_id.startswith('episode'):
+            return None
+        return {
+            'id': episode_id,
+            'type': 'episode',
+            'uri': "spotify:episode:{id}".format(id=episode_id),
+            'name': "Episode {id}".format(id=episode_id),
+            'description': "The description of episode {id}. ".format(id=episode_id) * 8,
+            'images': self.images("episode-{id}".format(id=episode_id)),
+            'show': {'name': "Show {id}".format(id=episode_id),
+                     'publisher': "Publisher",
+                     'images': self.images("show-{id}".format(id=episode_id))}
+        }
+
+    def artist(self, artist_id):
+        return {
+            'id': artist_id,
+            'type': 'artist',
+            'name': "Artist {id}".format(id=artist_id),
+            'images': self.images(artist_id)
+        }
+
+    def image(self, name):
+        """
+        This function return the JPEG data of an image. The size is taken from the name,
+        the images of one size are generated once.
+        """
+        try:
+            size = int(os.path.splitext(name)[0].rsplit('-', 1)[1])
+        except (IndexError, ValueError):
+            size = 640
+
+        with self._lock_:
+            data = self._images_.get(size)
+        if data is None:
+            from PIL import Image
+
+            img = Image.new('RGB', (size, size))
+            img.putdata([((x * 255) // size, (y * 255) // size, 128) for y in range(size) for x in range(size)])
+            buffer = io.BytesIO()
+            img.save(buffer, format='JPEG', quality=90)
+            data = buffer.getvalue()
+            with self._lock_:
+                self._images_[size] = data
+        return data
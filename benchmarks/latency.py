@@ -0,0 +1,353 @@
+#!/usr/bin/env python3
+
+"""
+The latency.py measures the time from a librespot track event until the information and the
+background image of the track are shown by JukeBoxKivyApp. The application runs with local
+stand-ins for its dependencies (benchmarks/fakes.py):
+    FakeMqttBroker: an in-process MQTT broker which replaces paho.mqtt.client
+    FakeWebApi:     a local HTTP server with canned tracks, artists, episodes and images
+    FakeMixer:      an in-memory ALSA mixer
+    fakelibrespot:  a process which stands in for librespot
+The track events are sent to the event relay like the event gateway does.
+
+Scenarios:
+    cold:  every track is played the first time, the caches are empty
+    warm:  the tracks of the cold scenario are played again, all lookups are cache hits
+    skip:  bursts of fast track skips, the latency of the last track of a burst is measured
+
+Usage:
+    python3 -m benchmarks.latency [--runs 50] [--api-delay 30] [--output bench_output.txt]
+    python3 -m benchmarks.latency --smoke
+
+The smoke run plays a few tracks of the cold scenario and exits with status 1 if a track
+is not shown, e.g. because the fake Web API answers something the resolver rejects.
+
+Without a display the window is created with the SDL dummy driver, or run it with xvfb-run.
+"""
+
+import os
+import sys
+import json
+import math
+import time
+import types
+import shutil
+import socket
+import argparse
+import tempfile
+import threading
+import subprocess
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCHMARK_DIR))
+
+
+def percentile(values, percent):
+    """
+    This function return the percentile of the values by the nearest rank method.
+    param values: a list of numbers
+    param percent: the percentile between 0 and 100
+    :return: the percentile or None, if the list is empty
+    """
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, int(math.ceil(percent / 100.0 * len(ordered))))
+    return ordered[min(rank, len(ordered)) - 1]
+
+
+class LatencyDriver:
+    """
+    The class 'LatencyDriver' sends the track events of the scenarios and collects the time
+    until the application reports that the track is shown with its final background image.
+    The time until the information is shown first, e.g. with the preview image, is collected
+    separately. It runs in a background thread
+    and stops the application when all scenarios are done.
+    """
+
+    SCENARIOS = ('cold', 'warm', 'skip')
+    """ The scenarios in the order they are run """
+
+    def __init__(self, event_socket, runs, burst, gap, timeout, gateway=False, scenarios=None):
+        """
+        Initialize self. See help(self) for accurate signature.
+        param event_socket: the path of the Unix domain socket of the event relay
+        param runs: the number of measurements per scenario
+        param burst: the number of tracks of a skip burst
+        param gap: the time in seconds between two skips of a burst
+        param timeout: the time in seconds to wait for a track to be shown
+        param gateway: if True, the events are sent by running spotifyeventgateway.py
+        param scenarios: the names of the scenarios which are run, if None all are run
+        """
+        self.event_socket = event_socket
+        self.runs = runs
+        self.burst = burst
+        self.gap = gap
+        self.timeout = timeout
+        self.gateway = gateway
+        self.scenarios = tuple(scenarios) if scenarios is not None else self.SCENARIOS
+        self.results = {}
+        self.first_results = {}
+        self.stale = 0
+        self.timeouts = 0
+        self.app = None
+
+        self._lock_ = threading.Lock()
+        self._shown_ = {}
+        self._first_shown_ = {}
+        self._waiting_ = {}
+
+    def start(self, app):
+        """
+        This function is called by the application when it is running and start the scenarios.
+        param app: the running application
+        """
+        self.app = app
+        threading.Thread(target=self._run_, name="bench-driver", daemon=True).start()
+
+    def displayed(self, spotify_id, final=True):
+        """
+        This function is called by the application on the kivy thread when the information
+        of a track is shown. A track is shown when its final result is shown, the earlier
+        results, e.g. with the preview image, only record the time of the first display.
+        param spotify_id: the Spotify ID of the track
+        param final: True if the result is the final one of the metadata pipeline
+        """
+        now = time.perf_counter()
+        with self._lock_:
+            self._first_shown_.setdefault(spotify_id, now)
+            if not final:
+                return
+            self._shown_.setdefault(spotify_id, now)
+            event = self._waiting_.get(spotify_id)
+        if event is not None:
+            event.set()
+
+    def send(self, player_event, spotify_id):
+        """
+        This function send a librespot event to the event relay.
+        param player_event: the librespot PLAYER_EVENT, e.g. 'changed'
+        param spotify_id: the TRACK_ID of the event
+        """
+        event = {'PLAYER_EVENT': player_event, 'TRACK_ID': spotify_id}
+        if self.gateway:
+            env = dict(os.environ, JUKEBOX_EVENT_SOCKET=self.event_socket, **event)
+            gateway = os.path.join(os.path.dirname(BENCHMARK_DIR), 'spotify', 'spotifyeventgateway.py')
+            subprocess.Popen([sys.executable, gateway], env=env)
+        else:
+            with socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM) as sock:
+                sock.sendto(json.dumps(event).encode("utf-8"), self.event_socket)
+
+    def play(self, spotify_id):
+        """
+        This function send the track event of a track and wait until it is shown.
+        param spotify_id: the Spotify ID of the track
+        :return: a tuple of the times in seconds from the event until the track was shown
+            first and until its final result was shown, or None
+        """
+        event = threading.Event()
+        with self._lock_:
+            self._shown_.pop(spotify_id, None)
+            self._first_shown_.pop(spotify_id, None)
+            self._waiting_[spotify_id] = event
+
+        start = time.perf_counter()
+        self.send('changed', spotify_id)
+        shown = event.wait(self.timeout)
+
+        with self._lock_:
+            self._waiting_.pop(spotify_id, None)
+            end = self._shown_.get(spotify_id)
+            first = self._first_shown_.get(spotify_id, end)
+        if not shown or end is None:
+            self.timeouts += 1
+            return None
+        return first - start, end - start
+
+    def skip(self, spotify_ids):
+        """
+        This function send the track events of a burst of skips and wait until the last
+        track is shown. Tracks of the burst which are shown before the last one are counted
+        as stale.
+        param spotify_ids: the Spotify IDs of the burst
+        :return: the times of play() of the last track, or None
+        """
+        for spotify_id in spotify_ids[:-1]:
+            with self._lock_:
+                self._shown_.pop(spotify_id, None)
+                self._first_shown_.pop(spotify_id, None)
+            self.send('changed', spotify_id)
+            time.sleep(self.gap)
+
+        latency = self.play(spotify_ids[-1])
+        with self._lock_:
+            self.stale += sum(1 for spotify_id in spotify_ids[:-1] if spotify_id in self._first_shown_)
+        return latency
+
+    def record(self, scenario, latency):
+        if latency is not None:
+            first, final = latency
+            self.first_results.setdefault(scenario, []).append(first)
+            self.results.setdefault(scenario, []).append(final)
+
+    def _run_(self):
+        from kivy.clock import Clock
+
+        # wait until librespot and the event transport are running
+        time.sleep(1.0)
+        self.send('started', 'warmup')
+
+        tracks = ["episode{n:05d}".format(n=n) if n % 5 == 4 else "track{n:05d}".format(n=n)
+                  for n in range(self.runs)]
+        if 'cold' in self.scenarios:
+            for spotify_id in tracks:
+                self.record('cold', self.play(spotify_id))
+        if 'warm' in self.scenarios:
+            for spotify_id in tracks:
+                self.record('warm', self.play(spotify_id))
+        if 'skip' in self.scenarios:
+            for run in range(self.runs):
+                burst = ["skip{run:05d}x{n:02d}".format(run=run, n=n) for n in range(self.burst)]
+                self.record('skip', self.skip(burst))
+
+        def stop(dt):
+            self.app.on_request_close()
+            self.app.stop()
+
+        Clock.schedule_once(stop)
+
+    def report(self):
+        """
+        This function format the results as table. The percentiles are the times until the
+        final result is shown, the column first p50 is the median time until the track is
+        shown first, e.g. with the preview image.
+        :return: the report as string
+        """
+        lines = ["{0:<8} {1:>5} {2:>9} {3:>9} {4:>9} {5:>9} {6:>13}".format(
+            'scenario', 'n', 'p50 ms', 'p95 ms', 'p99 ms', 'max ms', 'first p50 ms')]
+        for scenario in self.scenarios:
+            values = [value * 1000.0 for value in self.results.get(scenario, [])]
+            first = [value * 1000.0 for value in self.first_results.get(scenario, [])]
+            if not values:
+                lines.append("{0:<8} {1:>5}".format(scenario, 0))
+                continue
+            lines.append("{0:<8} {1:>5} {2:>9.1f} {3:>9.1f} {4:>9.1f} {5:>9.1f} {6:>13.1f}".format(
+                scenario, len(values), percentile(values, 50), percentile(values, 95),
+                percentile(values, 99), max(values), percentile(first, 50)))
+        lines.append("timeouts: {timeouts}, stale tracks shown during skips: {stale}".format(
+            timeouts=self.timeouts, stale=self.stale))
+        return "\n".join(lines)
+
+
+def configure(workdir, args):
+    """
+    This function point the configuration to the working directory and the stand-ins. It must
+    be called before the modules of the application are imported, because they read the
+    configuration on import.
+    param workdir: the temporary working directory
+    param args: the parsed command line arguments
+    """
+    from system.configuration import Config
+
+    cfg = Config().parser
+    cfg.set('system', 'fullscreen', 'no')
+    cfg.set('system', 'logfile', os.path.join(workdir, 'jukebox.log'))
+    cfg.set('system', 'loglevel', args.log_level)
+    cfg.set('system', 'librespot', os.path.join(BENCHMARK_DIR, 'fakelibrespot.py'))
+    cfg.set('system', 'eventtransport', args.transport)
+    cfg.set('system', 'eventsocket', os.path.join(workdir, 'events.sock'))
+    cfg.set('spotify', 'cache', os.path.join(workdir, 'spotify_cache'))
+    cfg.set('spotify', 'clientid', 'benchmark')
+    cfg.set('spotify', 'clientsecret', 'benchmark')
+    cfg.set('spotify', 'metadatacache', os.path.join(workdir, 'metadata.db'))
+    cfg.set('spotify', 'backgroundcache', os.path.join(workdir, 'backgrounds'))
+    return cfg
+
+
+def install_fakes(api, broker):
+    """
+    This function replace the MQTT client, the Spotify API endpoints and the ALSA mixer of the
+    application with the stand-ins.
+    param api: an instance of FakeWebApi
+    param broker: an instance of FakeMqttBroker
+    """
+    from benchmarks.fakes import FakeMixer
+    from system.mixerservice import MixerService
+    from spotify.spotifyapiclient import SpotifyApiClient
+
+    client_module = broker.module()
+    mqtt_module = types.ModuleType('paho.mqtt')
+    mqtt_module.client = client_module
+    paho_module = types.ModuleType('paho')
+    paho_module.mqtt = mqtt_module
+    sys.modules.update({'paho': paho_module, 'paho.mqtt': mqtt_module, 'paho.mqtt.client': client_module})
+
+    client = SpotifyApiClient()
+    client.spotify.prefix = "{url}/v1/".format(url=api.url)
+    client.credentials.OAUTH_TOKEN_URL = "{url}/api/token".format(url=api.url)
+    SpotifyApiClient._instance_ = client
+
+    MixerService._instance_ = MixerService(mixer=FakeMixer())
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=50, help="measurements per scenario")
+    parser.add_argument('--burst', type=int, default=5, help="tracks per skip burst")
+    parser.add_argument('--gap', type=float, default=50, help="time between two skips in ms")
+    parser.add_argument('--api-delay', type=float, default=30, help="latency of the fake Web API in ms")
+    parser.add_argument('--timeout', type=float, default=10, help="time to wait for a track in s")
+    parser.add_argument('--transport', choices=('mqtt', 'socket'), default='mqtt', help="event transport")
+    parser.add_argument('--gateway', action='store_true', help="send the events by running the event gateway")
+    parser.add_argument('--log-level', default='error', help="log level of the application")
+    parser.add_argument('--output', help="write the report to this file, too")
+    parser.add_argument('--scenarios', nargs='+', choices=LatencyDriver.SCENARIOS, default=LatencyDriver.SCENARIOS,
+                        help="the scenarios which are run")
+    parser.add_argument('--smoke', action='store_true',
+                        help="play 3 tracks of the cold scenario and fail if a track is not shown")
+    args = parser.parse_args(argv)
+    if args.smoke:
+        args.runs = min(args.runs, 3)
+        args.scenarios = ('cold',)
+
+    os.environ.setdefault('KIVY_NO_ARGS', '1')
+    os.environ.setdefault('KIVY_NO_CONSOLELOG', '1')
+    if not os.environ.get('DISPLAY') and not os.environ.get('WAYLAND_DISPLAY'):
+        os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+        os.environ.setdefault('KIVY_GL_BACKEND', 'mock')
+
+    workdir = tempfile.mkdtemp(prefix='jukebox-bench-')
+    from benchmarks.fakes import FakeMqttBroker, FakeWebApi
+
+    api = FakeWebApi(delay=args.api_delay / 1000.0)
+    broker = FakeMqttBroker()
+    try:
+        cfg = configure(workdir, args)
+        api.start()
+        install_fakes(api, broker)
+
+        from benchmarks.benchapp import BenchmarkApp
+
+        driver = LatencyDriver(cfg.get('system', 'eventsocket'), runs=args.runs, burst=args.burst,
+                               gap=args.gap / 1000.0, timeout=args.timeout, gateway=args.gateway,
+                               scenarios=args.scenarios)
+        BenchmarkApp(driver).run()
+
+        report = driver.report()
+        report = "{report}\nWeb API requests: {requests}".format(report=report, requests=api.requests)
+        print(report)
+        if args.output:
+            with open(args.output, 'w') as fp:
+                fp.write(report + "\n")
+    finally:
+        api.stop()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    # a scenario without a measurement means that no track was shown
+    if driver.timeouts or not all(driver.results.get(scenario) for scenario in driver.scenarios):
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,6 +1,11 @@
 #!/usr/bin/env python3
 
-from ui.jukeboxkivyapp import JukeBoxKivyApp
+from system.startupprofiler import StartupProfiler
+
+# the profiler is created first, the times of the start are measured from here
+profiler = StartupProfiler.instance()
+with profiler.phase('imports'):
+    from ui.jukeboxkivyapp import JukeBoxKivyApp
 
 # the place to build the gui
 if __name__ == '__main__':
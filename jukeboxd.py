@@ -0,0 +1,7 @@
+#!/usr/bin/env python3
+
+from system.jukeboxdaemon import JukeBoxDaemon
+
+# the headless jukebox without user interface
+if __name__ == '__main__':
+    JukeBoxDaemon().run()
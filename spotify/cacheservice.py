@@ -0,0 +1,307 @@
+import os
+import json
+import signal
+import threading
+import urllib.error
+import urllib.parse
+import urllib.request
+
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from system.configuration import Config
+from system.logger import Logger
+from system.metrics import Metrics
+from system.singleflight import SingleFlight
+from spotify.metadataresolver import MetadataResolver
+from spotify.spotifyerror import SpotifyApiError, SpotifyApiUnavailable
+
+
+class _CacheServiceHandler(BaseHTTPRequestHandler):
+    """
+    The request handler of CacheService. It answers
+        GET /resolve?id=<Spotify URI or ID>  with the now playing dictionary as JSON
+        GET /image?url=<image URL>           with the image data
+    """
+
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        service = self.server.service
+        url = urllib.parse.urlparse(self.path)
+        query = urllib.parse.parse_qs(url.query)
+
+        try:
+            if url.path == '/resolve' and query.get('id'):
+                body = json.dumps(service.resolve(query['id'][0])).encode('utf-8')
+                self._send_(200, body, 'application/json')
+            elif url.path == '/image' and query.get('url'):
+                body = service.image(query['url'][0])
+                if body is None:
+                    self._send_(404, b'', 'text/plain')
+                else:
+                    self._send_(200, body, 'application/octet-stream')
+            else:
+                self._send_(404, b'', 'text/plain')
+
+        except SpotifyApiUnavailable as err:
+            headers = {'Retry-After': str(int(err.retry_after))} if err.retry_after else {}
+            self._send_(503, b'', 'text/plain', headers)
+        except Exception as err:
+            service.log.write(message="Request {0} failed: {1}", args=(self.path, err),
+                              module=service.name,
+                              level=Logger.ERROR)
+            self._send_(502, b'', 'text/plain')
+
+    def _send_(self, status, body, content_type, headers=None):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class CacheService:
+    """
+    The class 'CacheService' is a cache for the track information and the images which is
+    shared by several jukebox screens of a site. It is a HTTP server on the local network
+    which resolves Spotify IDs with its own metadata resolver and downloads the images from
+    the image CDN. Concurrent lookups of the same item are de-duplicated by single-flight,
+    so the Spotify API and the image CDN are requested once per item for all screens. The
+    downloaded images are kept in memory, least recently used images are removed when the
+    configured size is exceeded. Only images which are part of a resolved item are
+    downloaded, so the service can not be used as an open proxy.
+    The screens use the service by the option cacheservice of the section 'system'. The
+    service listens on the port of the option cacheserviceport and is started by
+        python3 -m spotify.cacheservice
+    """
+
+    DEFAULT_PORT = 8765
+    """ The default port of the cache service """
+
+    DEFAULT_IMAGE_CACHE_SIZE = 50
+    """ The default maximum size of the images in memory in MB """
+
+    MAX_KNOWN_URLS = 10000
+    """ The maximum number of image URLs of resolved items which are remembered """
+
+    def __init__(self, resolver=None, host='', port=None, image_cache_size=None):
+        """
+        Initialize self. See help(self) for accurate signature.
+        param resolver: an instance of MetadataResolver, if None a new one is created
+        param host: the address to listen on, an empty string listens on all interfaces
+        param port: the port to listen on, if None it is taken from the configuration
+        param image_cache_size: the maximum size of the images in memory in MB
+        """
+        self.log = Logger()
+        self.name = os.path.basename(__file__)
+        self.resolver = resolver if resolver is not None else MetadataResolver()
+        port = port if port is not None else Config().parser.getint('system', 'cacheserviceport',
+                                                                    fallback=self.DEFAULT_PORT)
+        image_cache_size = image_cache_size if image_cache_size is not None else self.DEFAULT_IMAGE_CACHE_SIZE
+        self.max_image_bytes = image_cache_size * 1024 * 1024
+
+        self._lock_ = threading.Lock()
+        self._resolve_flight_ = SingleFlight()
+        self._image_flight_ = SingleFlight()
+        self._images_ = OrderedDict()
+        self._image_bytes_ = 0
+        self._known_urls_ = OrderedDict()
+        self._server_ = ThreadingHTTPServer((host, port), _CacheServiceHandler)
+        self._server_.daemon_threads = True
+        self._server_.service = self
+        self._thread_ = None
+
+    @property
+    def url(self):
+        """
+        The URL of the service, e.g. http://127.0.0.1:8765
+        """
+        host, port = self._server_.server_address[:2]
+        return "http://{host}:{port}".format(host=host if host not in ('', '0.0.0.0') else '127.0.0.1', port=port)
+
+    def start(self):
+        """
+        This function start the server thread.
+        """
+        self._thread_ = threading.Thread(target=self._server_.serve_forever, name="jukebox-cache-service",
+                                         daemon=True)
+        self._thread_.start()
+        self.log.write(message="Cache service is listening on {0}", args=(self.url,),
+                       module=self.name,
+                       level=Logger.INFO)
+
+    def stop(self):
+        """
+        This function stop the server.
+        """
+        self._server_.shutdown()
+        self._server_.server_close()
+
+    def resolve(self, spotify_uri):
+        """
+        This function resolve a Spotify URI or ID. Concurrent lookups of the same item share
+        one resolution.
+        param spotify_uri: a Spotify URI or a Spotify track or episode ID
+        :return: the now playing dictionary of MetadataResolver.resolve()
+        """
+        now_playing, shared = self._resolve_flight_.do(spotify_uri, self.resolver.resolve, spotify_uri)
+        Metrics.instance().increment('jukebox_cache_service_requests_total',
+                                     {'endpoint': 'resolve', 'result': 'shared' if shared else 'resolved'})
+
+        with self._lock_:
+            for image in (now_playing.get('images') or []) + (now_playing.get('cover') or []):
+                self._known_urls_[image.get('url')] = True
+                self._known_urls_.move_to_end(image.get('url'))
+            while len(self._known_urls_) > self.MAX_KNOWN_URLS:
+                self._known_urls_.popitem(last=False)
+        return now_playing
+
+    def image(self, url):
+        """
+        This function return the data of an image of a resolved item. The image is
+        downloaded once, concurrent requests of the same image share the download.
+        param url: the URL of the image
+        :return: the image data as bytes or None, if the image is unknown or the download failed
+        """
+        metrics = Metrics.instance()
+        with self._lock_:
+            if url not in self._known_urls_:
+                return None
+            data = self._images_.get(url)
+            if data is not None:
+                self._images_.move_to_end(url)
+
+        if data is not None:
+            metrics.increment('jukebox_cache_service_requests_total', {'endpoint': 'image', 'result': 'hit'})
+            return data
+
+        data, shared = self._image_flight_.do(url, self._download_, url)
+        metrics.increment('jukebox_cache_service_requests_total',
+                          {'endpoint': 'image', 'result': 'shared' if shared else 'miss'})
+        return data
+
+    def _download_(self, url):
+        """
+        This function download an image and keep it in memory.
+        param url: the URL of the image
+        :return: the image data as bytes or None
+        """
+        try:
+            with urllib.request.urlopen(url, timeout=10) as response:
+                data = response.read()
+        except Exception as err:
+            self.log.write(message="Unable to download {0}: {1}", args=(url, err),
+                           module=self.name,
+                           level=Logger.ERROR)
+            return None
+
+        with self._lock_:
+            if url not in self._images_:
+                self._images_[url] = data
+                self._image_bytes_ += len(data)
+            while self._image_bytes_ > self.max_image_bytes and len(self._images_) > 1:
+                _, removed = self._images_.popitem(last=False)
+                self._image_bytes_ -= len(removed)
+        return data
+
+
+class CacheServiceClient:
+    """
+    The class 'CacheServiceClient' resolves the track information and downloads the images
+    through a CacheService. It has the function resolve() of MetadataResolver, so it can
+    replace the resolver of the metadata pipeline. If the service is not reachable, the
+    fallback resolver is used and the image is downloaded directly.
+    """
+
+    DEFAULT_TIMEOUT = 5.0
+    """ The default time in seconds to wait for an answer of the service """
+
+    def __init__(self, url, fallback=None, timeout=None):
+        """
+        Initialize self. See help(self) for accurate signature.
+        param url: the URL of the service, e.g. http://jukebox-cache:8765
+        param fallback: an instance of MetadataResolver which is used if the service is not
+            reachable, or None
+        param timeout: the time in seconds to wait for an answer of the service
+        """
+        self.log = Logger()
+        self.name = os.path.basename(__file__)
+        self.url = url.rstrip('/')
+        self.fallback = fallback
+        self.timeout = timeout if timeout is not None else self.DEFAULT_TIMEOUT
+
+    @staticmethod
+    def from_config(fallback=None):
+        """
+        This function create a client of the configured service.
+        param fallback: an instance of MetadataResolver which is used if the service is not reachable
+        :return: an instance of CacheServiceClient or None, if no service is configured
+        """
+        url = Config().parser.get('system', 'cacheservice', fallback='')
+        return CacheServiceClient(url, fallback=fallback) if url else None
+
+    def _get_(self, path, **params):
+        """
+        This function send a GET request to the service.
+        param path: the path of the request, e.g. /resolve
+        param params: the query parameters
+        :return: the body of the response as bytes
+        """
+        url = "{url}{path}?{query}".format(url=self.url, path=path, query=urllib.parse.urlencode(params))
+        with urllib.request.urlopen(url, timeout=self.timeout) as response:
+            return response.read()
+
+    def resolve(self, spotify_uri):
+        """
+        This function resolve a Spotify URI or ID by the service.
+        param spotify_uri: a Spotify URI or a Spotify track or episode ID
+        :return: the now playing dictionary of MetadataResolver.resolve()
+        """
+        try:
+            return json.loads(self._get_('/resolve', id=spotify_uri))
+
+        except urllib.error.HTTPError as err:
+            if err.code == 503:
+                retry_after = err.headers.get('Retry-After') if err.headers is not None else None
+                raise SpotifyApiUnavailable(retry_after=float(retry_after) if retry_after else None)
+            raise SpotifyApiError("Cache service: {err}".format(err=err))
+
+        except (OSError, ValueError) as err:
+            if self.fallback is None:
+                raise SpotifyApiError("Cache service: {err}".format(err=err))
+            self.log.write(message="Cache service not reachable ({0}), resolve {1} locally", args=(err, spotify_uri),
+                           module=self.name,
+                           level=Logger.ERROR)
+            return self.fallback.resolve(spotify_uri)
+
+    def download(self, url):
+        """
+        This function download an image by the service.
+        param url: the URL of the image
+        :return: the image data as bytes or None, if the service does not provide the image
+        """
+        try:
+            return self._get_('/image', url=url)
+        except (OSError, ValueError) as err:
+            self.log.write(message="Unable to get {0} from the cache service: {1}", args=(url, err),
+                           module=self.name,
+                           level=Logger.DEBUG)
+            return None
+
+
+if __name__ == '__main__':
+    stop_event = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *args: stop_event.set())
+    signal.signal(signal.SIGINT, lambda *args: stop_event.set())
+
+    service = CacheService()
+    service.start()
+    while not stop_event.wait(1.0):
+        pass
+    service.stop()
@@ -0,0 +1,136 @@
+import os
+import json
+import socket
+import threading
+
+from system.logger import Logger
+
+
+class EventRelay:
+    """
+    The class 'EventRelay' is a long-lived receiver for librespot events. The event gateway
+    script, which is started by librespot for every event, sends the event as one JSON encoded
+    datagram to the Unix domain socket of the relay, instead of connecting to the MQTT broker
+    itself. The relay passes every received event to its callback.
+    """
+
+    ENV_SOCKET = "JUKEBOX_EVENT_SOCKET"
+    """ The environment variable which tells the event gateway the path of the socket """
+
+    EVENT_VARIABLES = ('PLAYER_EVENT', 'TRACK_ID', 'OLD_TRACK_ID', 'DURATION_MS', 'POSITION_MS', 'VOLUME',
+                       'ITEM_TYPE', 'URI')
+    """ The environment variables of librespot which are forwarded by the event gateway """
+
+    MAX_DATAGRAM_SIZE = 65536
+
+    def __init__(self, path, callback):
+        """
+        Initialize self. See help(self) for accurate signature.
+        param path: the path of the Unix domain socket
+        param callback: a callable which is called with the event as dictionary
+        """
+        self.log = Logger()
+        self.name = os.path.basename(__file__)
+        self.path = path
+        self.callback = callback
+        self._socket_ = None
+        self._thread_ = None
+        self._running_ = False
+
+    @staticmethod
+    def topics(event):
+        """
+        This function map a librespot event to the MQTT topics and payloads which the event
+        gateway publishes.
+        param event: the event as dictionary of librespot environment variables
+        :return: a list of tuples (topic, payload)
+        """
+        messages = []
+        player_event = event.get('PLAYER_EVENT')
+        track_id = EventRelay.track_uri(event)
+        if player_event is not None:
+            messages.append(("spotify/player_event", player_event))
+        if track_id is not None:
+            # the track id of a preloading event belongs to the next track, not to the current one
+            track_topic = "spotify/preload_event" if player_event == 'preloading' else "spotify/track_event"
+            messages.append((track_topic, track_id))
+        return messages
+
+    @staticmethod
+    def track_uri(event):
+        """
+        This function return the payload of the track and preload events. If librespot reports
+        the type of the item, the payload is the Spotify URI, e.g. spotify:episode:<id>, so that
+        the item can be resolved without guessing its type. Otherwise it is the Spotify ID.
+        param event: the event as dictionary of librespot environment variables
+        :return: the Spotify URI or ID, or None if the event has no track
+        """
+        uri = event.get('URI')
+        if uri and uri.startswith('spotify:'):
+            return uri
+
+        track_id = event.get('TRACK_ID')
+        item_type = event.get('ITEM_TYPE')
+        if track_id and item_type:
+            return "spotify:{type}:{id}".format(type=item_type.lower(), id=track_id)
+        return track_id
+
+    def start(self):
+        """
+        This function bind the Unix domain socket and start the receiving thread. A stale
+        socket file of a previous run is removed.
+        """
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+        self._socket_ = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self._socket_.bind(self.path)
+        self._running_ = True
+        self._thread_ = threading.Thread(target=self._run_, name="jukebox-event-relay", daemon=True)
+        self._thread_.start()
+
+        self.log.write(message="Event relay listen on {path}".format(path=self.path),
+                       module=self.name,
+                       level=Logger.INFO)
+
+    def stop(self):
+        """
+        This function close the socket and remove the socket file. The receiving thread ends.
+        """
+        self._running_ = False
+        if self._socket_ is not None:
+            try:
+                self._socket_.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            self._socket_.close()
+            self._socket_ = None
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    def _run_(self):
+        """
+        The receiving loop of the thread. Every datagram is decoded and passed to the callback.
+        """
+        while self._running_:
+            try:
+                data = self._socket_.recv(self.MAX_DATAGRAM_SIZE)
+            except (OSError, AttributeError):
+                break
+            if not data:
+                continue
+
+            try:
+                event = json.loads(data.decode("utf-8"))
+            except ValueError as err:
+                self.log.write(message="Invalid event received: {err}".format(err=err),
+                               module=self.name,
+                               level=Logger.ERROR)
+                continue
+
+            try:
+                self.callback(event)
+            except Exception as err:
+                self.log.write(message="Unable to relay event {event}: {err}".format(event=event, err=err),
+                               module=self.name,
+                               level=Logger.ERROR)
@@ -0,0 +1,275 @@
+import os
+
+from abc import ABC, abstractmethod
+from system.configuration import Config
+from system.logger import Logger
+from system.metrics import Metrics
+from spotify.nowplayingrecord import NowPlayingRecord
+
+
+class EventTransport(ABC):
+    """
+    The class 'EventTransport' is the parent class of the transports which deliver the librespot
+    events to SpotifyConnectServer. The events arrive at the event relay of the server and are
+    handed over to publish(). The transport delivers them to the on_event callback, which is
+    called with the topic and the payload of the event. A transport which depends on the MQTT
+    broker reports the state of its connection to the on_state callback.
+    The transport is selected by the parameter 'eventtransport' of the section 'system':
+        mqtt:   the events are published to the MQTT broker and received by subscription
+        socket: the events are delivered directly, no MQTT broker is needed
+    A subclass must implement publish(), otherwise it can not be instantiated.
+    """
+
+    MQTT = "mqtt"
+    SOCKET = "socket"
+
+    uses_broker = False
+    """ True if the transport depends on the MQTT broker """
+
+    def __init__(self, on_event, on_state=None):
+        """
+        Initialize self. See help(self) for accurate signature.
+        param on_event: a callable which is called with the topic and the payload of an event
+        param on_state: an optional callable which is called with True or False when the
+            connection to the MQTT broker is established or lost
+        """
+        self.log = Logger()
+        self.name = os.path.basename(__file__)
+        self.on_event = on_event
+        self.on_state = on_state
+
+    @staticmethod
+    def from_config(on_event, on_state=None):
+        """
+        This function create the transport which is configured in the configuration.
+        param on_event: a callable which is called with the topic and the payload of an event
+        param on_state: an optional callable which is called with the state of the broker connection
+        :return: an instance of a subclass of EventTransport
+        """
+        cfg = Config().parser
+        transport = cfg.get('system', 'eventtransport', fallback=EventTransport.MQTT)
+        if transport == EventTransport.SOCKET:
+            return SocketEventTransport(on_event, on_state=on_state)
+
+        topics = [MqttEventTransport.EVENT_TOPIC]
+        now_playing_topic = cfg.get('system', 'nowplayingtopic', fallback=NowPlayingRecord.DEFAULT_TOPIC)
+        if now_playing_topic:
+            topics.append(now_playing_topic)
+
+        return MqttEventTransport(on_event,
+                                  on_state=on_state,
+                                  host=cfg.get('system', 'mqttHost'),
+                                  port=cfg.getint('system', 'mqttPort'),
+                                  keepalive=cfg.getint('system', 'mqttKeepAlive', fallback=60),
+                                  topics=topics)
+
+    def start(self):
+        """
+        This function start the transport.
+        """
+        pass
+
+    def stop(self):
+        """
+        This function stop the transport.
+        """
+        pass
+
+    def report_state(self, connected):
+        """
+        This function pass the state of the broker connection to the on_state callback.
+        param connected: True if the broker is connected, otherwise False
+        """
+        if self.on_state is not None:
+            self.on_state(connected)
+
+    @abstractmethod
+    def publish(self, topic, payload):
+        """
+        This function deliver an event.
+        param topic: the topic of the event, e.g. spotify/track_event
+        param payload: the payload of the event as string
+        """
+
+    def publish_message(self, topic, payload, retain=False):
+        """
+        This function publish a message of the application, e.g. the metrics, to the MQTT
+        broker. Transports without a broker drop the message.
+        param topic: the topic of the message, e.g. jukebox/metrics
+        param payload: the payload of the message as string
+        param retain: True if the broker should keep the message for future subscribers
+        """
+        pass
+
+
+class SocketEventTransport(EventTransport):
+    """
+    The class 'SocketEventTransport' delivers the events which the event relay receives on its
+    Unix domain socket directly to the callback, without a MQTT broker.
+    """
+
+    def publish(self, topic, payload):
+        """
+        This function deliver an event directly to the callback.
+        param topic: the topic of the event, e.g. spotify/track_event
+        param payload: the payload of the event as string
+        """
+        Metrics.instance().increment('jukebox_events_total', {'transport': self.SOCKET})
+        self.on_event(topic, payload)
+
+
+class MqttEventTransport(EventTransport):
+    """
+    The class 'MqttEventTransport' publishes the events to the MQTT broker and delivers the
+    events of the subscribed channel spotify/# to the callback. This way events of other
+    event gateways connected to the same broker are received, too. Additional topics, e.g.
+    the retained now playing record, are subscribed on every connect, so their retained
+    messages are delivered to the callback like events.
+    """
+
+    uses_broker = True
+
+    EVENT_TOPIC = "spotify/#"
+    """ The topic filter of the librespot events """
+
+    RECONNECT_DELAY_MIN = 1
+    """ The minimum time in seconds between two connection attempts """
+
+    RECONNECT_DELAY_MAX = 30
+    """ The maximum time in seconds between two connection attempts, the delay doubles up to it """
+
+    def __init__(self, on_event, host, port, keepalive=60, on_state=None, topics=None):
+        """
+        Initialize self. See help(self) for accurate signature.
+        param on_event: a callable which is called with the topic and the payload of an event
+        param on_state: an optional callable which is called with the state of the broker connection
+        param host: IP address or hostname of the MQTT broker
+        param port: the port on which the MQTT broker listen
+        param keepalive: maximum period in seconds between communications with the broker
+        param topics: the topic filters which are subscribed, if None only the events are subscribed
+        """
+        super(MqttEventTransport, self).__init__(on_event, on_state=on_state)
+        self.host = host
+        self.port = port
+        self.keepalive = keepalive
+        self.topics = list(topics) if topics is not None else [self.EVENT_TOPIC]
+        self.client = None
+
+    def start(self):
+        """
+        This function start the network loop of the client, which connects to the MQTT broker
+        in the background. If the broker is not reachable or the connection is lost, the loop
+        reconnects until stop() is called. The state of the connection is reported by the
+        callbacks on_connect(), on_connect_fail() and on_disconnect().
+        """
+        # paho is only needed if the events are transported over MQTT
+        import paho.mqtt.client as mqtt
+
+        self.client = mqtt.Client()
+        self.client.on_connect = self.on_connect
+        self.client.on_connect_fail = self.on_connect_fail
+        self.client.on_message = self.on_message
+        self.client.on_disconnect = self.on_disconnect
+        self.client.reconnect_delay_set(min_delay=self.RECONNECT_DELAY_MIN, max_delay=self.RECONNECT_DELAY_MAX)
+        self.client.connect_async(self.host, port=self.port, keepalive=self.keepalive)
+        self.client.loop_start()
+
+        self.log.write(message="Connecting to MQTT broker {0}:{1}", args=(self.host, self.port),
+                       module=self.name,
+                       level=Logger.DEBUG)
+
+    def stop(self):
+        """
+        This function stop the network loop of the client and disconnect from the broker.
+        """
+        if self.client is not None:
+            # the disconnect is on purpose, it must not be reported as a failure of the broker
+            self.client.on_disconnect = None
+            self.client.on_connect_fail = None
+            self.client.loop_stop()
+            self.client.disconnect()
+            self.client = None
+
+    def publish(self, topic, payload):
+        """
+        This function publish an event to the MQTT broker.
+        param topic: the topic of the event, e.g. spotify/track_event
+        param payload: the payload of the event as string
+        """
+        if self.client is not None:
+            self.client.publish(topic, payload)
+
+    def publish_message(self, topic, payload, retain=False):
+        """
+        This function publish a message of the application, e.g. the metrics, to the MQTT broker.
+        param topic: the topic of the message, e.g. jukebox/metrics
+        param payload: the payload of the message as string
+        param retain: True if the broker should keep the message for future subscribers
+        """
+        if self.client is not None:
+            self.client.publish(topic, payload, retain=retain)
+
+    def on_connect(self, client, userdata, flags, rc):
+        """
+        This function is called by mqtt client if receives a CONACK.
+        param client: the mqtt client as instance of paho.mqtt.client.Client()
+        param userdata: the private user data as set in Client() or user_data_set()
+        param flags: response flags sent by the broker
+        param rc: the result code,
+            0: Connection successful
+            1: Connection refused - incorrect protocol version
+            2: Connection refused - invalid client identifier
+            3: Connection refused - server unavailable
+            4: Connection refused - bad username or password
+            5: Connection refused - not authorised
+            6-255: Currently unused.
+        """
+        if rc == 0:
+            for topic in self.topics:
+                client.subscribe(topic)
+                self.log.write(message="{0} channel subscribed.", args=(topic,),
+                               module=self.name,
+                               level=Logger.INFO)
+            self.log.write(message="userdata: {userdata}, flags: {flags}".format(userdata=userdata, flags=flags),
+                           module=self.name,
+                           level=Logger.DEBUG)
+            self.report_state(True)
+        else:
+            self.report_state(False)
+
+    def on_connect_fail(self, client, userdata):
+        """
+        This function is called by mqtt client if a connection attempt of the network loop
+        failed, e.g. because the broker is not reachable. The loop tries again after the
+        reconnect delay.
+        param client: the mqtt client as instance of paho.mqtt.client.Client()
+        param userdata: the private user data as set in Client() or user_data_set()
+        """
+        self.log.write(message="Failed to connect to MQTT broker {0}:{1}", args=(self.host, self.port),
+                       module=self.name,
+                       level=Logger.ERROR)
+        self.report_state(False)
+
+    def on_disconnect(self, client, userdata, rc):
+        """
+        This function is called by mqtt client when the connection to the broker is lost. The
+        network loop of the client reconnects automatically.
+        param client: the mqtt client as instance of paho.mqtt.client.Client()
+        param userdata: the private user data as set in Client() or user_data_set()
+        param rc: the result code, 0 if disconnect() was called, otherwise the connection was lost
+        """
+        self.log.write(message="Disconnected from MQTT broker: {0}", args=(rc,),
+                       module=self.name,
+                       level=Logger.ERROR)
+        self.report_state(False)
+
+    def on_message(self, client, userdata, msg):
+        """
+        Called when a message has been received on a topic that the client subscribes to and the
+        message does not match an existing topic filter callback.
+        param client: the mqtt client as instance of paho.mqtt.client.Client()
+        param userdata: the private user data as set in Client() or user_data_set()
+        param msg: an instance of MQTTMessage. This is a class with members topic, payload, qos, retain.
+        """
+        Metrics.instance().increment('jukebox_events_total', {'transport': self.MQTT})
+        self.on_event(msg.topic, msg.payload.decode("utf-8"))
@@ -0,0 +1,302 @@
+import os
+import re
+import time
+import threading
+import subprocess
+
+from functools import partial
+from system.configuration import Config
+from system.logger import Logger
+from system.metrics import Metrics
+from system.healthmonitor import HealthMonitor
+
+
+class LibrespotSupervisor:
+    """
+    The class 'LibrespotSupervisor' starts librespot and keeps it running. The output of
+    librespot is read line by line in background threads and written to the log, so that
+    librespot never blocks on a full pipe. When librespot exits, it is restarted after a
+    delay which doubles with every exit in a row, up to a maximum delay. The delay is reset
+    when librespot was running for at least STABLE_TIME seconds. A librespot process which
+    hangs in a stopped or uninterruptible state for longer than HANG_TIMEOUT seconds is
+    killed and restarted.
+    The restarts are counted in the metric jukebox_librespot_restarts_total and the uptime
+    of the running process is exported as gauge jukebox_librespot_uptime_seconds.
+    """
+
+    DEFAULT_RESTART_DELAY = 1.0
+    """ The default delay in seconds before the first restart """
+
+    DEFAULT_MAX_RESTART_DELAY = 60.0
+    """ The default maximum delay in seconds between two restarts """
+
+    STABLE_TIME = 60.0
+    """ The time in seconds after which a running librespot resets the restart delay """
+
+    HANG_CHECK_INTERVAL = 10.0
+    """ The interval in seconds in which the state of the process is checked """
+
+    HANG_TIMEOUT = 30.0
+    """ The time in seconds after which a stopped or blocked process is killed """
+
+    HANG_STATES = ('T', 't', 'D')
+    """ The process states of /proc/<pid>/stat which are considered as hanging """
+
+    _LEVEL_PATTERN_ = re.compile(r'\b(ERROR|WARN|INFO|DEBUG|TRACE)\b')
+
+    def __init__(self, cmd, env=None, health_monitor=None, restart_delay=None, max_restart_delay=None):
+        """
+        Initialize self. See help(self) for accurate signature.
+        param cmd: the command line of librespot as list
+        param env: the environment of librespot, if None the environment of this process is used
+        param health_monitor: an instance of HealthMonitor, if None a new one is created
+        param restart_delay: the delay in seconds before the first restart
+        param max_restart_delay: the maximum delay in seconds between two restarts
+        """
+        cfg = Config().parser
+        self.log = Logger()
+        self.name = os.path.basename(__file__)
+        self.cmd = cmd
+        self.env = env
+        self.health_monitor = health_monitor if health_monitor is not None else HealthMonitor()
+        self.restart_delay = restart_delay if restart_delay is not None else cfg.getfloat(
+            'system', 'librespotrestartdelay', fallback=self.DEFAULT_RESTART_DELAY)
+        self.max_restart_delay = max_restart_delay if max_restart_delay is not None else cfg.getfloat(
+            'system', 'librespotmaxrestartdelay', fallback=self.DEFAULT_MAX_RESTART_DELAY)
+
+        self._lock_ = threading.RLock()
+        self._process_ = None
+        self._started_ = None
+        self._failures_ = 0
+        self._restart_count_ = 0
+        self._timer_ = None
+        self._stopping_ = True
+        self._stop_event_ = threading.Event()
+        self._watchdog_ = None
+
+    @property
+    def restart_count(self):
+        """
+        The number of restarts of librespot since start() was called.
+        """
+        return self._restart_count_
+
+    @property
+    def uptime(self):
+        """
+        The time in seconds since the running librespot process was started, 0 if librespot
+        is not running.
+        """
+        with self._lock_:
+            if self._started_ is None or not self.running:
+                return 0.0
+            return time.monotonic() - self._started_
+
+    @property
+    def running(self):
+        """
+        True if the librespot process is running.
+        """
+        process = self._process_
+        return process is not None and process.poll() is None
+
+    @property
+    def pid(self):
+        """
+        The process ID of librespot or None, if librespot was not started.
+        """
+        process = self._process_
+        return process.pid if process is not None else None
+
+    def start(self):
+        """
+        This function start librespot and the watchdog which detects a hanging process.
+        An OSError is raised, if librespot can not be started.
+        """
+        with self._lock_:
+            self._stopping_ = False
+            self._failures_ = 0
+            self._restart_count_ = 0
+            self._stop_event_.clear()
+            self._spawn_()
+
+        Metrics.instance().set_gauge('jukebox_librespot_uptime_seconds', lambda: round(self.uptime, 1))
+
+        if self._watchdog_ is None or not self._watchdog_.is_alive():
+            self._watchdog_ = threading.Thread(target=self._watch_loop_, name="jukebox-librespot-watchdog",
+                                               daemon=True)
+            self._watchdog_.start()
+
+    def stop(self, timeout=2.0):
+        """
+        This function stop librespot without restarting it. The process is terminated and
+        killed, if it does not exit within the timeout.
+        param timeout: the time in seconds to wait for the process to exit
+        """
+        with self._lock_:
+            self._stopping_ = True
+            self._stop_event_.set()
+            if self._timer_ is not None:
+                self._timer_.cancel()
+                self._timer_ = None
+            self.health_monitor.unwatch_process(HealthMonitor.LIBRESPOT)
+            process = self._process_
+
+        if process is not None and process.poll() is None:
+            process.terminate()
+            try:
+                process.wait(timeout=timeout)
+            except subprocess.TimeoutExpired:
+                process.kill()
+                process.wait()
+
+    def _spawn_(self):
+        """
+        This function start a new librespot process and the threads which read its output.
+        The lock must be held by the caller.
+        """
+        process = subprocess.Popen(self.cmd, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE,
+                                   stderr=subprocess.PIPE, env=self.env)
+        self._process_ = process
+        self._started_ = time.monotonic()
+
+        for pipe, stream in ((process.stdout, 'stdout'), (process.stderr, 'stderr')):
+            thread = threading.Thread(target=self._drain_, args=(pipe,),
+                                      name="jukebox-librespot-{0}".format(stream), daemon=True)
+            thread.start()
+
+        self.health_monitor.watch_process(HealthMonitor.LIBRESPOT, process, on_exit=partial(self._on_exit_, process))
+        self.log.write(message="librespot started with PID {0}", args=(process.pid,),
+                       module=self.name,
+                       level=Logger.INFO)
+
+    def _drain_(self, pipe):
+        """
+        The loop of an output thread. It reads the output of librespot line by line and
+        writes it to the log. The log level is taken from the level of the librespot message.
+        param pipe: the stdout or stderr pipe of the process
+        """
+        try:
+            for line in iter(pipe.readline, b''):
+                text = line.decode('utf-8', errors='replace').rstrip()
+                if text:
+                    self.log.write(message="librespot: {0}", args=(text,),
+                                   module=self.name,
+                                   level=self._level_of_(text))
+        except (OSError, ValueError):
+            pass
+        finally:
+            pipe.close()
+
+    def _level_of_(self, text):
+        """
+        This function map the level of a librespot message to the level of the logger.
+        param text: a line of the librespot output
+        :return: Logger.ERROR, Logger.INFO or Logger.DEBUG
+        """
+        match = self._LEVEL_PATTERN_.search(text)
+        if match is None:
+            return Logger.INFO
+        level = match.group(1)
+        if level in ('ERROR', 'WARN'):
+            return Logger.ERROR
+        if level == 'INFO':
+            return Logger.INFO
+        return Logger.DEBUG
+
+    def _on_exit_(self, process, returncode):
+        """
+        This function is called by the health monitor when librespot exits and schedule the
+        restart. The delay doubles with every exit in a row.
+        param process: the process which exited
+        param returncode: the return code of the process
+        """
+        with self._lock_:
+            if self._stopping_ or process is not self._process_:
+                return
+
+            uptime = time.monotonic() - self._started_
+            if uptime >= self.STABLE_TIME:
+                self._failures_ = 0
+            self._schedule_restart_()
+
+        self.log.write(message="librespot exited with return code {0} after {1:.1f} s, restart #{2} scheduled",
+                       args=(returncode, uptime, self._restart_count_ + 1),
+                       module=self.name,
+                       level=Logger.ERROR)
+
+    def _schedule_restart_(self):
+        """
+        This function start the timer which restarts librespot. The lock must be held by the
+        caller.
+        """
+        delay = min(self.max_restart_delay, self.restart_delay * (2 ** self._failures_))
+        self._failures_ += 1
+        self._timer_ = threading.Timer(delay, self._restart_)
+        self._timer_.daemon = True
+        self._timer_.start()
+
+    def _restart_(self):
+        """
+        This function is called by the restart timer and start a new librespot process. If
+        librespot can not be started, the next restart is scheduled.
+        """
+        with self._lock_:
+            self._timer_ = None
+            if self._stopping_:
+                return
+
+            self._restart_count_ += 1
+            Metrics.instance().increment('jukebox_librespot_restarts_total')
+            try:
+                self._spawn_()
+            except OSError as err:
+                self.log.write(message="Unable to restart librespot: {err}".format(err=err),
+                               module=self.name,
+                               level=Logger.ERROR)
+                self._schedule_restart_()
+
+    @staticmethod
+    def _process_state_(pid):
+        """
+        This function read the state of a process from /proc/<pid>/stat.
+        param pid: the process ID
+        :return: the state character, e.g. 'R', 'S', 'T' or 'D', or None if it is unknown
+        """
+        try:
+            with open('/proc/{pid}/stat'.format(pid=pid), 'r') as fp:
+                stat = fp.read()
+        except OSError:
+            return None
+        # the name of the process is in parentheses and can contain spaces
+        fields = stat[stat.rfind(')') + 2:].split()
+        return fields[0] if fields else None
+
+    def _watch_loop_(self):
+        """
+        The loop of the watchdog thread. It checks the state of librespot every
+        HANG_CHECK_INTERVAL seconds and kills a process which hangs longer than HANG_TIMEOUT
+        seconds. The health monitor reports the exit and librespot is restarted.
+        """
+        hanging_since = None
+        hanging_pid = None
+        while not self._stop_event_.wait(self.HANG_CHECK_INTERVAL):
+            process = self._process_
+            if process is None or process.poll() is not None:
+                hanging_since = None
+                continue
+
+            if self._process_state_(process.pid) not in self.HANG_STATES:
+                hanging_since = None
+                continue
+
+            now = time.monotonic()
+            if hanging_since is None or hanging_pid != process.pid:
+                hanging_since = now
+                hanging_pid = process.pid
+            elif now - hanging_since >= self.HANG_TIMEOUT:
+                self.log.write(message="librespot (PID {0}) does not respond, kill it", args=(process.pid,),
+                               module=self.name,
+                               level=Logger.ERROR)
+                process.kill()
+                hanging_since = None
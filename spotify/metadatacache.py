@@ -0,0 +1,210 @@
+import os
+import json
+import time
+import sqlite3
+import threading
+
+from system.configuration import Config
+from system.logger import Logger
+from system.metrics import Metrics
+
+
+class MetadataCache:
+    """
+    The class 'MetadataCache' is a persistent, size bounded cache for the responses of the
+    Spotify Web API. The entries are keyed by their kind (track, episode, artist) and the
+    Spotify ID and are stored in a SQLite database, so that they survive a restart of the
+    application. Every entry expires after the configured time to live. Expired entries are
+    kept, so that they can be served while the Spotify API is unavailable. If the cache holds
+    more than the configured number of entries, the least recently used entries are evicted.
+    """
+
+    TRACK = 'track'
+    EPISODE = 'episode'
+    ARTIST = 'artist'
+    TYPE = 'type'
+    """ The kind of the entries which remember if a Spotify ID is a track or an episode """
+
+    DEFAULT_MAX_ENTRIES = 5000
+    """ The default maximum number of entries in the cache """
+
+    DEFAULT_TTL = 604800
+    """ The default time to live of an entry in seconds (7 days) """
+
+    def __init__(self, path=None, max_entries=None, ttl=None):
+        """
+        Initialize self. See help(self) for accurate signature.
+        Open (or create) the cache database. Parameters that are not given are taken from the
+        configuration.
+        param path: the path of the SQLite database file
+        param max_entries: the maximum number of entries before the least recently used are evicted
+        param ttl: the time to live of an entry in seconds
+        """
+        cfg = Config().parser
+        default_path = os.path.join(os.path.dirname(cfg.get('spotify', 'cache')), 'metadata.db')
+
+        self.log = Logger()
+        self.name = os.path.basename(__file__)
+        self.path = path if path is not None else cfg.get('spotify', 'metadatacache', fallback=default_path)
+        self.max_entries = max_entries if max_entries is not None else cfg.getint(
+            'spotify', 'metadatacachesize', fallback=self.DEFAULT_MAX_ENTRIES)
+        self.ttl = ttl if ttl is not None else cfg.getint('spotify', 'metadatacachettl', fallback=self.DEFAULT_TTL)
+
+        self._lock_ = threading.Lock()
+        self._db_ = self._open_()
+
+    def _open_(self):
+        """
+        This function open the database and create the table if it does not exist. If the
+        database can not be opened, an in-memory database is used instead.
+        :return: an instance of sqlite3.Connection
+        """
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            db = sqlite3.connect(self.path, check_same_thread=False)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+        except (OSError, sqlite3.Error) as err:
+            self.log.write(message="Unable to open metadata cache {path}: {err}".format(path=self.path, err=err),
+                           module=self.name,
+                           level=Logger.ERROR)
+            db = sqlite3.connect(":memory:", check_same_thread=False)
+
+        db.execute("CREATE TABLE IF NOT EXISTS metadata ("
+                   "kind TEXT NOT NULL, "
+                   "id TEXT NOT NULL, "
+                   "value TEXT NOT NULL, "
+                   "stored REAL NOT NULL, "
+                   "accessed REAL NOT NULL, "
+                   "PRIMARY KEY (kind, id))")
+        db.execute("CREATE INDEX IF NOT EXISTS metadata_accessed ON metadata (accessed)")
+        db.commit()
+        return db
+
+    def get(self, kind, spotify_id, expired=False):
+        """
+        This function return the cached value for the given kind and Spotify ID. Expired
+        entries are only returned if expired is True.
+        param kind: one of MetadataCache.TRACK, MetadataCache.EPISODE, MetadataCache.ARTIST or MetadataCache.TYPE
+        param spotify_id: the Spotify ID
+        param expired: True to return an expired entry, e.g. while the Spotify API is unavailable
+        :return: the cached value or None
+        """
+        now = time.time()
+        with self._lock_:
+            row = self._db_.execute("SELECT value, stored FROM metadata WHERE kind = ? AND id = ?",
+                                    (kind, spotify_id)).fetchone()
+            if row is None:
+                self._count_(kind, 'miss')
+                return None
+
+            if now - row[1] > self.ttl and not expired:
+                self._count_(kind, 'expired')
+                return None
+
+            self._db_.execute("UPDATE metadata SET accessed = ? WHERE kind = ? AND id = ?", (now, kind, spotify_id))
+            self._db_.commit()
+
+        self._count_(kind, 'hit')
+        self.log.write(message="Cache hit for {0} {1}", args=(kind, spotify_id),
+                       module=self.name,
+                       level=Logger.DEBUG)
+        return json.loads(row[0])
+
+    @staticmethod
+    def _count_(kind, result):
+        """
+        This function count a lookup in the metrics.
+        param kind: the kind of the entry
+        param result: hit, miss or expired
+        """
+        Metrics.instance().increment('jukebox_cache_requests_total', {'cache': 'metadata', 'kind': kind,
+                                                                      'result': result})
+
+    def get_many(self, kind, spotify_ids, expired=False):
+        """
+        This function return the cached values for the given kind and Spotify IDs with one
+        query. Expired entries are only returned if expired is True.
+        param kind: one of MetadataCache.TRACK, MetadataCache.EPISODE, MetadataCache.ARTIST or MetadataCache.TYPE
+        param spotify_ids: a list of Spotify IDs
+        param expired: True to return expired entries, e.g. while the Spotify API is unavailable
+        :return: a dictionary which maps the cached Spotify IDs to their values
+        """
+        spotify_ids = list(dict.fromkeys(spotify_ids))
+        if not spotify_ids:
+            return {}
+
+        now = time.time()
+        placeholders = ",".join("?" * len(spotify_ids))
+        with self._lock_:
+            rows = self._db_.execute("SELECT id, value, stored FROM metadata WHERE kind = ? AND id IN ({0})"
+                                     .format(placeholders), [kind] + spotify_ids).fetchall()
+            values = {spotify_id: value for spotify_id, value, stored in rows
+                      if expired or now - stored <= self.ttl}
+            if values:
+                self._db_.executemany("UPDATE metadata SET accessed = ? WHERE kind = ? AND id = ?",
+                                      [(now, kind, spotify_id) for spotify_id in values])
+                self._db_.commit()
+
+        Metrics.instance().increment('jukebox_cache_requests_total', {'cache': 'metadata', 'kind': kind,
+                                                                      'result': 'hit'}, len(values))
+        Metrics.instance().increment('jukebox_cache_requests_total', {'cache': 'metadata', 'kind': kind,
+                                                                      'result': 'miss'},
+                                     len(spotify_ids) - len(values))
+        return {spotify_id: json.loads(value) for spotify_id, value in values.items()}
+
+    def put(self, kind, spotify_id, value):
+        """
+        This function store the value for the given kind and Spotify ID. If the cache exceeds
+        the maximum number of entries, the least recently used entries are evicted.
+        param kind: one of MetadataCache.TRACK, MetadataCache.EPISODE, MetadataCache.ARTIST or MetadataCache.TYPE
+        param spotify_id: the Spotify ID
+        param value: a JSON serializable value, usually the response of the Spotify API
+        """
+        if not spotify_id or value is None:
+            return
+
+        now = time.time()
+        with self._lock_:
+            self._db_.execute("INSERT OR REPLACE INTO metadata (kind, id, value, stored, accessed) "
+                              "VALUES (?, ?, ?, ?, ?)",
+                              (kind, spotify_id, json.dumps(value), now, now))
+            self._evict_()
+            self._db_.commit()
+
+    def put_many(self, kind, values):
+        """
+        This function store several values of the given kind in one transaction.
+        param kind: one of MetadataCache.TRACK, MetadataCache.EPISODE, MetadataCache.ARTIST or MetadataCache.TYPE
+        param values: a dictionary which maps the Spotify IDs to their values
+        """
+        now = time.time()
+        rows = [(kind, spotify_id, json.dumps(value), now, now)
+                for spotify_id, value in values.items() if spotify_id and value is not None]
+        if not rows:
+            return
+
+        with self._lock_:
+            self._db_.executemany("INSERT OR REPLACE INTO metadata (kind, id, value, stored, accessed) "
+                                  "VALUES (?, ?, ?, ?, ?)", rows)
+            self._evict_()
+            self._db_.commit()
+
+    def _evict_(self):
+        """
+        This function remove the least recently used entries, if the cache holds more than
+        self.max_entries entries. The lock must be held by the caller.
+        """
+        count = self._db_.execute("SELECT COUNT(*) FROM metadata").fetchone()[0]
+        if count > self.max_entries:
+            self._db_.execute("DELETE FROM metadata WHERE rowid IN "
+                              "(SELECT rowid FROM metadata ORDER BY accessed ASC LIMIT ?)",
+                              (count - self.max_entries,))
+
+    def clear(self):
+        """
+        This function remove all entries from the cache.
+        """
+        with self._lock_:
+            self._db_.execute("DELETE FROM metadata")
+            self._db_.commit()
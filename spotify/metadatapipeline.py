@@ -0,0 +1,404 @@
+import os
+import time
+import threading
+
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor
+from system.logger import Logger
+from system.metrics import Metrics
+from spotify.spotifyerror import SpotifyApiError
+
+
+class MetadataPipeline:
+    """
+    The class 'MetadataPipeline' resolves a Spotify ID to the information which is shown on
+    the screen without blocking the caller. The work is done in four stages:
+        1. fetch:    get the track, episode and artist information
+        2. download: download the background image
+        3. decode:   decode the downloaded background image
+        4. render:   resize and crop the background image to the application size
+    The fetch and download stages run in a pool of worker threads, decode and render run in
+    a separate worker, so that network I/O and image work never overlap on the same thread.
+    The result is handed over to the deliver callback, which is responsible for passing it
+    to the user interface thread.
+    The loading is progressive: the information is delivered as soon as it is resolved,
+    together with the rendered preview image of the background, if it is cached. Otherwise
+    the small preview image is downloaded and rendered next to the background image and
+    delivered, if it is done first. The background image is delivered when it is rendered.
+    Every submitted Spotify ID gets a new generation number. A newer submit cancels the
+    pending work of older generations and the results of running stages of an older
+    generation are discarded at the next stage boundary. A submit after a quiet period is
+    started at once, so a normal track change or a prefetched track is not delayed. A submit
+    within the debounce time of the previous one is part of a burst of track skips, it waits
+    for the debounce time, so that only the last one of the burst is resolved.
+    If the background image is already rendered, the information and the background image
+    are delivered at once and the other stages are skipped.
+    prefetch() runs the same stages for the next track without delivering the result, so
+    that the metadata and the background image are in the caches when the track starts.
+    Without a renderer only the fetch stage runs and no background image is delivered.
+    """
+
+    DEFAULT_FETCH_WORKERS = 2
+    """ The default number of worker threads for the fetch stage """
+
+    DEFAULT_DEBOUNCE = 0.25
+    """ The default time in seconds to wait for a newer submit during a burst of submits """
+
+    def __init__(self, resolver, renderer, deliver, workers=None, debounce=None):
+        """
+        Initialize self. See help(self) for accurate signature.
+        param resolver: an instance of spotify.metadataresolver.MetadataResolver
+        param renderer: an instance of ui.backgroundrenderer.BackgroundRenderer or None, if no
+            background image is rendered, e.g. without user interface
+        param deliver: a callable which is called with the finished now playing dictionary
+        param workers: the number of worker threads for the fetch stage
+        param debounce: the time in seconds to wait for a newer submit during a burst of submits
+        """
+        self.log = Logger()
+        self.name = os.path.basename(__file__)
+        self.resolver = resolver
+        self.renderer = renderer
+        self.deliver = deliver
+
+        workers = workers if workers is not None else self.DEFAULT_FETCH_WORKERS
+        self.debounce = debounce if debounce is not None else self.DEFAULT_DEBOUNCE
+
+        self._lock_ = threading.Lock()
+        self._generation_ = 0
+        self._submitted_ = None
+        self._last_submit_ = None
+        self._timer_ = None
+        self._futures_ = []
+        self._delivered_ = None
+        self._finished_ = None
+        self._prefetches_ = {}
+        self._fetch_pool_ = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='jukebox-fetch')
+        self._render_pool_ = ThreadPoolExecutor(max_workers=1, thread_name_prefix='jukebox-render')
+
+    def submit(self, spotify_id):
+        """
+        This function start the resolution of the given Spotify ID and return immediately.
+        The work of all previous submits is cancelled. The resolution starts at once, unless
+        the previous submit was within the debounce time, then it starts after the debounce
+        time, if no newer submit follows.
+        param spotify_id: a Spotify track or episode ID
+        :return: the generation number of the submit
+        """
+        now = time.perf_counter()
+        with self._lock_:
+            burst = self._last_submit_ is not None and now - self._last_submit_ < self.debounce
+            self._last_submit_ = now
+
+        generation = self._next_generation_()
+        if not burst:
+            self._start_(generation, spotify_id)
+            return generation
+
+        with self._lock_:
+            if self.is_current(generation):
+                self._timer_ = threading.Timer(self.debounce, self._start_, args=(generation, spotify_id))
+                self._timer_.daemon = True
+                self._timer_.start()
+        return generation
+
+    def show(self, now_playing):
+        """
+        This function deliver already resolved information, e.g. of a now playing record,
+        like submit() without a request to the Spotify API. Only the background image is
+        rendered, if it is not cached. The work of all previous submits is cancelled.
+        param now_playing: a now playing dictionary with the keys of the resolver
+        :return: the generation number of the submit
+        """
+        generation = self._next_generation_()
+        self._submit_(generation, self._fetch_pool_, self._lookup_, (generation, dict(now_playing)),
+                      self._on_fetched_)
+        return generation
+
+    def _next_generation_(self):
+        """
+        This function start a new generation and cancel the pending work of all previous
+        generations.
+        :return: the new generation number
+        """
+        with self._lock_:
+            self._generation_ += 1
+            self._submitted_ = time.perf_counter()
+
+            if self._timer_ is not None:
+                self._timer_.cancel()
+                self._timer_ = None
+            for future in self._futures_:
+                future.cancel()
+            self._futures_ = []
+            return self._generation_
+
+    def prefetch(self, spotify_id):
+        """
+        This function resolve the given Spotify ID and render its background image into the
+        caches in the background. The result is not delivered and a prefetch is not cancelled
+        by submit().
+        param spotify_id: a Spotify track or episode ID
+        """
+        with self._lock_:
+            if spotify_id in self._prefetches_:
+                return
+            try:
+                future = self._fetch_pool_.submit(self._prefetch_, spotify_id)
+            except RuntimeError:
+                # the pipeline is shut down
+                return
+            self._prefetches_[spotify_id] = future
+
+        self.log.write(message="Prefetch {0}", args=(spotify_id,),
+                       module=self.name,
+                       level=Logger.DEBUG)
+
+    def is_current(self, generation):
+        """
+        This function check if the given generation is the generation of the last submit.
+        param generation: a generation number returned by submit()
+        :return: True if no newer submit exists, otherwise False
+        """
+        return generation == self._generation_
+
+    def shutdown(self):
+        """
+        This function stop the worker threads. Pending work is discarded.
+        """
+        with self._lock_:
+            self._generation_ += 1
+            if self._timer_ is not None:
+                self._timer_.cancel()
+                self._timer_ = None
+        self._fetch_pool_.shutdown(wait=False, cancel_futures=True)
+        self._render_pool_.shutdown(wait=False, cancel_futures=True)
+
+    def _start_(self, generation, spotify_id):
+        """
+        This function submit the fetch stage, if no newer submit exists. It is called at
+        once or after the debounce time.
+        param generation: the generation number of the submit
+        param spotify_id: a Spotify track or episode ID
+        """
+        self._submit_(generation, self._fetch_pool_, self._fetch_, (generation, spotify_id), self._on_fetched_)
+
+    def _prefetch_(self, spotify_id):
+        """
+        The prefetch stage: resolve the Spotify ID and render the background image into the
+        background cache, if it is not already cached.
+        param spotify_id: a Spotify track or episode ID
+        """
+        try:
+            now_playing = self.resolver.resolve(spotify_id)
+            if self.renderer is None:
+                return
+            image = self.renderer.select_image(now_playing.get('images'))
+            if self.renderer.cached(image) is None:
+                img = self.renderer.decode(self.renderer.download(image))
+                self.renderer.render(img, image)
+
+        except Exception as err:
+            self.log.write(message="Prefetch of {0} failed: {1}", args=(spotify_id, err),
+                           module=self.name,
+                           level=Logger.DEBUG)
+        finally:
+            with self._lock_:
+                self._prefetches_.pop(spotify_id, None)
+
+    def _fetch_(self, generation, spotify_id):
+        """
+        The fetch stage: resolve the Spotify ID and look up the rendered background image.
+        param generation: the generation number of the submit
+        param spotify_id: a Spotify track or episode ID
+        :return: a tuple of the now playing dictionary and the selected image
+        """
+        with self._lock_:
+            prefetch = self._prefetches_.get(spotify_id)
+        if prefetch is not None:
+            # wait for the running prefetch of the same ID, afterward everything is cached
+            prefetch.exception()
+
+        now_playing = self.resolver.resolve(spotify_id)
+        if not self.is_current(generation):
+            return now_playing, None
+
+        return self._lookup_(generation, now_playing)
+
+    def _lookup_(self, generation, now_playing):
+        """
+        This function look up the rendered background image of the resolved information.
+        param generation: the generation number of the submit
+        param now_playing: the now playing dictionary
+        :return: a tuple of the now playing dictionary and the selected image
+        """
+        if self.renderer is None:
+            now_playing['background'] = None
+            return now_playing, None
+
+        image = self.renderer.select_image(now_playing.get('images'))
+        now_playing['background'] = self.renderer.cached(image)
+        return now_playing, image
+
+    def _on_fetched_(self, generation, future):
+        """
+        This function is called when the fetch stage is done. If the background image is
+        not rendered yet, the information is delivered at once with the preview image, if
+        it is cached, and the download of the background image and of the preview image is
+        submitted.
+        param generation: the generation number of the submit
+        param future: the future of the fetch stage
+        """
+        if self._failed_(generation, future):
+            return
+
+        now_playing, image = future.result()
+        if now_playing.get('background') is not None or image is None:
+            self._deliver_(generation, now_playing)
+            return
+
+        preview = self.renderer.select_preview(now_playing.get('images'))
+        background = self.renderer.cached(preview)
+        self._deliver_(generation, dict(now_playing, background=background), final=False)
+
+        self._submit_(generation, self._fetch_pool_, self._download_, (generation, image),
+                      partial(self._on_downloaded_, now_playing, image, True))
+        if preview is not None and background is None:
+            self._submit_(generation, self._fetch_pool_, self._download_, (generation, preview),
+                          partial(self._on_downloaded_, now_playing, preview, False))
+
+    def _submit_(self, generation, pool, function, args, callback):
+        """
+        This function submit a stage to a worker pool, if no newer submit exists.
+        param generation: the generation number of the submit
+        param pool: the worker pool of the stage
+        param function: the function of the stage
+        param args: the arguments of the function as tuple
+        param callback: a callable which is called with the generation and the future of the stage
+        """
+        with self._lock_:
+            if not self.is_current(generation):
+                return
+            try:
+                future = pool.submit(function, *args)
+            except RuntimeError:
+                # the pipeline is shut down
+                return
+            self._futures_.append(future)
+        future.add_done_callback(partial(callback, generation))
+
+    def _download_(self, generation, image):
+        """
+        The download stage: download an image. The stage is skipped if a newer submit exists.
+        param generation: the generation number of the submit
+        param image: the image dict to download
+        :return: the image data as bytes or None
+        """
+        if not self.is_current(generation):
+            return None
+        return self.renderer.download(image)
+
+    def _on_downloaded_(self, now_playing, image, final, generation, future):
+        """
+        This function is called when the download stage is done and submit the decode and
+        render stage.
+        param now_playing: the now playing dictionary of the fetch stage
+        param image: the downloaded image dict
+        param final: True for the background image, False for the preview image
+        param generation: the generation number of the submit
+        param future: the future of the download stage
+        """
+        if self._failed_(generation, future):
+            return
+
+        self._submit_(generation, self._render_pool_, self._render_, (generation, now_playing, image, future.result()),
+                      partial(self._on_rendered_, final))
+
+    def _render_(self, generation, now_playing, image, data):
+        """
+        The decode and render stage: create the background image from the image data. The
+        stage is skipped if a newer submit exists.
+        param generation: the generation number of the submit
+        param now_playing: the now playing dictionary of the fetch stage
+        param image: the downloaded image dict
+        param data: the image data as bytes or None
+        :return: a copy of the now playing dictionary with the path of the background image
+        """
+        if not self.is_current(generation):
+            return now_playing
+
+        img = self.renderer.decode(data)
+        if not self.is_current(generation):
+            return now_playing
+
+        return dict(now_playing, background=self.renderer.render(img, image))
+
+    def _on_rendered_(self, final, generation, future):
+        """
+        This function is called when the render stage is done and hand over the result to
+        the deliver callback. A preview which is rendered after the background image is
+        dropped.
+        param final: True for the background image, False for the preview image
+        param generation: the generation number of the submit
+        param future: the future of the render stage
+        """
+        if self._failed_(generation, future):
+            return
+
+        now_playing = future.result()
+        if final or now_playing.get('background') is not None:
+            self._deliver_(generation, now_playing, final=final)
+
+    def _deliver_(self, generation, now_playing, final=True):
+        """
+        This function hand over the result to the deliver callback and record the time since
+        the submit in the metrics: the time until the information is shown and the time until
+        the background image is shown.
+        param generation: the generation number of the submit
+        param now_playing: the now playing dictionary
+        param final: False if the background image follows with a later delivery, it is passed
+            to the deliver callback as key 'final' of the now playing dictionary
+        """
+        with self._lock_:
+            if not self.is_current(generation) or self._finished_ == generation:
+                return
+            first = self._delivered_ != generation
+            self._delivered_ = generation
+            if final:
+                self._finished_ = generation
+            submitted = self._submitted_
+
+        if submitted is not None:
+            elapsed = time.perf_counter() - submitted
+            if first:
+                Metrics.instance().observe('jukebox_now_playing_resolve_seconds', elapsed)
+            if final:
+                Metrics.instance().observe('jukebox_now_playing_background_seconds', elapsed)
+        self.deliver(dict(now_playing, final=final))
+
+    def _failed_(self, generation, future):
+        """
+        This function check if a stage is cancelled, raised an exception or belongs to an
+        outdated generation. The exception is written to the log.
+        param generation: the generation number of the submit
+        param future: the future of a stage
+        :return: True if the stage failed or is outdated, otherwise False
+        """
+        if future.cancelled():
+            return True
+
+        if not self.is_current(generation):
+            Metrics.instance().increment('jukebox_pipeline_discarded_total')
+            self.log.write(message="Discard the result of outdated generation {0}", args=(generation,),
+                           module=self.name,
+                           level=Logger.DEBUG)
+            return True
+
+        err = future.exception()
+        if err is None:
+            return False
+
+        if not isinstance(err, SpotifyApiError):
+            self.log.write(message="Unable to resolve the now playing information: {err}".format(err=err),
+                           module=self.name,
+                           level=Logger.ERROR)
+        return True
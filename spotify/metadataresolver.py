@@ -0,0 +1,296 @@
+import os
+
+from system.configuration import Config
+from system.logger import Logger
+from spotify.metadatacache import MetadataCache
+from spotify.spotifyapiclient import SpotifyApiClient
+from spotify.spotifyerror import SpotifyApiError, SpotifyApiUnavailable
+
+
+class MetadataResolver:
+    """
+    The class 'MetadataResolver' get the information about the currently played track or
+    episode and its artists from the Spotify API. All lookups go through the metadata cache
+    first. A Spotify URI (spotify:track:<id> or spotify:episode:<id>) is resolved at the
+    matching endpoint right away. For a plain Spotify ID the type remembered in the cache is
+    used, only an ID which was never resolved is tried as track first and as episode second.
+    While the Spotify API is rate limited or unavailable, expired cache entries are used.
+    The class does not touch the user interface, so its functions can be called from any thread.
+    """
+
+    DEFAULT_MARKET = 'DE'
+    """ The default market (ISO 3166-1 alpha-2 country code) of the episodes """
+
+    def __init__(self, cache=None, market=None):
+        """
+        Initialize self. See help(self) for accurate signature.
+        param cache: an instance of MetadataCache, if None a new one is created
+        param market: the market of the episodes, if None it is taken from the configuration. Tracks
+            are looked up without a market, so the Spotify API does not relink them.
+        """
+        self.log = Logger()
+        self.name = os.path.basename(__file__)
+        self.cache = cache if cache is not None else MetadataCache()
+        self.market = market if market is not None else Config().parser.get('spotify', 'market',
+                                                                            fallback=self.DEFAULT_MARKET)
+        self.market = self.market or None
+
+    @staticmethod
+    def parse(spotify_uri):
+        """
+        This function split a Spotify URI into its type and ID.
+        param spotify_uri: a Spotify URI, e.g. spotify:track:<id>, or a Spotify ID
+        :return: a tuple of the type (MetadataCache.TRACK, MetadataCache.EPISODE or None) and the ID
+        """
+        parts = spotify_uri.split(':')
+        if len(parts) == 3 and parts[0] == 'spotify' and parts[1] in (MetadataCache.TRACK, MetadataCache.EPISODE):
+            return parts[1], parts[2]
+        return None, parts[-1]
+
+    def resolve(self, spotify_uri):
+        """
+        This function resolve the given Spotify URI or ID to a track or an episode of a podcast
+        and return the normalized now playing record, which is the same for both types.
+        param spotify_uri: a Spotify URI or a Spotify track or episode ID
+        :return: a dictionary with the keys
+            'id', 'uri', 'type':  the Spotify ID, URI and type (track, episode or None, if not found)
+            'title':              the name of the track or episode
+            'subtitle':           the name of the album or show
+            'artist_names':       the names of the artists or the publisher of the show
+            'description':        the description of the episode, empty for tracks
+            'cover':              the images of the album or the episode
+            'artists':            the artist objects of a track
+            'images':             the images which should be used for the background
+            'track', 'episode':   the track or episode information as returned by the getters
+        """
+        kind, spotify_id = self.parse(spotify_uri)
+        now_playing = {
+            'id': spotify_id,
+            'uri': spotify_uri,
+            'type': None,
+            'title': '',
+            'subtitle': '',
+            'artist_names': [],
+            'description': '',
+            'cover': [],
+            'artists': [],
+            'images': None,
+            'track': None,
+            'episode': None
+        }
+
+        if kind is None:
+            kind = self.cache.get(MetadataCache.TYPE, spotify_id, expired=True)
+        guessed = kind not in (MetadataCache.TRACK, MetadataCache.EPISODE)
+        kinds = [MetadataCache.TRACK, MetadataCache.EPISODE] if guessed else [kind]
+
+        for kind in kinds:
+            if kind == MetadataCache.TRACK:
+                _track_ = self.get_track_information(spotify_id)
+                if _track_ == 404:
+                    continue
+                self._set_track_(now_playing, _track_)
+            else:
+                _episode_ = self.get_episode_information(spotify_id)
+                if _episode_ == 404:
+                    continue
+                self._set_episode_(now_playing, _episode_)
+
+            now_playing['type'] = kind
+            now_playing['uri'] = "spotify:{type}:{id}".format(type=kind, id=spotify_id)
+            if guessed:
+                self.cache.put(MetadataCache.TYPE, spotify_id, kind)
+            break
+
+        return now_playing
+
+    def _set_track_(self, now_playing, track):
+        """
+        This function fill the now playing record with the information of a track and its artists.
+        param now_playing: the now playing record
+        param track: the track information as returned by get_track_information()
+        """
+        artists = self.get_artist_information([item.get('id') for item in track['artist'] or []])
+        now_playing['track'] = track
+        now_playing['title'] = track['track']
+        now_playing['subtitle'] = (track['album'] or {}).get('name', '')
+        now_playing['artist_names'] = [item.get('name') for item in track['artist'] or []]
+        now_playing['cover'] = track['image'] or []
+        now_playing['artists'] = artists
+        # the background shows the first artist which has an image
+        now_playing['images'] = next((artist.get('images') for artist in artists if artist.get('images')), None)
+
+    @staticmethod
+    def _set_episode_(now_playing, episode):
+        """
+        This function fill the now playing record with the information of an episode.
+        param now_playing: the now playing record
+        param episode: the episode information as returned by get_episode_information()
+        """
+        show = episode.get('show') or {}
+        now_playing['episode'] = episode
+        now_playing['title'] = episode.get('name', '')
+        now_playing['subtitle'] = show.get('name', '')
+        now_playing['artist_names'] = [show.get('publisher', '')]
+        now_playing['description'] = episode.get('description', '')
+        now_playing['cover'] = episode.get('images', [])
+        now_playing['images'] = show.get('images', [])
+
+    def get_artist_information(self, spotify_artist_ids):
+        """
+        This function get the information about the artists of the currently played track.
+        The cached artists are taken from the metadata cache, all other artists are requested
+        from the Spotify API in one batched request and stored in the cache.
+        param spotify_artist_ids: a list of Spotify artist IDs
+        :return: Array of all artists in the order of the IDs
+        """
+        spotify_artist_ids = [artist_id for artist_id in spotify_artist_ids if artist_id]
+        if len(spotify_artist_ids) == 0:
+            return []
+
+        _artists_ = self.cache.get_many(MetadataCache.ARTIST, spotify_artist_ids)
+        _missing_ = [artist_id for artist_id in dict.fromkeys(spotify_artist_ids) if artist_id not in _artists_]
+        if len(_missing_) > 0:
+            try:
+                _spotify_ = SpotifyApiClient.instance()
+                _response_ = {artist.get('id'): artist for artist in _spotify_.artists(_missing_) if artist}
+                self.cache.put_many(MetadataCache.ARTIST, _response_)
+                _artists_.update(_response_)
+
+            except SpotifyApiUnavailable:
+                # show the artists known from earlier, the missing ones are skipped
+                _artists_.update(self.cache.get_many(MetadataCache.ARTIST, _missing_, expired=True))
+
+            except Exception as error:
+                self.log.write(message="{error}".format(error=error),
+                               module=self.name,
+                               level=Logger.ERROR)
+                raise SpotifyApiError
+
+        return [_artists_[artist_id] for artist_id in spotify_artist_ids if artist_id in _artists_]
+
+    def get_audio_features(self, spotify_track_id):
+        """
+        This function get the audio features of the currently played track from Spotify API.
+        param spotify_track_id: a Spotify track ID
+        :return: Array with audio features
+        """
+        if spotify_track_id:
+            try:
+                _spotify_ = SpotifyApiClient.instance()
+                _audio_features_ = _spotify_.audio_features(spotify_track_id)
+                self.log.write(message="{0}", args=(_audio_features_,),
+                               module=self.name,
+                               level=Logger.DEBUG)
+                return _audio_features_
+            except Exception as err:
+                self.log.write(message="Unable to get audio features from Spotify: {err}".format(err=err),
+                               module=self.name,
+                               level=Logger.ERROR)
+                raise SpotifyApiError
+
+    def get_episode_information(self, spotify_id):
+        """
+        This function get information about the current played episode of a podcast by using
+        the spotify id and return it in a dictionary
+        """
+        self.log.write(message="Episode ID: {0}", args=(spotify_id,),
+                       module=self.name,
+                       level=Logger.DEBUG)
+        if spotify_id:
+            _episode_ = self.cache.get(MetadataCache.EPISODE, spotify_id)
+            if _episode_ is not None:
+                return _episode_
+
+            try:
+                _spotify_ = SpotifyApiClient.instance()
+                return self._request_(MetadataCache.EPISODE, spotify_id, _spotify_.episode, spotify_id, self.market)
+
+            except SpotifyApiUnavailable:
+                raise
+
+            except Exception as err:
+                if err.args[0] == 404:
+                    self.log.write(message=err.args[2],
+                                   module=self.name,
+                                   level=Logger.INFO)
+                    return 404
+                else:
+                    self.log.write(message="Unable to get information from Spotify: {err}".format(err=err),
+                                   module=self.name,
+                                   level=Logger.ERROR)
+                    raise SpotifyApiError
+
+    def get_track_information(self, spotify_track_id):
+        """
+        This function get information about the current track by using the trackid and return
+        it in a dictionary.
+        """
+        self.log.write(message="Track ID: {0}", args=(spotify_track_id,),
+                       module=self.name,
+                       level=Logger.DEBUG)
+        if spotify_track_id:
+            try:
+                _track_ = self.cache.get(MetadataCache.TRACK, spotify_track_id)
+                if _track_ is None:
+                    _spotify_ = SpotifyApiClient.instance()
+                    _track_ = self._request_(MetadataCache.TRACK, spotify_track_id,
+                                             _spotify_.track, spotify_track_id)
+
+                track = {
+                    'artist': _track_.get('artists', None),
+                    'album': _track_.get('album', None),
+                    'track': _track_.get('name', spotify_track_id),
+                    'image': _track_.get('album', None).get('images', None)
+                }
+                self.log.write(message="Track information received from Spotify.",
+                               module=self.name,
+                               level=Logger.INFO)
+                self.log.write(message="{0}", args=(track,),
+                               module=self.name,
+                               level=Logger.DEBUG)
+                return track
+
+            except SpotifyApiUnavailable:
+                raise
+
+            except Exception as err:
+                if err.args[0] == 404:
+                    self.log.write(message=err.args[2],
+                                   module=self.name,
+                                   level=Logger.INFO)
+                    return 404
+
+                else:
+                    self.log.write(message="Unable to get information from Spotify: {err}".format(err=err),
+                                   module=self.name,
+                                   level=Logger.ERROR)
+                    raise SpotifyApiError(err.args)
+
+    def _request_(self, kind, spotify_id, function, *args):
+        """
+        This function request an item from the Spotify API and store it in the cache. If the
+        API is rate limited or unavailable, the expired cache entry is returned instead.
+        SpotifyApiUnavailable is raised, if the item is not cached at all.
+        param kind: one of MetadataCache.TRACK or MetadataCache.EPISODE
+        param spotify_id: the Spotify ID
+        param function: the function of SpotifyApiClient which requests the item
+        param args: the arguments of the function
+        :return: the item as dict
+        """
+        try:
+            _value_ = function(*args)
+        except SpotifyApiUnavailable:
+            _value_ = self.cache.get(kind, spotify_id, expired=True)
+            if _value_ is None:
+                self.log.write(message="Spotify API unavailable, no cached {0} {1}", args=(kind, spotify_id),
+                               module=self.name,
+                               level=Logger.INFO)
+                raise
+            self.log.write(message="Spotify API unavailable, use cached {0} {1}", args=(kind, spotify_id),
+                           module=self.name,
+                           level=Logger.INFO)
+            return _value_
+
+        self.cache.put(kind, spotify_id, _value_)
+        return _value_
@@ -0,0 +1,87 @@
+import json
+import time
+
+
+class NowPlayingRecord:
+    """
+    The class 'NowPlayingRecord' converts the resolved now playing information to a compact
+    JSON record and back. The record is published as retained MQTT message on the topic
+    jukebox/now_playing, so that a restarted application or a new display shows the current
+    track at once, without a request to the Spotify API. It contains the information which
+    is shown, the images of the cover and the background and the key of the rendered
+    background image in the background cache, e.g.
+        {"v": 1, "id": "...", "uri": "spotify:track:...", "type": "track", "title": "...",
+         "subtitle": "...", "artist_names": ["..."], "description": "", "playing": true,
+         "cover": [{"url": "...", "width": 300, "height": 300}], "images": [...],
+         "background_key": "...", "time": 1700000000}
+    The topic is configured by the option nowplayingtopic of the section 'system'.
+    """
+
+    DEFAULT_TOPIC = "jukebox/now_playing"
+    """ The default MQTT topic of the now playing record """
+
+    VERSION = 1
+    """ The version of the record format, records of other versions are ignored """
+
+    FIELDS = ('id', 'uri', 'type', 'title', 'subtitle', 'artist_names', 'description')
+    """ The fields of the now playing dictionary which are taken over unchanged """
+
+    @staticmethod
+    def _images_(images):
+        """
+        This function reduce the image dicts of the Spotify API to url, width and height.
+        param images: an array of images. Each image is a dict get from Spotify API
+        :return: an array of image dicts
+        """
+        return [{'url': img.get('url'), 'width': img.get('width'), 'height': img.get('height')}
+                for img in images or [] if img.get('url')]
+
+    @classmethod
+    def encode(cls, now_playing, playing=True, background_key=None):
+        """
+        This function create the record of the given now playing information.
+        param now_playing: the now playing dictionary of the metadata pipeline
+        param playing: True if the track is playing, False if the playback is stopped
+        param background_key: the background cache key of the rendered background image or None
+        :return: the record as JSON string
+        """
+        record = {field: now_playing.get(field) for field in cls.FIELDS}
+        record.update(v=cls.VERSION,
+                      playing=bool(playing),
+                      cover=cls._images_(now_playing.get('cover')),
+                      images=cls._images_(now_playing.get('images')),
+                      background_key=background_key,
+                      time=int(time.time()))
+        return json.dumps(record, separators=(',', ':'))
+
+    @classmethod
+    def decode(cls, payload):
+        """
+        This function create a now playing dictionary from a record. The dictionary has the
+        keys of the now playing dictionary of the metadata pipeline, the raw information of
+        the Spotify API (track, episode, artists) is not part of the record.
+        param payload: the record as JSON string
+        :return: the now playing dictionary with the additional keys playing and
+            background_key, or None if the payload is no valid record
+        """
+        try:
+            record = json.loads(payload)
+        except (TypeError, ValueError):
+            return None
+        if not isinstance(record, dict) or record.get('v') != cls.VERSION or record.get('type') is None:
+            return None
+
+        now_playing = {field: record.get(field) for field in cls.FIELDS}
+        now_playing.update(artist_names=now_playing['artist_names'] or [],
+                           title=now_playing['title'] or "",
+                           subtitle=now_playing['subtitle'] or "",
+                           description=now_playing['description'] or "",
+                           cover=cls._images_(record.get('cover')),
+                           images=cls._images_(record.get('images')),
+                           artists=[],
+                           track=None,
+                           episode=None,
+                           background=None,
+                           playing=bool(record.get('playing')),
+                           background_key=record.get('background_key'))
+        return now_playing
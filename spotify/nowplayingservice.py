@@ -0,0 +1,184 @@
+import os
+import threading
+
+from system.logger import Logger
+from spotify.metadatapipeline import MetadataPipeline
+
+
+class NowPlayingService:
+    """
+    The class 'NowPlayingService' follows the events of SpotifyConnectServer and keeps the
+    now playing information up to date. A new track is submitted to the metadata pipeline,
+    the next track of a preload event is prefetched and every finished result is published
+    as retained now playing record. If the record is received before the first track, e.g.
+    after a restart, its track is delivered without a request to the Spotify API.
+    The results are passed to the registered listeners, which are called from a worker
+    thread with the now playing dictionary of the metadata pipeline. The class does not
+    depend on the user interface, it is used by JukeBoxKivyApp and the headless jukeboxd.py.
+    """
+
+    def __init__(self, server, resolver, renderer=None, workers=None, debounce=None):
+        """
+        Initialize self. See help(self) for accurate signature.
+        param server: an instance of spotify.spotifyconnectserver.SpotifyConnectServer
+        param resolver: an instance of spotify.metadataresolver.MetadataResolver
+        param renderer: an instance of ui.backgroundrenderer.BackgroundRenderer or None, if no
+            background image is rendered
+        param workers: the number of worker threads for the fetch stage of the pipeline
+        param debounce: the debounce time of the pipeline in seconds
+        """
+        self.log = Logger()
+        self.name = os.path.basename(__file__)
+        self.server = server
+        self.pipeline = MetadataPipeline(resolver=resolver, renderer=renderer, deliver=self.on_now_playing,
+                                         workers=workers, debounce=debounce)
+
+        self._lock_ = threading.Lock()
+        self._listeners_ = []
+        self._current_track_id_ = None
+        self._now_playing_ = None
+        self._playing_ = False
+
+    @property
+    def now_playing(self):
+        """
+        The now playing dictionary of the last finished result or None.
+        """
+        return self._now_playing_
+
+    @property
+    def playing(self):
+        """
+        True if the playback is started, False if it is stopped.
+        """
+        return self._playing_
+
+    def add_listener(self, callback):
+        """
+        This function register a callback which is called with the now playing dictionary
+        of every result of the metadata pipeline.
+        param callback: a callable
+        """
+        with self._lock_:
+            if callback not in self._listeners_:
+                self._listeners_.append(callback)
+
+    def remove_listener(self, callback):
+        """
+        This function remove a callback registered with add_listener().
+        param callback: a callable
+        """
+        with self._lock_:
+            if callback in self._listeners_:
+                self._listeners_.remove(callback)
+
+    def start(self):
+        """
+        This function bind the service to the events of the spotify connect server.
+        """
+        self.server.bind(on_track_event=self.on_track_event,
+                         on_preload_event=self.on_preload_event,
+                         on_player_event=self.on_player_event,
+                         on_now_playing_record=self.on_now_playing_record)
+
+    def stop(self):
+        """
+        This function unbind the service from the spotify connect server and stop the
+        metadata pipeline.
+        """
+        self.server.unbind(on_track_event=self.on_track_event,
+                           on_preload_event=self.on_preload_event,
+                           on_player_event=self.on_player_event,
+                           on_now_playing_record=self.on_now_playing_record)
+        self.pipeline.shutdown()
+
+    def on_track_event(self, *args):
+        """
+        This function is called when a 'track_event' event is received. If the track_id is
+        uneven to the last played track_id, the track is submitted to the metadata pipeline.
+        The track_id is the Spotify URI, if librespot reports the type of the item, otherwise
+        the Spotify ID.
+        """
+        track_id = args[1]
+
+        if self._current_track_id_ != track_id:
+            self._current_track_id_ = track_id
+            self.log.write(message="New track id: {trackid}".format(trackid=track_id),
+                           module=self.name,
+                           level=Logger.INFO)
+            self.pipeline.submit(track_id)
+
+    def on_preload_event(self, *args):
+        """
+        This function is called when a 'preload_event' event is received. librespot sends it
+        with the track_id of the next track, before the track starts. The information and
+        the background image of the next track are resolved into the caches in the background,
+        so that the track event of the next track is a cache hit.
+        """
+        track_id = args[1]
+        self.log.write(message="Preload track id: {0}", args=(track_id,),
+                       module=self.name,
+                       level=Logger.DEBUG)
+        self.pipeline.prefetch(track_id)
+
+    def on_player_event(self, *args):
+        """
+        This function is called when a 'player_event' event is received. The state of the
+        playback is published with the now playing record.
+        """
+        event = args[1]
+        if event == 'started':
+            self._playing_ = True
+            self.publish_now_playing()
+        elif event == 'stopped':
+            self._playing_ = False
+            self.publish_now_playing()
+
+    def on_now_playing_record(self, instance, now_playing):
+        """
+        This function is called when the retained now playing record is received, e.g. after
+        the connect to the MQTT broker. If no track was received yet, the track of the record
+        is delivered without a request to the Spotify API. Records of later tracks, e.g. the
+        own ones, are ignored.
+        param instance: the spotify connect server
+        param now_playing: the now playing dictionary of the record
+        """
+        if self._current_track_id_ is not None:
+            return
+
+        self._current_track_id_ = now_playing.get('uri') or now_playing.get('id')
+        self._playing_ = now_playing.get('playing')
+        self.log.write(message="Restore now playing from record: {0}", args=(self._current_track_id_,),
+                       module=self.name,
+                       level=Logger.INFO)
+        self.pipeline.show(now_playing)
+
+    def on_now_playing(self, now_playing):
+        """
+        This function is called by the metadata pipeline from a worker thread with a result.
+        The result is passed to the listeners and a finished result is published.
+        param now_playing: the now playing dictionary of the metadata pipeline
+        """
+        with self._lock_:
+            listeners = list(self._listeners_)
+        for callback in listeners:
+            callback(now_playing)
+
+        if now_playing.get('final') and now_playing.get('type') is not None:
+            self._now_playing_ = now_playing
+            self.publish_now_playing()
+
+    def publish_now_playing(self):
+        """
+        This function publish the now playing record of the last finished result and the
+        state of the playback as retained message.
+        """
+        now_playing = self._now_playing_
+        if now_playing is None:
+            return
+
+        background_key = None
+        renderer = self.pipeline.renderer
+        if renderer is not None:
+            background_key = renderer.key(renderer.select_image(now_playing.get('images')))
+        self.server.publish_now_playing(now_playing, playing=self._playing_, background_key=background_key)
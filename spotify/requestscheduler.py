@@ -0,0 +1,271 @@
+import os
+import time
+import threading
+
+from system.logger import Logger
+from system.metrics import Metrics
+from spotify.spotifyerror import SpotifyApiUnavailable
+
+
+class TokenBucket:
+    """
+    The class 'TokenBucket' limits the rate of requests. The bucket holds up to 'capacity'
+    tokens and is refilled with 'rate' tokens per second. Every request takes one token, so
+    bursts up to the capacity are possible, while the long term rate never exceeds 'rate'.
+    """
+
+    def __init__(self, rate, capacity):
+        """
+        Initialize self. See help(self) for accurate signature.
+        param rate: the number of tokens which are added per second
+        param capacity: the maximum number of tokens
+        """
+        self.rate = float(rate)
+        self.capacity = float(capacity)
+        self._tokens_ = float(capacity)
+        self._updated_ = time.monotonic()
+        self._lock_ = threading.Lock()
+
+    def _refill_(self, now):
+        """
+        This function add the tokens of the time since the last refill. The lock must be held
+        by the caller.
+        param now: the current time of time.monotonic()
+        """
+        self._tokens_ = min(self.capacity, self._tokens_ + (now - self._updated_) * self.rate)
+        self._updated_ = now
+
+    def acquire(self, timeout=0.0):
+        """
+        This function take one token. If the bucket is empty, it waits for the next token,
+        but not longer than the timeout.
+        param timeout: the maximum time in seconds to wait for a token
+        :return: True if a token was taken, otherwise False
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            with self._lock_:
+                now = time.monotonic()
+                self._refill_(now)
+                if self._tokens_ >= 1.0:
+                    self._tokens_ -= 1.0
+                    return True
+                wait = (1.0 - self._tokens_) / self.rate if self.rate > 0 else timeout + 1.0
+
+            if now + wait > deadline:
+                return False
+            time.sleep(wait)
+
+
+class CircuitBreaker:
+    """
+    The class 'CircuitBreaker' stops the requests to a failing service. After
+    'failure_threshold' failures in a row the breaker opens and every request is rejected
+    for 'reset_timeout' seconds. Afterwards one trial request is let through (half open):
+    if it succeeds the breaker closes, otherwise it opens again. A service which asks to
+    wait, e.g. by a Retry-After header, opens the breaker for the requested time.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold, reset_timeout):
+        """
+        Initialize self. See help(self) for accurate signature.
+        param failure_threshold: the number of failures in a row which open the breaker
+        param reset_timeout: the time in seconds the breaker stays open
+        """
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._state_ = self.CLOSED
+        self._failures_ = 0
+        self._open_until_ = 0.0
+        self._trial_ = False
+        self._lock_ = threading.Lock()
+
+    @property
+    def state(self):
+        """
+        The state of the breaker: CircuitBreaker.CLOSED, OPEN or HALF_OPEN.
+        """
+        with self._lock_:
+            if self._state_ == self.OPEN and time.monotonic() >= self._open_until_:
+                return self.HALF_OPEN
+            return self._state_
+
+    def retry_after(self):
+        """
+        This function return the time until the breaker lets the next request through.
+        :return: the time in seconds, 0 if the breaker is closed
+        """
+        with self._lock_:
+            return max(0.0, self._open_until_ - time.monotonic()) if self._state_ == self.OPEN else 0.0
+
+    def allow(self):
+        """
+        This function check if a request may be sent. In the half open state only one
+        trial request is allowed until its result is recorded.
+        :return: True if the request may be sent, otherwise False
+        """
+        with self._lock_:
+            if self._state_ == self.CLOSED:
+                return True
+            if self._state_ == self.OPEN:
+                if time.monotonic() < self._open_until_:
+                    return False
+                self._state_ = self.HALF_OPEN
+                self._trial_ = False
+            if self._trial_:
+                return False
+            self._trial_ = True
+            return True
+
+    def release(self):
+        """
+        This function give back the permission of allow() for a request which was not sent.
+        """
+        with self._lock_:
+            self._trial_ = False
+
+    def record_success(self):
+        """
+        This function record a successful request and close the breaker.
+        """
+        with self._lock_:
+            self._failures_ = 0
+            self._trial_ = False
+            self._state_ = self.CLOSED
+
+    def record_failure(self, retry_after=None):
+        """
+        This function record a failed request. The breaker opens, if the failure threshold
+        is reached, the trial request of the half open state failed or the service asked to
+        wait.
+        param retry_after: the time in seconds the service asked to wait, or None
+        :return: True if the breaker was opened, otherwise False
+        """
+        with self._lock_:
+            self._failures_ += 1
+            self._trial_ = False
+            if retry_after is None and self._state_ != self.HALF_OPEN and self._failures_ < self.failure_threshold:
+                return False
+
+            timeout = self.reset_timeout if retry_after is None else max(retry_after, 0.0)
+            self._open_until_ = max(self._open_until_, time.monotonic() + timeout)
+            self._state_ = self.OPEN
+            return True
+
+
+class RequestScheduler:
+    """
+    The class 'RequestScheduler' is placed in front of the requests to the Spotify API. It
+    limits the request rate with a token bucket, so that all devices which share a client ID
+    stay within the quota, and stops the requests with a circuit breaker when the API
+    answers with 429 (Too Many Requests) or fails. The Retry-After header of a 429 response
+    keeps the breaker open for the requested time. A request which is rejected raises
+    SpotifyApiUnavailable, so the caller can fall back to the cached information.
+    """
+
+    DEFAULT_RATE = 2.0
+    """ The default number of requests per second """
+
+    DEFAULT_BURST = 10
+    """ The default number of requests which can be sent at once """
+
+    DEFAULT_FAILURE_THRESHOLD = 5
+    """ The default number of failures in a row which open the circuit breaker """
+
+    DEFAULT_RESET_TIMEOUT = 30.0
+    """ The default time in seconds the circuit breaker stays open """
+
+    DEFAULT_MAX_WAIT = 2.0
+    """ The default maximum time in seconds a request waits for the token bucket """
+
+    def __init__(self, rate=None, burst=None, failure_threshold=None, reset_timeout=None, max_wait=None):
+        """
+        Initialize self. See help(self) for accurate signature.
+        param rate: the number of requests per second
+        param burst: the number of requests which can be sent at once
+        param failure_threshold: the number of failures in a row which open the circuit breaker
+        param reset_timeout: the time in seconds the circuit breaker stays open
+        param max_wait: the maximum time in seconds a request waits for the token bucket
+        """
+        self.log = Logger()
+        self.name = os.path.basename(__file__)
+        self.bucket = TokenBucket(rate if rate is not None else self.DEFAULT_RATE,
+                                  burst if burst is not None else self.DEFAULT_BURST)
+        self.breaker = CircuitBreaker(failure_threshold if failure_threshold is not None else
+                                      self.DEFAULT_FAILURE_THRESHOLD,
+                                      reset_timeout if reset_timeout is not None else self.DEFAULT_RESET_TIMEOUT)
+        self.max_wait = max_wait if max_wait is not None else self.DEFAULT_MAX_WAIT
+
+    @staticmethod
+    def status_of(err):
+        """
+        This function return the HTTP status of an exception raised by spotipy.
+        param err: the exception
+        :return: the HTTP status or None
+        """
+        return getattr(err, 'http_status', None)
+
+    @staticmethod
+    def retry_after_of(err):
+        """
+        This function return the value of the Retry-After header of a 429 response.
+        param err: the exception raised by spotipy
+        :return: the time in seconds or None
+        """
+        headers = getattr(err, 'headers', None) or {}
+        try:
+            return float(headers.get('Retry-After'))
+        except (TypeError, ValueError):
+            return None
+
+    def is_failure(self, err):
+        """
+        This function check if an exception means that the API is throttling or unavailable.
+        Client errors like 404 (Not Found) are answers of a working API.
+        param err: the exception
+        :return: True if the exception counts as failure of the API
+        """
+        status = self.status_of(err)
+        return status is None or status == 429 or status >= 500
+
+    def call(self, endpoint, function, *args):
+        """
+        This function send a request, if the circuit breaker and the token bucket allow it.
+        param endpoint: the name of the endpoint, e.g. track
+        param function: the function which sends the request
+        param args: the arguments of the function
+        :return: the return value of the function
+        """
+        metrics = Metrics.instance()
+        if not self.breaker.allow():
+            metrics.increment('jukebox_api_rejected_total', {'endpoint': endpoint, 'reason': 'circuit_open'})
+            raise SpotifyApiUnavailable(retry_after=self.breaker.retry_after())
+
+        if not self.bucket.acquire(timeout=self.max_wait):
+            # the request is not sent, so it must not count as the trial request of the breaker
+            self.breaker.release()
+            metrics.increment('jukebox_api_rejected_total', {'endpoint': endpoint, 'reason': 'rate_limit'})
+            raise SpotifyApiUnavailable()
+
+        try:
+            result = function(*args)
+        except Exception as err:
+            if not self.is_failure(err):
+                self.breaker.record_success()
+                raise
+
+            retry_after = self.retry_after_of(err) if self.status_of(err) == 429 else None
+            if self.breaker.record_failure(retry_after):
+                metrics.increment('jukebox_api_circuit_opened_total')
+                self.log.write(message="Spotify API unavailable ({0}), pause requests for {1:.0f}s",
+                               args=(err, self.breaker.retry_after()),
+                               module=self.name,
+                               level=Logger.ERROR)
+            raise SpotifyApiUnavailable(retry_after=retry_after) from err
+
+        self.breaker.record_success()
+        return result
@@ -0,0 +1,160 @@
+import os
+import threading
+
+import requests
+import spotipy
+
+from requests.adapters import HTTPAdapter
+from spotipy.oauth2 import SpotifyClientCredentials
+from spotipy.cache_handler import MemoryCacheHandler
+from system.configuration import Config
+from system.logger import Logger
+from system.metrics import Metrics
+from spotify.requestscheduler import RequestScheduler
+
+
+class SpotifyApiClient:
+    """
+    The class 'SpotifyApiClient' is the application wide client for the Spotify Web API.
+    It holds one instance of spotipy.Spotify, which reuses the client credentials token
+    until it expires, and one requests.Session with a pool of keep-alive connections, so
+    that a lookup does not need a new token exchange and a new TLS handshake.
+    All requests pass the RequestScheduler, which limits the request rate and stops the
+    requests while the API is throttling or failing. spotipy itself does not retry.
+    The shared instance is returned by SpotifyApiClient.instance().
+    """
+
+    DEFAULT_POOL_SIZE = 4
+    """ The maximum number of keep-alive connections per host """
+
+    DEFAULT_TIMEOUT = 5
+    """ The timeout of a request to the Spotify API in seconds """
+
+    MAX_ARTISTS = 50
+    """ The maximum number of artist IDs of one request to the artists endpoint """
+
+    _instance_ = None
+    _instance_lock_ = threading.Lock()
+
+    @classmethod
+    def instance(cls):
+        """
+        This function return the shared instance of SpotifyApiClient. The instance is created
+        on the first call.
+        :return: an instance of SpotifyApiClient
+        """
+        if cls._instance_ is None:
+            with cls._instance_lock_:
+                if cls._instance_ is None:
+                    cls._instance_ = cls()
+        return cls._instance_
+
+    def __init__(self, client_id=None, client_secret=None, pool_size=None, timeout=None):
+        """
+        Initialize self. See help(self) for accurate signature.
+        Parameters that are not given are taken from the configuration.
+        param client_id: the Spotify API client ID
+        param client_secret: the Spotify API client secret
+        param pool_size: the maximum number of keep-alive connections per host
+        param timeout: the timeout of a request in seconds
+        """
+        cfg = Config().parser
+        self.log = Logger()
+        self.name = os.path.basename(__file__)
+
+        client_id = client_id if client_id is not None else cfg.get('spotify', 'clientid')
+        client_secret = client_secret if client_secret is not None else cfg.get('spotify', 'clientsecret')
+        pool_size = pool_size if pool_size is not None else self.DEFAULT_POOL_SIZE
+        timeout = timeout if timeout is not None else self.DEFAULT_TIMEOUT
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=2, pool_maxsize=pool_size)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+        self.credentials = SpotifyClientCredentials(client_id=client_id,
+                                                    client_secret=client_secret,
+                                                    cache_handler=MemoryCacheHandler(),
+                                                    requests_session=self.session,
+                                                    requests_timeout=timeout)
+        self.spotify = spotipy.Spotify(client_credentials_manager=self.credentials,
+                                       requests_session=self.session,
+                                       requests_timeout=timeout,
+                                       retries=0,
+                                       status_retries=0)
+        self.scheduler = RequestScheduler(
+            rate=cfg.getfloat('spotify', 'apirate', fallback=RequestScheduler.DEFAULT_RATE),
+            burst=cfg.getint('spotify', 'apiburst', fallback=RequestScheduler.DEFAULT_BURST),
+            failure_threshold=cfg.getint('spotify', 'apifailures', fallback=RequestScheduler.DEFAULT_FAILURE_THRESHOLD),
+            reset_timeout=cfg.getfloat('spotify', 'apicooldown', fallback=RequestScheduler.DEFAULT_RESET_TIMEOUT))
+
+        self.log.write(message="Spotify API client created.",
+                       module=self.name,
+                       level=Logger.DEBUG)
+
+    def track(self, track_id, market=None):
+        """
+        This function return the track information of the given track ID.
+        param track_id: a Spotify track ID
+        param market: an ISO 3166-1 alpha-2 country code or None
+        :return: the track object as dict
+        """
+        return self._call_('track', self.spotify.track, track_id, market)
+
+    def episode(self, episode_id, market=None):
+        """
+        This function return the episode information of the given episode ID.
+        param episode_id: a Spotify episode ID
+        param market: an ISO 3166-1 alpha-2 country code or None
+        :return: the episode object as dict
+        """
+        return self._call_('episode', self.spotify.episode, episode_id, market)
+
+    def artist(self, artist_id):
+        """
+        This function return the artist information of the given artist ID.
+        param artist_id: a Spotify artist ID
+        :return: the artist object as dict
+        """
+        return self._call_('artist', self.spotify.artist, artist_id)
+
+    def artists(self, artist_ids):
+        """
+        This function return the artist information of the given artist IDs. The IDs are
+        requested in batches of MAX_ARTISTS, so a track with several artists costs one request.
+        param artist_ids: a list of Spotify artist IDs
+        :return: a list of artist objects in the order of the IDs, None for unknown IDs
+        """
+        artists = []
+        for index in range(0, len(artist_ids), self.MAX_ARTISTS):
+            batch = artist_ids[index:index + self.MAX_ARTISTS]
+            response = self._call_('artists', self.spotify.artists, batch)
+            artists.extend(response.get('artists', []))
+        return artists
+
+    def audio_features(self, track_ids):
+        """
+        This function return the audio features of the given track IDs.
+        param track_ids: a Spotify track ID or a list of IDs
+        :return: a list of audio feature objects
+        """
+        return self._call_('audio_features', self.spotify.audio_features, track_ids)
+
+    def _call_(self, endpoint, function, *args):
+        """
+        This function call a function of spotipy through the request scheduler and record its
+        duration and failures in the metrics. SpotifyApiUnavailable is raised if the scheduler
+        rejects the request or the API is throttling or failing.
+        param endpoint: the name of the endpoint, e.g. track
+        param function: the function of spotipy
+        param args: the arguments of the function
+        :return: the return value of the function
+        """
+        metrics = Metrics.instance()
+        labels = {'endpoint': endpoint}
+        try:
+            with metrics.timer('jukebox_api_request_seconds', labels):
+                return self.scheduler.call(endpoint, function, *args)
+        except Exception:
+            metrics.increment('jukebox_api_errors_total', labels)
+            raise
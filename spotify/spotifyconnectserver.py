@@ -1,11 +1,16 @@
 import os
-import subprocess
-import paho.mqtt.client as mqtt
 
-from kivy.event import EventDispatcher
+from concurrent.futures import ThreadPoolExecutor
+from system.eventdispatcher import EventDispatcher
 from system.configuration import Config
 from system.logger import Logger
-from spotify.spotifyerror import MQTTConnectionRefused as MQTTConnectionRefusedError
+from system.metrics import Metrics
+from system.startupprofiler import StartupProfiler
+from spotify.eventrelay import EventRelay
+from spotify.eventtransport import EventTransport
+from spotify.nowplayingrecord import NowPlayingRecord
+from system.healthmonitor import HealthMonitor
+from spotify.librespotsupervisor import LibrespotSupervisor
 
 
 class SpotifyConnectServer(EventDispatcher):
@@ -14,6 +19,10 @@ class SpotifyConnectServer(EventDispatcher):
     the screen, the dictionary 'ids' of the MpdGui screen must be specified during instantiation.
     """
 
+    TRANSPORT_OPTIONS = {('system', 'mqtthost'), ('system', 'mqttport'), ('system', 'mqttkeepalive'),
+                         ('system', 'eventtransport'), ('system', 'nowplayingtopic')}
+    """ The options of the configuration which require a restart of the event transport """
+
     def __init__(self, **kwargs):
         """
         Initialize self. See help(self) for accurate signature.
@@ -25,20 +34,36 @@ class SpotifyConnectServer(EventDispatcher):
         self.repeat = False
         self.random = False
         self._event_ = None
-        self._process_ = None
+        self.supervisor = None
         self._spotify_ = None
-        self._mqtt_client_ = None
+        self._transport_ = None
+        self._event_relay_ = None
         self.running = False
+        self.health_monitor = HealthMonitor()
 
         self.register_event_type('on_track_event')
         self.register_event_type('on_player_event')
+        self.register_event_type('on_preload_event')
+        self.register_event_type('on_now_playing_record')
+
+        Config().add_listener(self.on_config_changed)
 
         super(SpotifyConnectServer, self).__init__(**kwargs)
 
+    @property
+    def uses_broker(self):
+        """
+        True if the configured event transport depends on the MQTT broker.
+        """
+        if self._transport_ is not None:
+            return self._transport_.uses_broker
+        return self.cfg.get('system', 'eventtransport', fallback=EventTransport.MQTT) != EventTransport.SOCKET
+
     def start(self):
         """
-        This function start librespot and a MQTT client which is listen to the configured
-        broker for inter process communication.
+        This function start librespot and the event transport, which is either a MQTT client
+        listening to the configured broker or the direct delivery of the events received by
+        the event relay.
         """
         spotify_bitrate = self.cfg.getint('spotify', 'bitrate')
         spotify_name = self.cfg.get('spotify', 'name')
@@ -48,8 +73,10 @@ class SpotifyConnectServer(EventDispatcher):
         spotify_event_gateway = self.cfg.get('spotify', 'eventGateway')
         volume_normalization = self.cfg.getboolean('spotify', 'normalization')
         librespot_bin = self.cfg.get('system', 'librespot')
+        event_socket = self.cfg.get('system', 'eventsocket',
+                                    fallback="/tmp/{appname}-events.sock".format(appname=Config.DEFAULT_APPNAME))
 
-        _mqtt_is_running_ = False
+        _transport_is_running_ = False
         _librespot_is_running_ = False
 
         cmd = [librespot_bin,
@@ -63,49 +90,97 @@ class SpotifyConnectServer(EventDispatcher):
         if volume_normalization is True:
             cmd.append('--enable-volume-normalisation')
 
-        self.log.write(message="{cmd}".format(cmd=cmd),
+        self.log.write(message="{0}", args=(cmd,),
                        module=self.name,
                        level=Logger.DEBUG)
 
-        self._process_ = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-        _librespot_is_running_ = self._process_.poll() is None
+        self._transport_ = self._create_transport_()
 
+        # librespot passes its environment to the event gateway, which sends the events to the relay
+        env = dict(os.environ)
         try:
-            self._mqtt_client_ = mqtt.Client()
-            self._mqtt_client_.on_connect = self.on_connect
-            self._mqtt_client_.on_message = self.on_message
-            self._mqtt_client_.connect(self.cfg.get('system', 'mqttHost'), port=self.cfg.getint('system', 'mqttPort'))
-            self._mqtt_client_.loop_start()
-            _mqtt_is_running_ = True
-
-            self.log.write(message="Successfully connect to MQTT broker",
-                           module=self.name,
-                           level=Logger.DEBUG)
-
-        except ConnectionRefusedError as err:
-            self.log.write(message="Failed to connect to MQTT broker: {err}".format(err=err),
+            self._event_relay_ = EventRelay(event_socket, self.on_relay_event)
+            self._event_relay_.start()
+            env[EventRelay.ENV_SOCKET] = event_socket
+        except OSError as err:
+            self._event_relay_ = None
+            if not self._transport_.uses_broker:
+                # without the relay and the broker no event can be received
+                raise
+            self.log.write(message="Unable to start event relay, use MQTT in the event gateway: {err}".format(err=err),
                            module=self.name,
                            level=Logger.ERROR)
-            self._process_.kill()
-            raise MQTTConnectionRefusedError
 
-        self.running = _mqtt_is_running_ and _librespot_is_running_
+        # librespot and the connection to the broker are started in parallel
+        transport_start = ThreadPoolExecutor(max_workers=1, thread_name_prefix='jukebox-transport-start')
+        transport_future = transport_start.submit(self._start_transport_)
+        transport_start.shutdown(wait=False)
+
+        # the supervisor reads the output of librespot and restarts it, if it exits
+        self.supervisor = LibrespotSupervisor(cmd, env=env, health_monitor=self.health_monitor)
+        try:
+            with StartupProfiler.instance().phase('librespot'):
+                self.supervisor.start()
+        except OSError:
+            if transport_future.exception() is None:
+                self._transport_.stop()
+            self.stop_event_relay()
+            raise
+        _librespot_is_running_ = self.supervisor.running
+
+        try:
+            transport_future.result()
+            _transport_is_running_ = True
+
+        except Exception:
+            self.supervisor.stop()
+            self.stop_event_relay()
+            raise
+
+        self.running = _transport_is_running_ and _librespot_is_running_
         if self.running:
             self.log.write(message="SpotifyConnectServer is running.",
                            module=self.name,
                            level=Logger.INFO)
 
+    def _start_transport_(self):
+        """
+        This function start the event transport. It runs in parallel to the start of librespot.
+        """
+        with StartupProfiler.instance().phase('event transport'):
+            self._transport_.start()
+
     def stop(self):
         """
         This function call the cancel() function of self._event_ instance of class 'kivy.clock.Clock'
         to unschedule the calling of self.observer() and set the value of self.running to False.
         """
-        if self._process_ is not None:
-            self._process_.kill()
-        if self._mqtt_client_ is not None:
-            self._mqtt_client_.loop_stop()
+        if self.supervisor is not None:
+            self.supervisor.stop()
+        if self._transport_ is not None:
+            self._transport_.stop()
+        self.stop_event_relay()
         self.running = False
 
+    def _create_transport_(self):
+        """
+        This function create the configured event transport. A transport which does not depend
+        on the MQTT broker removes the state of the broker from the health monitor.
+        :return: an instance of a subclass of EventTransport
+        """
+        transport = EventTransport.from_config(self.on_event, on_state=self.on_broker_state)
+        if not transport.uses_broker:
+            self.health_monitor.clear_state(HealthMonitor.BROKER)
+        return transport
+
+    def stop_event_relay(self):
+        """
+        This function stop the event relay, if it is running.
+        """
+        if self._event_relay_ is not None:
+            self._event_relay_.stop()
+            self._event_relay_ = None
+
     def restart(self):
         """
         This function restart the librespot daemon and MQTT client. The functions stop() and start()
@@ -115,63 +190,147 @@ class SpotifyConnectServer(EventDispatcher):
         self.stop()
         self.start()
 
-    def on_connect(self, client, userdata, flags, rc):
-        """
-        This function is called by mqtt client if receives a CONACK.
-        param client: the mqtt client as instance of paho.mqtt.client.Client()
-        param userdata: the private user data as set in Client() or user_data_set()
-        param flags: response flags sent by the broker
-        param rc: the result code,
-            0: Connection successful
-            1: Connection refused - incorrect protocol version
-            2: Connection refused - invalid client identifier
-            3: Connection refused - server unavailable
-            4: Connection refused - bad username or password
-            5: Connection refused - not authorised
-            6-255: Currently unused.
-        """
-        if rc == 0:
-            client.subscribe("spotify/#")
-            self.log.write(message="spotify/# channel subscribed.",
-                           module=self.name,
-                           level=Logger.INFO)
-            self.log.write(message="userdata: {userdata}, flags: {flags}".format(userdata=userdata, flags=flags),
+    def on_config_changed(self, changed):
+        """
+        This function is called by Config when the configuration file changed. If an option of
+        the event transport changed, e.g. the MQTT host, the event transport is restarted.
+        param changed: a set of the changed options as tuples (section, option)
+        """
+        if not self.running or not changed & self.TRANSPORT_OPTIONS:
+            return
+
+        self.log.write(message="Event transport configuration changed, restart the event transport.",
+                       module=self.name,
+                       level=Logger.INFO)
+        if self._transport_ is not None:
+            self._transport_.stop()
+        try:
+            self._transport_ = self._create_transport_()
+            self._transport_.start()
+        except Exception as err:
+            self.log.write(message="Unable to restart the event transport: {err}".format(err=err),
                            module=self.name,
-                           level=Logger.DEBUG)
+                           level=Logger.ERROR)
 
-    def on_message(self, client, userdata, msg):
+    def on_broker_state(self, connected):
         """
-        Called when a message has been received on a topic that the client subscribes to and the
-        message does not match an existing topic filter callback.
-        param client: the mqtt client as instance of paho.mqtt.client.Client()
-        param userdata: the private user data as set in Client() or user_data_set()
-        param msg: an instance of MQTTMessage. This is a class with members topic, payload, qos, retain.
+        This function is called by the event transport when the connection to the MQTT broker
+        is established or lost and pass the state to the health monitor.
+        param connected: True if the broker is connected, otherwise False
         """
-        if msg.topic == "spotify/track_event":
-            payload = msg.payload.decode("utf-8")
+        self.health_monitor.set_state(HealthMonitor.BROKER, connected)
+
+    def publish_message(self, topic, payload, retain=False):
+        """
+        This function publish a message of the application, e.g. the metrics, to the MQTT
+        broker, if the event transport uses the broker.
+        param topic: the topic of the message, e.g. jukebox/metrics
+        param payload: the payload of the message as string
+        param retain: True if the broker should keep the message for future subscribers
+        """
+        if self._transport_ is not None:
+            self._transport_.publish_message(topic, payload, retain=retain)
+
+    @property
+    def now_playing_topic(self):
+        """
+        The MQTT topic of the retained now playing record, empty if the record is disabled.
+        """
+        return self.cfg.get('system', 'nowplayingtopic', fallback=NowPlayingRecord.DEFAULT_TOPIC)
+
+    def publish_now_playing(self, now_playing, playing=True, background_key=None):
+        """
+        This function publish the now playing record as retained message, so that a restarted
+        application or a new display shows the current track without a request to the
+        Spotify API.
+        param now_playing: the now playing dictionary of the metadata pipeline
+        param playing: True if the track is playing, False if the playback is stopped
+        param background_key: the background cache key of the rendered background image or None
+        """
+        topic = self.now_playing_topic
+        if topic:
+            self.publish_message(topic, NowPlayingRecord.encode(now_playing, playing=playing,
+                                                                background_key=background_key), retain=True)
+
+    def on_relay_event(self, event):
+        """
+        This function is called by the event relay for every librespot event sent by the
+        event gateway. The event is handed over to the event transport, which publishes it
+        to the MQTT broker or delivers it directly.
+        param event: the event as dictionary of librespot environment variables
+        """
+        self.log.write(message="on_relay_event::{0}", args=(event,),
+                       module=self.name,
+                       level=Logger.DEBUG)
+        if self._transport_ is None:
+            return
+
+        for topic, payload in EventRelay.topics(event):
+            self._transport_.publish(topic, payload)
+
+    def on_event(self, topic, payload):
+        """
+        This function is called by the event transport when an event is received and dispatch
+        the corresponding event of this class.
+        param topic: the topic of the event, e.g. spotify/track_event
+        param payload: the payload of the event as string
+        """
+        with Metrics.instance().timer('jukebox_event_dispatch_seconds', {'topic': topic}):
+            self._dispatch_event_(topic, payload)
+
+    def _dispatch_event_(self, topic, payload):
+        """
+        This function dispatch the event of this class which corresponds to the topic.
+        param topic: the topic of the event, e.g. spotify/track_event
+        param payload: the payload of the event as string
+        """
+        if topic == "spotify/track_event":
             self.dispatch('on_track_event', payload)
-            self.log.write(message="on_message::{client}, {userdata}, {msg}".format(client=client, userdata=userdata, msg=payload),
+            self.log.write(message="on_event::{0}, {1}", args=(topic, payload),
                            module=self.name,
                            level=Logger.DEBUG)
 
-        elif msg.topic == "spotify/player_event":
-            payload = msg.payload.decode("utf-8")
+        elif topic == "spotify/preload_event":
+            self.dispatch('on_preload_event', payload)
+            self.log.write(message="on_event::{0}, {1}", args=(topic, payload),
+                           module=self.name,
+                           level=Logger.DEBUG)
+
+        elif topic == "spotify/player_event":
             self.dispatch('on_player_event', payload)
-            self.log.write(message="on_message::{client}, {userdata}, {msg}".format(client=client, userdata=userdata, msg=payload),
+            self.log.write(message="on_event::{0}, {1}", args=(topic, payload),
+                           module=self.name,
+                           level=Logger.DEBUG)
+
+        elif topic == self.now_playing_topic:
+            now_playing = NowPlayingRecord.decode(payload)
+            self.log.write(message="on_event::{0}, {1}", args=(topic, payload),
                            module=self.name,
                            level=Logger.DEBUG)
+            if now_playing is not None:
+                self.dispatch('on_now_playing_record', now_playing)
 
         else:
-            self.log.write(message="on_message::Unknown topic {topic} on subscribed channel.".format(topic=msg.topic),
+            self.log.write(message="on_event::Unknown topic {0} on subscribed channel.", args=(topic,),
                            module=self.name,
                            level=Logger.DEBUG)
 
     def on_track_event(self, *args):
-        self.log.write(message="on_track_event::{args} called.".format(args=args),
+        self.log.write(message="on_track_event::{0} called.", args=(args,),
                        module=self.name,
                        level=Logger.DEBUG)
 
     def on_player_event(self, args):
-        self.log.write(message="on_player_event::{args} called.".format(args=args),
+        self.log.write(message="on_player_event::{0} called.", args=(args,),
+                       module=self.name,
+                       level=Logger.DEBUG)
+
+    def on_preload_event(self, *args):
+        self.log.write(message="on_preload_event::{0} called.", args=(args,),
+                       module=self.name,
+                       level=Logger.DEBUG)
+
+    def on_now_playing_record(self, *args):
+        self.log.write(message="on_now_playing_record::{0} called.", args=(args,),
                        module=self.name,
                        level=Logger.DEBUG)
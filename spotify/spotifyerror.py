@@ -6,5 +6,12 @@ class MQTTConnectionRefused(Exception):
 
 class SpotifyApiError(Exception):
     def __init__(self, message="SpotifyApiError: somthing is wrong."):
-        self.message = Exception
+        self.message = message
         super().__init__(self.message)
+
+
+class SpotifyApiUnavailable(SpotifyApiError):
+    def __init__(self, message="SpotifyApiUnavailable: the Spotify API is rate limited or unavailable.",
+                 retry_after=None):
+        self.retry_after = retry_after
+        super().__init__(message)
@@ -2,6 +2,45 @@
 
 import os
 import sys
+
+"""
+The spotifyeventgateway.py is the script that gets run when one of librespot's events is triggered.
+
+If librespot is started by SpotifyConnectServer, the environment variable JUKEBOX_EVENT_SOCKET
+holds the path of the Unix domain socket of the long-lived event relay (spotify/eventrelay.py).
+In this case the event is sent as one datagram to the relay and the script ends immediately,
+without importing paho, parsing the configuration or connecting to the MQTT broker.
+
+Otherwise, or if the relay is not reachable, it connect to a MQTT broker and publish the events.
+MQTT topics:
+    spotify/player_event:  is published when librespot event PLAYER_EVENT occurred
+    spotify/track_event:   is published when librespot publish the spotify track id
+    spotify/preload_event: is published with the track id of the next track when librespot
+                           starts to preload it (PLAYER_EVENT 'preloading')
+The payload of the track and preload events is the Spotify URI (spotify:track:<id> or
+spotify:episode:<id>), if librespot reports the type of the item, otherwise the Spotify ID.
+"""
+
+# keep in sync with EventRelay.ENV_SOCKET and EventRelay.EVENT_VARIABLES
+event_socket = os.environ.get('JUKEBOX_EVENT_SOCKET', None)
+if event_socket:
+    import json
+    import socket
+
+    event = {}
+    for variable in ('PLAYER_EVENT', 'TRACK_ID', 'OLD_TRACK_ID', 'DURATION_MS', 'POSITION_MS', 'VOLUME',
+                     'ITEM_TYPE', 'URI'):
+        if variable in os.environ:
+            event[variable] = os.environ[variable]
+
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM) as sock:
+            sock.sendto(json.dumps(event).encode("utf-8"), event_socket)
+        sys.exit(0)
+    except OSError:
+        # the relay is not running, use the MQTT broker
+        pass
+
 import paho.mqtt.client as mqtt
 
 from pathlib import Path
@@ -10,51 +49,32 @@ jukebox_sys_path = Path(os.path.abspath(os.path.dirname(__file__))).parent
 sys.path.insert(0, "{path}".format(path=jukebox_sys_path))
 from system.logger import Logger
 from system.configuration import Config
+from spotify.eventrelay import EventRelay
 
 
-"""
-The spotifyeventgateway.py is the script that gets run when one of librespot's events is triggered.
-It connect to a MQTT broker and publish the events.
-MQTT topics:
-    spotify/player_event: is published when librespot event PLAYER_EVENT occurred
-    spotify/track_id:     is published when librespot publish the spotify track id
-"""
-
 name = os.path.basename(__file__)
 cfg = Config().parser
+log = Logger()
 host = cfg.get('system', 'mqttHost')
 port = cfg.getint('system', 'mqttPort')
 keep_alive = cfg.getint('system', 'mqttKeepAlive')
 
 player_event = os.environ.get('PLAYER_EVENT', None)
-Logger().write(message="Player event: {event}".format(event=player_event), module=name, level=Logger.DEBUG)
-try:
-    if player_event is not None:
-        client = mqtt.Client()
-        client.connect(host, port=port, keepalive=keep_alive)
-        client.publish("spotify/player_event", player_event)
-        client.disconnect()
-        Logger().write(message="Message successfully sent to MQTT broker.",
-                       module=name,
-                       level=Logger.DEBUG)
-except ConnectionRefusedError as err:
-    Logger().write(message="Failed to connect to MQTT broker: {err}".format(err=err),
-                   module=name,
-                   level=Logger.ERROR)
-
-
 track_id = os.environ.get('TRACK_ID', None)
-Logger().write(message="Track event: {event}".format(event=track_id), module=name, level=Logger.DEBUG)
+log.write(message="Player event: {event}".format(event=player_event), module=name, level=Logger.DEBUG)
+log.write(message="Track event: {event}".format(event=track_id), module=name, level=Logger.DEBUG)
 try:
-    if track_id is not None:
+    if player_event is not None or track_id is not None:
         client = mqtt.Client()
         client.connect(host, port=port, keepalive=keep_alive)
-        client.publish("spotify/track_event", track_id)
+        event = {variable: os.environ[variable] for variable in EventRelay.EVENT_VARIABLES if variable in os.environ}
+        for topic, payload in EventRelay.topics(event):
+            client.publish(topic, payload)
         client.disconnect()
-        Logger().write(message="Message successfully sent to MQTT broker.",
-                       module=name,
-                       level=Logger.DEBUG)
+        log.write(message="Message successfully sent to MQTT broker.",
+                  module=name,
+                  level=Logger.DEBUG)
 except ConnectionRefusedError as err:
-    Logger().write(message="Failed to connect to MQTT broker: {err}".format(err=err),
-                   module=name,
-                   level=Logger.ERROR)
+    log.write(message="Failed to connect to MQTT broker: {err}".format(err=err),
+              module=name,
+              level=Logger.ERROR)
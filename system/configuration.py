@@ -1,4 +1,6 @@
 import os
+import sys
+import threading
 import configparser
 
 from pathlib import Path
@@ -14,6 +16,10 @@ class Config:
     user-specific settings / config files have priority.
     To get access to the configuration, the member parser must be used. This is an instance
     of configparser.ConfigParser.
+    The configuration is loaded once per process, every Config() returns the same instance.
+    With start_watching() the configuration file is checked for changes. A changed file is
+    read into the same parser and the listeners registered with add_listener() are notified,
+    so that settings can be applied without a restart.
     """
 
     DEFAULT_APPNAME = "jukebox"
@@ -31,13 +37,44 @@ class Config:
     DEFAULT_KV_DIR = PY_DIR_PARENT.joinpath("ui", "kv")
     """ The default location for kv, icons and images used ba user interface. """
 
+    DEFAULT_WATCH_INTERVAL = 2.0
+    """ The default interval in seconds in which the configuration file is checked for changes """
+
+    _instance_ = None
+    _instance_lock_ = threading.RLock()
+
+    def __new__(cls):
+        """
+        Return the process wide instance of Config. It is created on the first call.
+        """
+        if cls._instance_ is None:
+            with cls._instance_lock_:
+                if cls._instance_ is None:
+                    cls._instance_ = super(Config, cls).__new__(cls)
+        return cls._instance_
+
     def __init__(self):
         """
         Initialize self. See help(self) for accurate signature.
         Test if one of the config files exists and set the path of them to self.config_path.
         In case that no file exist, set the value of self.config_file to None, set the mandatory
         parameters default values and write it to $HOME/.config/jukebox/gui.ini.
+        The configuration is only loaded by the first call, all following calls return immediately.
         """
+        with self._instance_lock_:
+            if getattr(self, '_loaded_', False):
+                return
+            self._load_()
+            self._loaded_ = True
+
+    def _load_(self):
+        """
+        This function find and read the configuration file.
+        """
+        self._listeners_ = []
+        self._watcher_ = None
+        self._watching_ = threading.Event()
+
         if os.path.isfile(os.path.join(str(Path.home()), self.DEFAULT_CONFIG_FILE)):
             self.config_file = os.path.join(str(Path.home()), self.DEFAULT_CONFIG_FILE)
         elif os.path.isfile(os.path.join(str(Path.home()), ".{appname}.ini".format(appname=self.DEFAULT_APPNAME))):
@@ -55,11 +92,120 @@ class Config:
         else:
             self.parser.read(self.config_file)
 
+        self._mtime_ = self._get_mtime_()
+
         if self.parser.getboolean("system", "kivylog") is True:
             os.environ["KIVY_NO_CONSOLELOG"] = "1"
         else:
             os.environ["KIVY_NO_CONSOLELOG"] = "0"
 
+    def add_listener(self, callback):
+        """
+        This function register a callback which is called when the configuration file changed.
+        The callback is called from the watcher thread with a set of the changed options as
+        tuples (section, option).
+        param callback: a callable
+        """
+        with self._instance_lock_:
+            if callback not in self._listeners_:
+                self._listeners_.append(callback)
+
+    def remove_listener(self, callback):
+        """
+        This function remove a callback registered with add_listener().
+        param callback: a callable
+        """
+        with self._instance_lock_:
+            if callback in self._listeners_:
+                self._listeners_.remove(callback)
+
+    def start_watching(self, interval=None):
+        """
+        This function start a thread which check the configuration file for changes in the given
+        interval. Only the modification time is compared, the file is read only if it changed.
+        param interval: the interval in seconds
+        """
+        interval = interval if interval is not None else self.DEFAULT_WATCH_INTERVAL
+        with self._instance_lock_:
+            if self._watcher_ is not None:
+                return
+            self._watching_.clear()
+            self._watcher_ = threading.Thread(target=self._watch_, args=(interval,),
+                                              name="jukebox-config-watcher", daemon=True)
+            self._watcher_.start()
+
+    def stop_watching(self):
+        """
+        This function stop the thread started by start_watching().
+        """
+        with self._instance_lock_:
+            self._watching_.set()
+            self._watcher_ = None
+
+    def _watch_(self, interval):
+        """
+        The loop of the watcher thread.
+        param interval: the interval in seconds
+        """
+        while not self._watching_.wait(interval):
+            self.check_for_changes()
+
+    def _get_mtime_(self):
+        """
+        This function return the modification time of the configuration file.
+        :return: the modification time or None
+        """
+        try:
+            return os.stat(self.config_file).st_mtime_ns
+        except (OSError, TypeError):
+            return None
+
+    def check_for_changes(self):
+        """
+        This function read the configuration file again, if its modification time changed, and
+        notify the listeners about the changed options.
+        :return: a set of the changed options as tuples (section, option)
+        """
+        mtime = self._get_mtime_()
+        if mtime is None or mtime == self._mtime_:
+            return set()
+
+        parser = configparser.ConfigParser()
+        try:
+            parser.read(self.config_file)
+        except configparser.Error:
+            # the file is probably written at the moment, try it again at the next check
+            return set()
+
+        with self._instance_lock_:
+            self._mtime_ = mtime
+            changed = set()
+            for section in set(self.parser.sections()) | set(parser.sections()):
+                old = dict(self.parser.items(section)) if self.parser.has_section(section) else {}
+                new = dict(parser.items(section)) if parser.has_section(section) else {}
+                for option in set(old) | set(new):
+                    if old.get(option) != new.get(option):
+                        changed.add((section, option))
+
+            # update the parser in place, because the instance is referenced everywhere
+            for section, option in changed:
+                if parser.has_option(section, option):
+                    if not self.parser.has_section(section):
+                        self.parser.add_section(section)
+                    self.parser.set(section, option, parser.get(section, option, raw=True))
+                else:
+                    self.parser.remove_option(section, option)
+            listeners = list(self._listeners_)
+
+        if changed:
+            for callback in listeners:
+                try:
+                    callback(changed)
+                except Exception as err:
+                    # the logger reads the configuration, so the error is written to stderr
+                    sys.stderr.write("Config listener {callback} failed: {err!r}\n".format(callback=callback, err=err))
+        return changed
+
     def print(self):
         """
         This function print the configuration to stdout
@@ -88,7 +234,19 @@ class Config:
             'showcontrols': 'yes',
             'kivylog': 'no',
             'logFile': '/var/log/{app}.log'.format(app=self.DEFAULT_APPNAME),
-            'librespot': '/usr/bin/librespot'
+            'logMaxSize': 10,
+            'logBackups': 3,
+            'librespot': '/usr/bin/librespot',
+            'librespotrestartdelay': 1,
+            'librespotmaxrestartdelay': 60,
+            'eventtransport': 'mqtt',
+            'eventsocket': '/tmp/{app}-events.sock'.format(app=self.DEFAULT_APPNAME),
+            'metricsfile': '',
+            'metricstopic': 'jukebox/metrics',
+            'metricsinterval': 30,
+            'nowplayingtopic': 'jukebox/now_playing',
+            'cacheservice': '',
+            'cacheserviceport': 8765
         }
 
         self.parser['spotify'] = {
@@ -99,9 +257,19 @@ class Config:
             'initialvolume': 75,
             'devicetype': 'avr',
             'normalization': 'no',
+            'market': 'DE',
+            'apirate': 2,
+            'apiburst': 10,
+            'apifailures': 5,
+            'apicooldown': 30,
             'clientid': '',
             'clientsecret': '',
-            'eventgateway': '{cwd}/spotify/spotifyeventgateway.py'.format(cwd=os.getcwd())
+            'eventgateway': '{cwd}/spotify/spotifyeventgateway.py'.format(cwd=os.getcwd()),
+            'metadatacache': str(home.joinpath('.cache', self.DEFAULT_APPNAME, 'metadata.db')),
+            'metadatacachesize': 5000,
+            'metadatacachettl': 604800,
+            'backgroundcache': str(home.joinpath('.cache', self.DEFAULT_APPNAME, 'backgrounds')),
+            'backgroundcachesize': 100
         }
 
         if os.path.isdir(self.DEFAULT_CONFIG_PATH) is False:
@@ -0,0 +1,77 @@
+import threading
+
+
+class EventDispatcher:
+    """
+    The class 'EventDispatcher' is a small replacement of kivy.event.EventDispatcher for
+    the classes which must work without Kivy, e.g. in the headless daemon jukeboxd.py. It
+    has the same interface for events: an event type is registered with
+    register_event_type(), handlers are bound with bind(on_<event>=callback) and
+    dispatch() calls them with the instance and the arguments of the event. Like in Kivy,
+    the handlers are called in reverse order of binding, a handler which returns True stops
+    the dispatch, and the default handler, the method of the same name, is called last.
+    Kivy properties are not supported. The handlers are called on the dispatching thread.
+    """
+
+    def __init__(self, **kwargs):
+        """
+        Initialize self. See help(self) for accurate signature.
+        param kwargs: handlers which are bound, e.g. on_track_event=callback
+        """
+        self._handlers_lock_ = threading.Lock()
+        if not hasattr(self, '_handlers_'):
+            self._handlers_ = {}
+        self.bind(**kwargs)
+
+    def register_event_type(self, event_type):
+        """
+        This function register an event type. The class must have a default handler, which
+        is a method with the name of the event type.
+        param event_type: the name of the event, which must start with 'on_'
+        """
+        if not event_type.startswith('on_'):
+            raise Exception("A new event must start with 'on_'")
+        if not callable(getattr(self, event_type, None)):
+            raise Exception("Missing default handler {0} in {1}".format(event_type, self.__class__.__name__))
+        # the event types are registered before super().__init__() is called, like in Kivy
+        if not hasattr(self, '_handlers_'):
+            self._handlers_ = {}
+        self._handlers_.setdefault(event_type, [])
+
+    def bind(self, **kwargs):
+        """
+        This function bind handlers to registered event types.
+        param kwargs: the handlers, e.g. on_track_event=callback
+        """
+        with self._handlers_lock_:
+            for event_type, callback in kwargs.items():
+                if event_type not in self._handlers_:
+                    raise KeyError("Unknown event type {0}".format(event_type))
+                self._handlers_[event_type].append(callback)
+
+    def unbind(self, **kwargs):
+        """
+        This function remove handlers which were bound with bind().
+        param kwargs: the handlers, e.g. on_track_event=callback
+        """
+        with self._handlers_lock_:
+            for event_type, callback in kwargs.items():
+                handlers = self._handlers_.get(event_type, [])
+                if callback in handlers:
+                    handlers.remove(callback)
+
+    def dispatch(self, event_type, *args):
+        """
+        This function call the handlers of an event and afterward the default handler.
+        param event_type: the name of the event, e.g. on_track_event
+        param args: the arguments of the event
+        :return: True if a handler stopped the dispatch, otherwise the return value of the
+            default handler
+        """
+        with self._handlers_lock_:
+            handlers = list(self._handlers_.get(event_type, []))
+
+        for handler in reversed(handlers):
+            if handler(self, *args):
+                return True
+        return getattr(self, event_type)(*args)
@@ -0,0 +1,151 @@
+import os
+import select
+import threading
+
+from system.logger import Logger
+
+
+class HealthMonitor:
+    """
+    The class 'HealthMonitor' keeps track of the state of the components the application
+    depends on, e.g. the librespot process and the connection to the MQTT broker. The
+    components report their state changes, no component is polled. The liveness of a
+    process is watched through its pidfd (or a blocking wait as fallback) in a background
+    thread. Every state change is passed to the registered listeners.
+    """
+
+    LIBRESPOT = 'librespot'
+    BROKER = 'broker'
+
+    def __init__(self):
+        """
+        Initialize self. See help(self) for accurate signature.
+        """
+        self.log = Logger()
+        self.name = os.path.basename(__file__)
+        self._lock_ = threading.Lock()
+        self._state_ = {}
+        self._processes_ = {}
+        self._listeners_ = []
+
+    def add_listener(self, callback):
+        """
+        This function register a callback which is called when the state of a component
+        changed. The callback is called from the reporting thread with a copy of the state
+        dictionary, which maps the component names to True (healthy) or False.
+        param callback: a callable
+        """
+        with self._lock_:
+            if callback not in self._listeners_:
+                self._listeners_.append(callback)
+
+    def remove_listener(self, callback):
+        """
+        This function remove a callback registered with add_listener().
+        param callback: a callable
+        """
+        with self._lock_:
+            if callback in self._listeners_:
+                self._listeners_.remove(callback)
+
+    def get_state(self):
+        """
+        This function return the current state of all components.
+        :return: a dictionary which maps the component names to True or False
+        """
+        with self._lock_:
+            return dict(self._state_)
+
+    def is_healthy(self):
+        """
+        This function check if all reported components are healthy.
+        :return: True if no component is reported as unhealthy, otherwise False
+        """
+        with self._lock_:
+            return all(self._state_.values())
+
+    def set_state(self, component, healthy):
+        """
+        This function set the state of a component and notify the listeners, if it changed.
+        param component: the name of the component, e.g. HealthMonitor.LIBRESPOT
+        param healthy: True if the component is healthy, otherwise False
+        """
+        with self._lock_:
+            if self._state_.get(component) == healthy:
+                return
+            self._state_[component] = healthy
+            state = dict(self._state_)
+            listeners = list(self._listeners_)
+
+        self.log.write(message="{0} is {1}", args=(component, "up" if healthy else "down"),
+                       module=self.name,
+                       level=Logger.INFO if healthy else Logger.ERROR)
+        for callback in listeners:
+            callback(state)
+
+    def clear_state(self, component):
+        """
+        This function remove a component which is not used any longer.
+        param component: the name of the component
+        """
+        with self._lock_:
+            self._state_.pop(component, None)
+
+    def watch_process(self, component, process, on_exit=None):
+        """
+        This function report the component as healthy and start a thread which report it as
+        unhealthy when the process exits. A process which is replaced by a newer one of the
+        same component is not reported any longer.
+        param component: the name of the component, e.g. HealthMonitor.LIBRESPOT
+        param process: an instance of subprocess.Popen
+        param on_exit: an optional callable which is called with the return code of the process
+        """
+        with self._lock_:
+            self._processes_[component] = process
+        self.set_state(component, process.poll() is None)
+        thread = threading.Thread(target=self._watch_process_, args=(component, process, on_exit),
+                                  name="jukebox-watch-{0}".format(component), daemon=True)
+        thread.start()
+
+    def unwatch_process(self, component):
+        """
+        This function stop reporting the process of a component, e.g. before the process is
+        stopped on purpose, and remove the state of the component.
+        param component: the name of the component
+        """
+        with self._lock_:
+            self._processes_.pop(component, None)
+            self._state_.pop(component, None)
+
+    def _watch_process_(self, component, process, on_exit):
+        """
+        The loop of the process watcher thread. It waits until the process exits.
+        param component: the name of the component
+        param process: an instance of subprocess.Popen
+        param on_exit: an optional callable which is called with the return code of the process
+        """
+        pidfd = None
+        try:
+            pidfd = os.pidfd_open(process.pid)
+        except (AttributeError, OSError):
+            # pidfd is available since Linux 5.3 and Python 3.9
+            pass
+
+        if pidfd is not None:
+            try:
+                poller = select.poll()
+                poller.register(pidfd, select.POLLIN)
+                poller.poll()
+            finally:
+                os.close(pidfd)
+
+        returncode = process.wait()
+        self.log.write(message="{0} exited with return code {1}", args=(component, returncode),
+                       module=self.name,
+                       level=Logger.INFO)
+        with self._lock_:
+            if self._processes_.get(component) is not process:
+                return
+        self.set_state(component, False)
+        if on_exit is not None:
+            on_exit(returncode)
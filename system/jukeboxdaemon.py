@@ -0,0 +1,101 @@
+import os
+import signal
+import threading
+
+from system.configuration import Config
+from system.logger import Logger
+from system.metrics import MetricsExporter
+from spotify.spotifyconnectserver import SpotifyConnectServer
+from spotify.metadatacache import MetadataCache
+from spotify.metadataresolver import MetadataResolver
+from spotify.nowplayingservice import NowPlayingService
+from spotify.cacheservice import CacheServiceClient
+
+
+class JukeBoxDaemon:
+    """
+    The class 'JukeBoxDaemon' runs the jukebox without user interface, e.g. for home
+    automation dashboards which only need the now playing information. It runs librespot,
+    receives its events, resolves the track information and publishes it as retained now
+    playing record on the MQTT broker. No background image is rendered, the record
+    contains the URLs of the images. Neither Kivy nor PIL nor screeninfo is imported.
+    The daemon runs until SIGINT or SIGTERM is received.
+    """
+
+    def __init__(self):
+        """
+        Initialize self. See help(self) for accurate signature.
+        """
+        self.log = Logger()
+        self.name = os.path.basename(__file__)
+        self.spotify_srv = SpotifyConnectServer()
+        resolver = MetadataResolver(cache=MetadataCache())
+        resolver = CacheServiceClient.from_config(fallback=resolver) or resolver
+        self.now_playing_service = NowPlayingService(self.spotify_srv, resolver=resolver)
+        self.metrics_exporter = None
+        self._stop_event_ = threading.Event()
+
+    def run(self):
+        """
+        This function start the daemon and block until stop() is called.
+        """
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+
+        Config().start_watching()
+        self.spotify_srv.health_monitor.add_listener(self.on_health_changed)
+        self.now_playing_service.add_listener(self.on_now_playing)
+        self.now_playing_service.start()
+        try:
+            self.spotify_srv.start()
+            self.metrics_exporter = MetricsExporter(publish=self.spotify_srv.publish_message)
+            self.metrics_exporter.start()
+
+            self.log.write(message="{appname} daemon is running.".format(appname=Config.DEFAULT_APPNAME),
+                           module=self.name,
+                           level=Logger.INFO)
+            while not self._stop_event_.wait(1.0):
+                pass
+
+        finally:
+            self.shutdown()
+
+    def stop(self, *args):
+        """
+        This function stop the daemon. It is the handler of SIGINT and SIGTERM, too.
+        """
+        self._stop_event_.set()
+
+    def shutdown(self):
+        """
+        This function stop librespot, the event transport and the worker threads.
+        """
+        self.log.write(message="{appname} daemon is closing....".format(appname=Config.DEFAULT_APPNAME),
+                       module=self.name,
+                       level=Logger.INFO)
+        self.spotify_srv.stop()
+        Config().stop_watching()
+        self.now_playing_service.stop()
+        if self.metrics_exporter is not None:
+            self.metrics_exporter.stop()
+            self.metrics_exporter = None
+
+    def on_now_playing(self, now_playing):
+        """
+        This function is called by the now playing service when a track is resolved.
+        param now_playing: the now playing dictionary of the metadata pipeline
+        """
+        if now_playing.get('type') is not None:
+            self.log.write(message="Now playing: {0} - {1}", args=(now_playing['subtitle'], now_playing['title']),
+                           module=self.name,
+                           level=Logger.INFO)
+
+    def on_health_changed(self, state):
+        """
+        This function is called by the health monitor when the state of librespot or the
+        MQTT broker changed.
+        param state: a dictionary which maps the component names to True or False
+        """
+        self.log.write(message="Health state changed: {0}", args=(state,),
+                       module=self.name,
+                       level=Logger.INFO if all(state.values()) else Logger.ERROR)
@@ -1,26 +1,261 @@
+import os
+import sys
+import queue
+import atexit
+import threading
+
 from datetime import datetime
 from system.configuration import Config
 
 
+class _LogWriter:
+    """
+    The class '_LogWriter' writes the log records of all Logger instances in a background
+    thread. The log file is opened once, the records are written in batches and the file
+    is rotated when it exceeds its maximum size. Messages are formatted in the thread.
+    """
+
+    BATCH_SIZE = 256
+    """ The maximum number of records written before the file is flushed """
+
+    def __init__(self, log_file, max_bytes=0, backups=0):
+        """
+        Initialize self. See help(self) for accurate signature.
+        param log_file: the path of the log file
+        param max_bytes: the size in bytes at which the file is rotated, 0 disables the rotation
+        param backups: the number of rotated files which are kept
+        """
+        self.log_file = log_file
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self._queue_ = queue.SimpleQueue()
+        self._fp_ = None
+        self._reopen_ = False
+        self._thread_ = threading.Thread(target=self._run_, name="jukebox-logger", daemon=True)
+        self._thread_.start()
+        atexit.register(self.close)
+
+    def put(self, record):
+        """
+        This function queue a record for writing.
+        param record: a tuple (timestamp, level name, module, message, args)
+        """
+        self._queue_.put(record)
+
+    def set_log_file(self, log_file):
+        """
+        This function change the path of the log file. The new file is opened by the writer
+        thread before the next record is written.
+        param log_file: the path of the log file
+        """
+        if log_file != self.log_file:
+            self.log_file = log_file
+            self._reopen_ = True
+
+    def close(self):
+        """
+        This function write all queued records and close the log file.
+        """
+        if self._thread_.is_alive():
+            self._queue_.put(None)
+            self._thread_.join(timeout=2.0)
+
+    def _open_(self):
+        """
+        This function open the log file for appending, if it is not open.
+        """
+        if self._reopen_ and self._fp_ is not None:
+            self._fp_.close()
+            self._fp_ = None
+        self._reopen_ = False
+        if self._fp_ is None:
+            self._fp_ = open(self.log_file, "a")
+
+    def _rotate_(self):
+        """
+        This function rotate the log file, if it exceeds its maximum size:
+        jukebox.log -> jukebox.log.1 -> jukebox.log.2 ...
+        """
+        if self.max_bytes <= 0 or self._fp_.tell() < self.max_bytes:
+            return
+
+        self._fp_.close()
+        self._fp_ = None
+        if self.backups > 0:
+            for index in range(self.backups - 1, 0, -1):
+                source = "{file}.{index}".format(file=self.log_file, index=index)
+                if os.path.exists(source):
+                    os.replace(source, "{file}.{index}".format(file=self.log_file, index=index + 1))
+            os.replace(self.log_file, "{file}.1".format(file=self.log_file))
+        else:
+            os.remove(self.log_file)
+        self._open_()
+
+    @staticmethod
+    def _format_(record):
+        """
+        This function format a record to a line of the log file. If the message can not be
+        formatted, e.g. because of a wrong format spec or an argument whose __str__() raises,
+        the repr() of the message and the arguments is written instead.
+        param record: a tuple (timestamp, level name, module, message, args)
+        :return: the line as string
+        """
+        ts, level, module, message, args = record
+        try:
+            if args:
+                message = message.format(*args)
+            return "{ts} {level} {module} {message}\n".format(ts=ts, level=level, module=module, message=message)
+        except Exception as err:
+            args = ", ".join(_LogWriter._repr_(arg) for arg in args or ())
+            return "{ts} {level} {module} {message} ({args}) ({err})\n".format(ts=ts, level=level, module=module,
+                                                                                message=_LogWriter._repr_(message),
+                                                                                args=args,
+                                                                                err=_LogWriter._repr_(err))
+
+    @staticmethod
+    def _repr_(value):
+        """
+        This function return the repr() of a value, which does not raise.
+        param value: any object
+        :return: the repr() of the value or a placeholder, if repr() raised
+        """
+        try:
+            return repr(value)
+        except Exception:
+            return "<unprintable {type}>".format(type=type(value).__name__)
+
+    def _run_(self):
+        """
+        The loop of the writer thread. It blocks until a record is queued, then writes all
+        queued records up to BATCH_SIZE and flushes the file once.
+        """
+        running = True
+        while running:
+            records = [self._queue_.get()]
+            while len(records) < self.BATCH_SIZE:
+                try:
+                    records.append(self._queue_.get_nowait())
+                except queue.Empty:
+                    break
+
+            # the sentinel is checked first, the thread must end even if the batch fails
+            if None in records:
+                running = False
+                records = [record for record in records if record is not None]
+
+            try:
+                self._open_()
+                for record in records:
+                    self._fp_.write(self._format_(record))
+                self._fp_.flush()
+                self._rotate_()
+            except OSError as err:
+                sys.stderr.write("Unable to write log file {file}: {err}\n".format(file=self.log_file, err=err))
+                self._fp_ = None
+            except Exception as err:
+                # an unexpected error must not end the thread, otherwise all further records are queued forever
+                sys.stderr.write("Unable to write log records: {err!r}\n".format(err=err))
+
+        if self._fp_ is not None:
+            self._fp_.close()
+            self._fp_ = None
+
+
 class Logger:
+    """
+    The class 'Logger' writes messages to the configured log file. Messages below the
+    configured log level are dropped before they are formatted. The message can contain
+    str.format() placeholders which are filled with args by the background writer, e.g.
+        log.write(message="on_event::{0}, {1}", args=(topic, payload), module=name, level=Logger.DEBUG)
+    so that expensive formatting is skipped for filtered messages and done off the caller's thread.
+    All instances share one background writer and the log level. A change of the options
+    logLevel and logFile in the configuration file is applied without a restart.
+    """
+
     ERROR = 0
     INFO = 1
     DEBUG = 3
 
+    DEFAULT_MAX_SIZE = 10
+    """ The default size of the log file in MB at which it is rotated """
+
+    DEFAULT_BACKUPS = 3
+    """ The default number of rotated log files which are kept """
+
+    _writer_ = None
+    _writer_lock_ = threading.Lock()
+    _level_ = None
+    _log_file_ = None
+
     def __init__(self):
         self.cfg = Config().parser
-        self._log_file_ = self.cfg.get('system', 'logFile')
-        _log_level_ = self.cfg.get('system', 'logLevel')
+        if Logger._level_ is None:
+            with Logger._writer_lock_:
+                if Logger._level_ is None:
+                    Logger._configure_()
+                    Config().add_listener(Logger._on_config_changed_)
+
+    @classmethod
+    def _configure_(cls):
+        """
+        This function read the log level and the log file from the configuration.
+        """
+        cfg = Config().parser
+        cls._log_file_ = cfg.get('system', 'logFile')
+        _log_level_ = cfg.get('system', 'logLevel')
         if _log_level_ == 'debug':
-            self._level_ = self.DEBUG
+            cls._level_ = cls.DEBUG
         elif _log_level_ == 'info':
-            self._level_ = self.INFO
+            cls._level_ = cls.INFO
         elif _log_level_ == 'error':
-            self._level_ = self.ERROR
+            cls._level_ = cls.ERROR
         else:
-            self._level_ = self.ERROR
+            cls._level_ = cls.ERROR
+
+    @classmethod
+    def _on_config_changed_(cls, changed):
+        """
+        This function is called by Config when the configuration file changed and apply the
+        new log level and log file.
+        param changed: a set of the changed options as tuples (section, option)
+        """
+        if ('system', 'loglevel') in changed or ('system', 'logfile') in changed:
+            cls._configure_()
+            if cls._writer_ is not None:
+                cls._writer_.set_log_file(cls._log_file_)
+
+    def _get_writer_(self):
+        """
+        This function return the shared background writer. It is created on the first call.
+        :return: an instance of _LogWriter
+        """
+        if Logger._writer_ is None:
+            with Logger._writer_lock_:
+                if Logger._writer_ is None:
+                    max_size = self.cfg.getint('system', 'logmaxsize', fallback=self.DEFAULT_MAX_SIZE)
+                    backups = self.cfg.getint('system', 'logbackups', fallback=self.DEFAULT_BACKUPS)
+                    Logger._writer_ = _LogWriter(self._log_file_, max_bytes=max_size * 1024 * 1024, backups=backups)
+        return Logger._writer_
+
+    def is_enabled(self, level):
+        """
+        This function check if messages of the given level are written.
+        param level: Logger.ERROR, Logger.INFO or Logger.DEBUG
+        :return: True if messages of the level are written, otherwise False
+        """
+        return level <= self._level_
+
+    def write(self, message=None, module=None, level=0, args=None):
+        """
+        This function queue a message for the log file, if the level is enabled.
+        param message: the message, which can contain str.format() placeholders for args
+        param module: the name of the module which writes the message
+        param level: Logger.ERROR, Logger.INFO or Logger.DEBUG
+        param args: a tuple of arguments which are formatted into the message by the writer
+        """
+        if message is None or module is None or level > self._level_:
+            return
 
-    def write(self, message=None, module=None, level=0):
         if level == self.ERROR:
             log_level = "ERROR"
         elif level == self.INFO:
@@ -30,9 +265,4 @@ class Logger:
         else:
             log_level = "{level}".format(level=level)
 
-        if message is not None and module is not None and level <= self._level_:
-            with open(self._log_file_, "a") as fp:
-                fp.write("{ts} {level} {module} {message}\n".format(ts=datetime.now(),
-                                                                    level=log_level,
-                                                                    module=module,
-                                                                    message=message))
+        self._get_writer_().put((datetime.now(), log_level, module, message, args))
@@ -0,0 +1,299 @@
+import os
+import time
+import bisect
+import threading
+
+from contextlib import contextmanager
+from system.configuration import Config
+from system.logger import Logger
+
+
+class Metrics:
+    """
+    The class 'Metrics' collects counters, gauges and timers of the hot paths of the application,
+    e.g. the received events, the requests to the Spotify API, the cache lookups and the
+    rendering of the background image. Recording a value costs a lock and a dictionary
+    update, no I/O is done on the calling thread. The metrics are exported in the
+    Prometheus text format by render(), which is used by the MetricsExporter.
+    A metric is identified by its name and optional labels, e.g.
+        Metrics.instance().increment('jukebox_cache_requests_total', {'cache': 'metadata', 'result': 'hit'})
+        with Metrics.instance().timer('jukebox_api_request_seconds', {'endpoint': 'track'}):
+            ...
+    A gauge is set to a value or to a callable, which is called when the metrics are rendered,
+    e.g. for a value which changes continuously like an uptime.
+    The shared instance is returned by Metrics.instance().
+    """
+
+    BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+    """ The upper bounds in seconds of the histogram buckets of the timers """
+
+    _instance_ = None
+    _instance_lock_ = threading.Lock()
+
+    @classmethod
+    def instance(cls):
+        """
+        This function return the shared instance of Metrics. The instance is created on the
+        first call.
+        :return: an instance of Metrics
+        """
+        if cls._instance_ is None:
+            with cls._instance_lock_:
+                if cls._instance_ is None:
+                    cls._instance_ = cls()
+        return cls._instance_
+
+    def __init__(self):
+        """
+        Initialize self. See help(self) for accurate signature.
+        """
+        self._lock_ = threading.Lock()
+        self._counters_ = {}
+        self._gauges_ = {}
+        self._timers_ = {}
+
+    @staticmethod
+    def _key_(name, labels):
+        """
+        This function return the dictionary key of a metric.
+        param name: the name of the metric
+        param labels: a dictionary of labels or None
+        :return: a tuple of the name and the sorted labels
+        """
+        return name, tuple(sorted(labels.items())) if labels else ()
+
+    def increment(self, name, labels=None, value=1):
+        """
+        This function increase a counter.
+        param name: the name of the counter, e.g. jukebox_events_total
+        param labels: a dictionary of labels or None
+        param value: the value which is added
+        """
+        key = self._key_(name, labels)
+        with self._lock_:
+            self._counters_[key] = self._counters_.get(key, 0) + value
+
+    def set_gauge(self, name, value, labels=None):
+        """
+        This function set a gauge.
+        param name: the name of the gauge, e.g. jukebox_librespot_uptime_seconds
+        param value: the value or a callable without arguments which returns the value
+        param labels: a dictionary of labels or None
+        """
+        key = self._key_(name, labels)
+        with self._lock_:
+            self._gauges_[key] = value
+
+    def observe(self, name, seconds, labels=None):
+        """
+        This function add a duration to a timer.
+        param name: the name of the timer, e.g. jukebox_api_request_seconds
+        param seconds: the duration in seconds
+        param labels: a dictionary of labels or None
+        """
+        key = self._key_(name, labels)
+        index = bisect.bisect_left(self.BUCKETS, seconds)
+        with self._lock_:
+            timer = self._timers_.get(key)
+            if timer is None:
+                # count, sum, max, buckets (the last bucket is +Inf)
+                timer = self._timers_[key] = [0, 0.0, 0.0, [0] * (len(self.BUCKETS) + 1)]
+            timer[0] += 1
+            timer[1] += seconds
+            timer[2] = max(timer[2], seconds)
+            timer[3][index] += 1
+
+    @contextmanager
+    def timer(self, name, labels=None):
+        """
+        This function measure the duration of a with block and add it to a timer. The
+        duration is recorded even if the block raises an exception.
+        param name: the name of the timer
+        param labels: a dictionary of labels or None
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, labels)
+
+    def get_counter(self, name, labels=None):
+        """
+        This function return the value of a counter.
+        param name: the name of the counter
+        param labels: a dictionary of labels or None
+        :return: the value, 0 if the counter was never increased
+        """
+        with self._lock_:
+            return self._counters_.get(self._key_(name, labels), 0)
+
+    def reset(self):
+        """
+        This function remove all counters, gauges and timers.
+        """
+        with self._lock_:
+            self._counters_.clear()
+            self._gauges_.clear()
+            self._timers_.clear()
+
+    @staticmethod
+    def _format_labels_(labels, extra=None):
+        """
+        This function format labels in the Prometheus text format.
+        param labels: a tuple of (name, value) tuples
+        param extra: an additional (name, value) tuple, e.g. the bucket bound
+        :return: the labels as string, e.g. {endpoint="track"}
+        """
+        items = list(labels)
+        if extra is not None:
+            items.append(extra)
+        if not items:
+            return ""
+        return "{" + ",".join('{0}="{1}"'.format(name, str(value).replace('\\', '\\\\').replace('"', '\\"'))
+                              for name, value in items) + "}"
+
+    def render(self):
+        """
+        This function return all metrics in the Prometheus text format. Timers are exported
+        as histograms with an additional gauge of the maximum duration.
+        :return: the metrics as string
+        """
+        with self._lock_:
+            counters = dict(self._counters_)
+            gauges = dict(self._gauges_)
+            timers = {key: (timer[0], timer[1], timer[2], list(timer[3])) for key, timer in self._timers_.items()}
+
+        lines = []
+        typed = set()
+        for (name, labels), value in sorted(counters.items()):
+            if name not in typed:
+                typed.add(name)
+                lines.append("# TYPE {name} counter".format(name=name))
+            lines.append("{name}{labels} {value}".format(name=name, labels=self._format_labels_(labels), value=value))
+
+        for (name, labels), value in sorted(gauges.items()):
+            # a callable is called outside of the lock, it may record metrics itself
+            value = value() if callable(value) else value
+            if name not in typed:
+                typed.add(name)
+                lines.append("# TYPE {name} gauge".format(name=name))
+            lines.append("{name}{labels} {value}".format(name=name, labels=self._format_labels_(labels), value=value))
+
+        for (name, labels), (count, total, maximum, buckets) in sorted(timers.items()):
+            if name not in typed:
+                typed.add(name)
+                lines.append("# TYPE {name} histogram".format(name=name))
+            cumulative = 0
+            for bound, bucket in zip(self.BUCKETS + ('+Inf',), buckets):
+                cumulative += bucket
+                lines.append("{name}_bucket{labels} {value}".format(
+                    name=name, labels=self._format_labels_(labels, ('le', bound)), value=cumulative))
+            lines.append("{name}_sum{labels} {value:.6f}".format(name=name, labels=self._format_labels_(labels),
+                                                                 value=total))
+            lines.append("{name}_count{labels} {value}".format(name=name, labels=self._format_labels_(labels),
+                                                               value=count))
+
+        # the maximum is a gauge of its own, a histogram must not contain other samples
+        for (name, labels), (count, total, maximum, buckets) in sorted(timers.items()):
+            gauge = "{name}_max".format(name=name)
+            if gauge not in typed:
+                typed.add(gauge)
+                lines.append("# TYPE {name} gauge".format(name=gauge))
+            lines.append("{name}{labels} {value:.6f}".format(name=gauge, labels=self._format_labels_(labels),
+                                                             value=maximum))
+
+        return "\n".join(lines) + "\n"
+
+
+class MetricsExporter:
+    """
+    The class 'MetricsExporter' exports the metrics periodically. The metrics are written to a
+    text file, which can be collected by the textfile collector of the Prometheus node
+    exporter, and/or passed to a publish callback, e.g. to publish them on the MQTT topic
+    jukebox/metrics. The file is replaced atomically, so a collector never reads a partial file.
+    The export is configured by the options metricsfile, metricstopic and metricsinterval of
+    the section 'system'. An interval of 0 disables the export.
+    """
+
+    DEFAULT_INTERVAL = 30
+    """ The default export interval in seconds """
+
+    DEFAULT_TOPIC = "jukebox/metrics"
+    """ The default MQTT topic of the metrics """
+
+    def __init__(self, metrics=None, publish=None, path=None, topic=None, interval=None):
+        """
+        Initialize self. See help(self) for accurate signature.
+        Parameters that are not given are taken from the configuration.
+        param metrics: an instance of Metrics, if None the shared instance is used
+        param publish: a callable which is called with the topic and the metrics as string, or None
+        param path: the path of the metrics file, an empty string disables the file
+        param topic: the topic which is passed to publish
+        param interval: the export interval in seconds
+        """
+        cfg = Config().parser
+        self.log = Logger()
+        self.name = os.path.basename(__file__)
+        self.metrics = metrics if metrics is not None else Metrics.instance()
+        self.publish = publish
+        self.path = path if path is not None else cfg.get('system', 'metricsfile', fallback='')
+        self.topic = topic if topic is not None else cfg.get('system', 'metricstopic', fallback=self.DEFAULT_TOPIC)
+        self.interval = interval if interval is not None else cfg.getfloat(
+            'system', 'metricsinterval', fallback=self.DEFAULT_INTERVAL)
+
+        self._stop_event_ = threading.Event()
+        self._thread_ = None
+
+    def start(self):
+        """
+        This function start the export thread, if the export is enabled.
+        """
+        if self.interval <= 0 or (not self.path and self.publish is None):
+            return
+        if self._thread_ is not None and self._thread_.is_alive():
+            return
+
+        self._stop_event_.clear()
+        self._thread_ = threading.Thread(target=self._run_, name="jukebox-metrics", daemon=True)
+        self._thread_.start()
+
+    def stop(self):
+        """
+        This function stop the export thread after a last export.
+        """
+        self._stop_event_.set()
+        if self._thread_ is not None:
+            self._thread_.join(timeout=2.0)
+            self._thread_ = None
+
+    def export(self):
+        """
+        This function write the metrics file and publish the metrics once.
+        """
+        text = self.metrics.render()
+        if self.path:
+            tmp_name = "{path}.tmp".format(path=self.path)
+            try:
+                with open(tmp_name, 'w') as fp:
+                    fp.write(text)
+                os.replace(tmp_name, self.path)
+            except OSError as err:
+                self.log.write(message="Unable to write metrics file {path}: {err}".format(path=self.path, err=err),
+                               module=self.name,
+                               level=Logger.ERROR)
+
+        if self.publish is not None and self.topic:
+            try:
+                self.publish(self.topic, text)
+            except Exception as err:
+                self.log.write(message="Unable to publish metrics: {err}".format(err=err),
+                               module=self.name,
+                               level=Logger.ERROR)
+
+    def _run_(self):
+        """
+        The loop of the export thread.
+        """
+        while not self._stop_event_.wait(self.interval):
+            self.export()
+        self.export()
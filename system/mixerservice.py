@@ -0,0 +1,202 @@
+import os
+import time
+import select
+import threading
+import alsaaudio
+
+from system.logger import Logger
+
+
+class MixerService:
+    """
+    The class 'MixerService' is the process wide access to the ALSA mixer. It opens the mixer
+    once and keeps the current volume and mute state in memory, so reading the volume does not
+    touch the device. Volume changes are coalesced: only the last requested volume is written,
+    at most DEFAULT_RATE times per second. Changes of the mixer by other programs are received
+    through the poll descriptors of the mixer and passed to the registered listeners.
+    The shared instance is returned by MixerService.instance().
+    """
+
+    DEFAULT_RATE = 20
+    """ The maximum number of volume writes per second """
+
+    _instance_ = None
+    _instance_lock_ = threading.Lock()
+
+    @classmethod
+    def instance(cls):
+        """
+        This function return the shared instance of MixerService. The instance is created
+        on the first call.
+        :return: an instance of MixerService
+        """
+        if cls._instance_ is None:
+            with cls._instance_lock_:
+                if cls._instance_ is None:
+                    cls._instance_ = cls()
+        return cls._instance_
+
+    def __init__(self, mixer=None, rate=None):
+        """
+        Initialize self. See help(self) for accurate signature.
+        param mixer: an instance of alsaaudio.Mixer, if None the first mixer of the system is opened
+        param rate: the maximum number of volume writes per second
+        """
+        self.log = Logger()
+        self.name = os.path.basename(__file__)
+        self.mixer = mixer if mixer is not None else alsaaudio.Mixer(alsaaudio.mixers()[0])
+        self.interval = 1.0 / (rate if rate is not None else self.DEFAULT_RATE)
+
+        self._lock_ = threading.Lock()
+        self._device_lock_ = threading.Lock()
+        self._listeners_ = []
+        self._volume_ = self.mixer.getvolume()[0]
+        self._mute_ = self._read_mute_()
+        self._pending_ = None
+        self._wakeup_ = threading.Event()
+        self._running_ = True
+
+        self._writer_ = threading.Thread(target=self._write_loop_, name="jukebox-mixer-writer", daemon=True)
+        self._writer_.start()
+        self._watcher_ = threading.Thread(target=self._poll_loop_, name="jukebox-mixer-watcher", daemon=True)
+        self._watcher_.start()
+
+    def add_listener(self, callback):
+        """
+        This function register a callback which is called when the volume or the mute state
+        is changed by another program. The callback is called from the watcher thread with
+        the volume and the mute state.
+        param callback: a callable
+        """
+        with self._lock_:
+            if callback not in self._listeners_:
+                self._listeners_.append(callback)
+
+    def remove_listener(self, callback):
+        """
+        This function remove a callback registered with add_listener().
+        param callback: a callable
+        """
+        with self._lock_:
+            if callback in self._listeners_:
+                self._listeners_.remove(callback)
+
+    def get_volume(self):
+        """
+        This function returns the cached volume.
+        :return: Integer between 0 and 100
+        """
+        return self._volume_
+
+    def set_volume(self, volume):
+        """
+        This function request a new volume. The cached volume is updated immediately, the
+        mixer is written by the writer thread. Requests which are made faster than the
+        configured rate replace each other.
+        param volume: Integer between 0 and 100
+        """
+        volume = max(0, min(100, int(volume)))
+        with self._lock_:
+            self._volume_ = volume
+            self._pending_ = volume
+        self._wakeup_.set()
+
+    def get_mute(self):
+        """
+        This function returns the cached mute state as returned by alsaaudio.Mixer.getmute().
+        :return: 1 if the mixer is muted, otherwise 0
+        """
+        return self._mute_
+
+    def set_mute(self, mute):
+        """
+        This function mute or unmute the mixer.
+        param mute: 1 to mute, 0 to unmute
+        """
+        with self._device_lock_:
+            self.mixer.setmute(mute)
+        with self._lock_:
+            self._mute_ = mute
+
+    def stop(self):
+        """
+        This function stop the writer and watcher threads.
+        """
+        self._running_ = False
+        self._wakeup_.set()
+
+    def _read_mute_(self):
+        """
+        This function read the mute state from the mixer. Mixers without a mute switch are
+        reported as not muted.
+        :return: 1 if the mixer is muted, otherwise 0
+        """
+        try:
+            return self.mixer.getmute()[0]
+        except alsaaudio.ALSAAudioError:
+            return 0
+
+    def _write_loop_(self):
+        """
+        The loop of the writer thread. It waits for a volume request, writes the latest
+        requested volume to the mixer and sleeps for the write interval afterwards, so that
+        requests in between are coalesced.
+        """
+        while self._running_:
+            self._wakeup_.wait()
+            self._wakeup_.clear()
+
+            with self._lock_:
+                volume = self._pending_
+                self._pending_ = None
+
+            if volume is not None:
+                try:
+                    with self._device_lock_:
+                        self.mixer.setvolume(volume, alsaaudio.MIXER_CHANNEL_ALL)
+                except alsaaudio.ALSAAudioError as err:
+                    self.log.write(message="Unable to set volume: {err}".format(err=err),
+                                   module=self.name,
+                                   level=Logger.ERROR)
+                time.sleep(self.interval)
+
+    def _poll_loop_(self):
+        """
+        The loop of the watcher thread. It waits on the poll descriptors of the mixer and
+        reads the volume and the mute state only if the mixer reports a change. Listeners
+        are notified if the change was not made by this service.
+        """
+        try:
+            poller = select.poll()
+            for fd, event_mask in self.mixer.polldescriptors():
+                poller.register(fd, event_mask)
+        except (AttributeError, alsaaudio.ALSAAudioError, OSError) as err:
+            self.log.write(message="Unable to watch the mixer for changes: {err}".format(err=err),
+                           module=self.name,
+                           level=Logger.ERROR)
+            return
+
+        while self._running_:
+            if not poller.poll(1000):
+                continue
+
+            try:
+                with self._device_lock_:
+                    self.mixer.handleevents()
+                    volume = self.mixer.getvolume()[0]
+                    mute = self._read_mute_()
+            except alsaaudio.ALSAAudioError:
+                continue
+
+            with self._lock_:
+                if self._pending_ is not None:
+                    # our own write is not applied yet, the cached value is newer
+                    continue
+                changed = volume != self._volume_ or mute != self._mute_
+                self._volume_ = volume
+                self._mute_ = mute
+                listeners = list(self._listeners_)
+
+            if changed:
+                for callback in listeners:
+                    callback(volume, mute)
@@ -0,0 +1,46 @@
+import threading
+
+from concurrent.futures import Future
+
+
+class SingleFlight:
+    """
+    The class 'SingleFlight' de-duplicates concurrent calls. While a call with a key is
+    running, further calls with the same key do not run the function again, they wait for
+    the running call and get its result or its exception. A call which starts after the
+    running one finished runs the function again, so the result is not cached.
+    """
+
+    def __init__(self):
+        """
+        Initialize self. See help(self) for accurate signature.
+        """
+        self._lock_ = threading.Lock()
+        self._calls_ = {}
+
+    def do(self, key, function, *args):
+        """
+        This function run the function, unless a call with the same key is running.
+        param key: the key of the call, e.g. the Spotify ID
+        param function: the function which is called
+        param args: the arguments of the function
+        :return: a tuple of the return value of the function and True if the value was shared
+            with a running call, otherwise False
+        """
+        with self._lock_:
+            call = self._calls_.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls_[key] = Future()
+
+        if not leader:
+            return call.result(), True
+
+        try:
+            call.set_result(function(*args))
+        except BaseException as err:
+            call.set_exception(err)
+        finally:
+            with self._lock_:
+                self._calls_.pop(key, None)
+        return call.result(), False
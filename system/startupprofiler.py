@@ -0,0 +1,109 @@
+import os
+import time
+import threading
+
+from contextlib import contextmanager
+
+
+class StartupProfiler:
+    """
+    The class 'StartupProfiler' measures the phases of the start of the application, e.g.
+    the imports, the creation of the window and the start of librespot. The phases can run
+    in parallel on different threads. The time of a phase is recorded from its start and
+    its end relative to the creation of the profiler, which should be the first thing the
+    entry point does. report() writes the phases to the log and the metrics.
+        with StartupProfiler.instance().phase('window'):
+            ...
+    The shared instance is returned by StartupProfiler.instance().
+    """
+
+    _instance_ = None
+    _instance_lock_ = threading.Lock()
+
+    @classmethod
+    def instance(cls):
+        """
+        This function return the shared instance of StartupProfiler. The instance is created
+        on the first call, which is the origin of the measured times.
+        :return: an instance of StartupProfiler
+        """
+        if cls._instance_ is None:
+            with cls._instance_lock_:
+                if cls._instance_ is None:
+                    cls._instance_ = cls()
+        return cls._instance_
+
+    def __init__(self):
+        """
+        Initialize self. See help(self) for accurate signature.
+        """
+        self._origin_ = time.perf_counter()
+        self._lock_ = threading.Lock()
+        self._phases_ = []
+        self._reported_ = False
+
+    @contextmanager
+    def phase(self, name):
+        """
+        This function measure the duration of a with block as phase of the start.
+        param name: the name of the phase, e.g. window
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, start, time.perf_counter())
+
+    def record(self, name, start, end):
+        """
+        This function add a phase.
+        param name: the name of the phase
+        param start: the start of the phase as value of time.perf_counter()
+        param end: the end of the phase as value of time.perf_counter()
+        """
+        with self._lock_:
+            # phases after the report, e.g. of a restart of librespot, are not part of the start
+            if not self._reported_:
+                self._phases_.append((name, start - self._origin_, end - start))
+
+    def mark(self, name):
+        """
+        This function add a point in time, e.g. the first frame, as phase of zero duration.
+        param name: the name of the point in time
+        """
+        now = time.perf_counter()
+        self.record(name, now, now)
+
+    def elapsed(self):
+        """
+        This function return the time since the creation of the profiler.
+        :return: the time in seconds
+        """
+        return time.perf_counter() - self._origin_
+
+    def report(self):
+        """
+        This function write the phases ordered by their start to the log and the metrics.
+        The report is written once, further calls do nothing.
+        :return: the report as string or None, if it was already written
+        """
+        # imported here, because the profiler is created before anything else is imported
+        from system.logger import Logger
+        from system.metrics import Metrics
+
+        with self._lock_:
+            if self._reported_:
+                return None
+            self._reported_ = True
+            phases = sorted(self._phases_, key=lambda phase: phase[1])
+
+        metrics = Metrics.instance()
+        lines = ["Startup phases (start / duration in ms):"]
+        for name, start, duration in phases:
+            lines.append("  {name:<24} {start:>8.1f} {duration:>8.1f}".format(name=name, start=start * 1000.0,
+                                                                                duration=duration * 1000.0))
+            metrics.observe('jukebox_startup_phase_seconds', duration, {'phase': name})
+        report = "\n".join(lines)
+
+        Logger().write(message="{0}", args=(report,), module=os.path.basename(__file__), level=Logger.INFO)
+        return report
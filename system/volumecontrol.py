@@ -1,13 +1,16 @@
-import alsaaudio
-
+from kivy.clock import Clock
 from kivy.event import EventDispatcher
 from system.configuration import Config
+from system.mixerservice import MixerService
 
 
 class VolumeControl(EventDispatcher):
     """
     This class provides methods to control the volume via operating system
     mechanisms. It also provides a method to determine the current volume.
+    All instances share the mixer of the MixerService, which caches the volume and
+    coalesces volume writes. Changes of the volume by other programs dispatch the
+    event on_volume_changed on the kivy thread.
     """
 
     def __init__(self, **kwargs):
@@ -19,27 +22,29 @@ class VolumeControl(EventDispatcher):
         self.kv_file_dir = Config.DEFAULT_KV_DIR
         self.screen_manager = kwargs.get('screenmanager', None)
         self.register_event_type('on_volume_changed')
-        self.mixer = alsaaudio.Mixer(alsaaudio.mixers()[0])
+        self.mixer = MixerService.instance()
         self.current_volume_level = self.get_volume()
 
         super(VolumeControl, self).__init__()
 
+        self.mixer.add_listener(self.on_mixer_changed)
+
     def set_volume(self, volume):
         """
         This function set the volume to the given value and dispatch the event
         on_volume_changed.
         :param volume: Integer between 0 and 100
         """
-        self.mixer.setvolume(int(volume), alsaaudio.MIXER_CHANNEL_ALL)
-        self.current_volume_level = volume
-        self.dispatch('on_volume_changed', self.get_volume())
+        self.mixer.set_volume(volume)
+        self.current_volume_level = self.get_volume()
+        self.dispatch('on_volume_changed', self.current_volume_level)
 
     def get_volume(self):
         """
         This function returns the current volume
         :return: Integer tuple between 0 and 100
         """
-        return self.mixer.getvolume()[0]
+        return self.mixer.get_volume()
 
     def volume_up(self, step=1):
         """
@@ -58,17 +63,28 @@ class VolumeControl(EventDispatcher):
         new_volume = self.get_volume() - step
         self.set_volume(new_volume)
 
+    def on_mixer_changed(self, volume, mute):
+        """
+        This function is called by the MixerService from its watcher thread, when the volume
+        is changed by another program. The event on_volume_changed is dispatched on the kivy thread.
+        :param volume: the new volume
+        :param mute: the new mute state
+        """
+        self.current_volume_level = volume
+        Clock.schedule_once(lambda dt: self.dispatch('on_volume_changed', volume))
+
     def on_volume_changed(self, *args):
         """
         This function is the callback for the custom event
         'bytebrainmultiroom.system.volumecontrol.on_volume_changed'. Depending on the volume
         level, the volume control button source is set to volume-low.png (0-33), volume-medium.png (34-66)
-        or volume-high.png (67-100)
+        or volume-high.png (67-100). The button is on the spotify screen, which may be not current
+        or not created yet, e.g. if another program changes the volume while the blank screen is shown.
         :param args: the current volume level as  tuple integer
         """
         volume = args[0]
-        if self.screen_manager is not None:
-            volume_control_button = self.screen_manager.current_screen.ids.volume_control_button
+        if self.screen_manager is not None and self.screen_manager.has_screen('spotify'):
+            volume_control_button = self.screen_manager.get_screen('spotify').ids.volume_control_button
             if 0 <= volume <= 33:
                 volume_control_button.source = '{0}/default/48x48/volume-low.png'.format(self.kv_file_dir)
             elif 34 <= volume <= 66:
@@ -81,16 +97,16 @@ class VolumeControl(EventDispatcher):
         This function get the mute state and return it.
         :return: True if system is muted otherwise False
         """
-        return True if self.mixer.getmute()[0] == 0 else False
+        return True if self.mixer.get_mute() == 0 else False
 
     def mute(self):
         """
         This function mute the system sound
         """
-        self.mixer.setmute(1)
+        self.mixer.set_mute(1)
 
     def unmute(self):
         """
         This function unmute the system sound
         """
-        self.mixer.setmute(0)
+        self.mixer.set_mute(0)
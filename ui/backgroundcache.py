@@ -0,0 +1,129 @@
+import os
+import hashlib
+import threading
+
+from system.configuration import Config
+from system.logger import Logger
+from system.metrics import Metrics
+
+
+class BackgroundCache:
+    """
+    The class 'BackgroundCache' is a content addressed cache for rendered background images.
+    A file is keyed by the URL of the source image and the resolution it was rendered for,
+    so a background image of an artist is only downloaded and rendered once per resolution.
+    If the files in the cache exceed the configured size, the least recently used files
+    are removed.
+    """
+
+    DEFAULT_MAX_SIZE = 100
+    """ The default maximum size of the cache in MB """
+
+    FILE_EXTENSION = ".png"
+
+    def __init__(self, path=None, max_size=None):
+        """
+        Initialize self. See help(self) for accurate signature.
+        Parameters that are not given are taken from the configuration.
+        param path: the directory in which the background images are stored
+        param max_size: the maximum size of the cache in MB
+        """
+        cfg = Config().parser
+        default_path = os.path.join(os.path.dirname(cfg.get('spotify', 'cache')), 'backgrounds')
+
+        self.log = Logger()
+        self.name = os.path.basename(__file__)
+        self.path = path if path is not None else cfg.get('spotify', 'backgroundcache', fallback=default_path)
+        max_size = max_size if max_size is not None else cfg.getint(
+            'spotify', 'backgroundcachesize', fallback=self.DEFAULT_MAX_SIZE)
+        self.max_bytes = max_size * 1024 * 1024
+
+        self._lock_ = threading.Lock()
+        os.makedirs(self.path, exist_ok=True)
+
+    @staticmethod
+    def key(url, width, height):
+        """
+        This function return the cache key of an image URL rendered in the given resolution.
+        param url: the URL of the source image
+        param width: the width of the rendered image
+        param height: the height of the rendered image
+        :return: the key as hex string
+        """
+        return hashlib.sha1("{url}|{w}x{h}".format(url=url, w=width, h=height).encode("utf-8")).hexdigest()
+
+    def file_name(self, key):
+        """
+        This function return the path of the file for the given key.
+        param key: a key returned by BackgroundCache.key()
+        :return: the path of the file
+        """
+        return os.path.join(self.path, key + self.FILE_EXTENSION)
+
+    def get(self, key):
+        """
+        This function return the path of the cached file for the given key and mark it as
+        recently used.
+        param key: a key returned by BackgroundCache.key()
+        :return: the path of the file or None
+        """
+        file_name = self.file_name(key)
+        try:
+            os.utime(file_name)
+        except OSError:
+            Metrics.instance().increment('jukebox_cache_requests_total', {'cache': 'background', 'result': 'miss'})
+            return None
+
+        Metrics.instance().increment('jukebox_cache_requests_total', {'cache': 'background', 'result': 'hit'})
+
+        self.log.write(message="Background cache hit {key}".format(key=key),
+                       module=self.name,
+                       level=Logger.DEBUG)
+        return file_name
+
+    def put(self, key, writer):
+        """
+        This function store a new file for the given key. The file is written to a temporary
+        file by the writer and moved into place afterwards, so a reader never sees a half
+        written file. If the cache exceeds its size, the least recently used files are removed.
+        param key: a key returned by BackgroundCache.key()
+        param writer: a callable which is called with the path of the temporary file
+        :return: the path of the file
+        """
+        file_name = self.file_name(key)
+        tmp_file = "{file}.{tid}.tmp".format(file=file_name, tid=threading.get_ident())
+        try:
+            writer(tmp_file)
+            os.replace(tmp_file, file_name)
+        finally:
+            if os.path.exists(tmp_file):
+                os.remove(tmp_file)
+
+        self._evict_(keep=file_name)
+        return file_name
+
+    def _evict_(self, keep=None):
+        """
+        This function remove the least recently used files until the cache fits into its size.
+        param keep: the path of a file which must not be removed
+        """
+        with self._lock_:
+            files = []
+            total = 0
+            for entry in os.scandir(self.path):
+                if entry.is_file() and entry.name.endswith(self.FILE_EXTENSION):
+                    stat = entry.stat()
+                    files.append((stat.st_mtime, stat.st_size, entry.path))
+                    total += stat.st_size
+
+            files.sort()
+            for _, size, file_name in files:
+                if total <= self.max_bytes:
+                    break
+                if file_name == keep:
+                    continue
+                try:
+                    os.remove(file_name)
+                    total -= size
+                except OSError:
+                    pass
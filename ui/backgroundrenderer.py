@@ -0,0 +1,196 @@
+import io
+import os
+import urllib.request
+
+from PIL import Image
+from system.logger import Logger
+from system.metrics import Metrics
+from ui.backgroundcache import BackgroundCache
+
+
+class BackgroundRenderer:
+    """
+    The class 'BackgroundRenderer' creates the background image of the spotify screen
+    from an image of the Spotify API. The work is split into the stages download, decode
+    and render, so that each stage can be run by a worker thread. Rendered images are
+    stored in the background cache, so an image which was rendered before costs only a
+    file lookup. The class does not touch the user interface.
+    The smallest image which covers the application size is selected, a bigger image only
+    costs download and decode time. A small preview image can be rendered first to show
+    something while the selected image is downloaded.
+    To keep the rendering cheap, JPEG images are decoded in draft mode at the smallest
+    scale which still covers the application size, only the visible region is resized
+    and the result is written with a low PNG compression level.
+    """
+
+    PNG_COMPRESS_LEVEL = 1
+    """ The zlib compression level of the rendered background images, 0 (none) - 9 (best) """
+
+    PREVIEW_SIZE = 150
+    """ The minimum size in pixel of the preview image which is shown until the background image is rendered """
+
+    def __init__(self, width, height, cache=None, proxy=None):
+        """
+        Initialize self. See help(self) for accurate signature.
+        param width: the width of the application window
+        param height: the height of the application window
+        param cache: an instance of BackgroundCache, if None a new one is created
+        param proxy: an instance of spotify.cacheservice.CacheServiceClient through which the
+            images are downloaded, or None to download them directly
+        """
+        self.log = Logger()
+        self.name = os.path.basename(__file__)
+        self.width = width
+        self.height = height
+        self.cache = cache if cache is not None else BackgroundCache()
+        self.proxy = proxy
+
+    @staticmethod
+    def fit_image(images, width, height):
+        """
+        This function select the smallest image of the given images which covers the given
+        size. If no image covers the size, the biggest image is selected.
+        param images: an array of images. Each image is a dict get from Spotify API
+        param width: the width which should be covered
+        param height: the height which should be covered
+        :return: the image dict or None
+        """
+        fitting = None
+        biggest = None
+        for img in images or []:
+            img_width = img.get('width') or 0
+            img_height = img.get('height') or 0
+            if biggest is None or (biggest.get('width') or 0) < img_width:
+                biggest = img
+            if img_width >= width and img_height >= height and \
+                    (fitting is None or img_width < (fitting.get('width') or 0)):
+                fitting = img
+        return fitting if fitting is not None else biggest
+
+    def select_image(self, images):
+        """
+        This function select the smallest image which covers the application size.
+        param images: an array of images. Each image is a dict get from Spotify API
+        :return: the image dict or None
+        """
+        return self.fit_image(images, self.width, self.height)
+
+    def select_preview(self, images):
+        """
+        This function select a small image which is shown until the image of select_image()
+        is rendered. It is fast to download, decode and render.
+        param images: an array of images. Each image is a dict get from Spotify API
+        :return: the image dict or None, if there is no smaller image than the one of select_image()
+        """
+        preview = self.fit_image(images, self.PREVIEW_SIZE, self.PREVIEW_SIZE)
+        return preview if preview is not self.select_image(images) else None
+
+    def key(self, image):
+        """
+        This function return the background cache key of the given image in the application size.
+        param image: an image dict get from Spotify API
+        :return: the key or None
+        """
+        if image is None:
+            return None
+        return BackgroundCache.key(image.get('url'), self.width, self.height)
+
+    def cached(self, image):
+        """
+        This function return the path of the already rendered background image of the given image.
+        param image: an image dict get from Spotify API
+        :return: the path of the background image or None
+        """
+        if image is None:
+            return None
+        return self.cache.get(self.key(image))
+
+    def download(self, image):
+        """
+        This function download the given image. If a proxy is set, the image is downloaded
+        through the cache service first.
+        param image: an image dict get from Spotify API
+        :return: the image data as bytes or None
+        """
+        if image is None:
+            return None
+
+        self.log.write(message="Use Artist background image {image}".format(image=image),
+                       module=self.name,
+                       level=Logger.DEBUG)
+        try:
+            with Metrics.instance().timer('jukebox_image_download_seconds'):
+                data = self.proxy.download(image.get('url')) if self.proxy is not None else None
+                if data is not None:
+                    return data
+                with urllib.request.urlopen(image.get('url')) as response:
+                    return response.read()
+        except Exception as err:
+            Metrics.instance().increment('jukebox_image_download_errors_total')
+            self.log.write(message="{err}".format(err=err),
+                           module=self.name,
+                           level=Logger.ERROR)
+            return None
+
+    def decode(self, data):
+        """
+        This function decode the downloaded image data.
+        param data: the image data as bytes
+        :return: an instance of PIL.Image.Image or None
+        """
+        if data is None:
+            return None
+
+        with Metrics.instance().timer('jukebox_image_decode_seconds'):
+            img = Image.open(io.BytesIO(data))
+            scale = self._scale_(img.size)
+            img.draft('RGB', (int(img.width * scale) + 1, int(img.height * scale) + 1))
+            img.load()
+        return img
+
+    def _scale_(self, size):
+        """
+        This function return the factor by which an image of the given size must be scaled to
+        cover the application size.
+        param size: the width and height of the image as tuple
+        :return: the scale factor
+        """
+        return max(self.width / size[0], self.height / size[1])
+
+    def crop_box(self, size):
+        """
+        This function return the region of an image of the given size which is visible when
+        the image is scaled to cover the application size. The region is horizontally
+        centered and aligned to the top, where the faces of the artists usually are.
+        param size: the width and height of the image as tuple
+        :return: the region as tuple (left, upper, right, lower)
+        """
+        scale = self._scale_(size)
+        crop_width = min(size[0], self.width / scale)
+        crop_height = min(size[1], self.height / scale)
+        left = (size[0] - crop_width) / 2
+        return left, 0, left + crop_width, crop_height
+
+    def render(self, img, image):
+        """
+        This function scale the visible region of the image to the application size and
+        store it in the background cache.
+        param img: an instance of PIL.Image.Image
+        param image: the image dict get from Spotify API the img is decoded from
+        :return: the path of the background image or None
+        """
+        if img is None or image is None:
+            return None
+
+        metrics = Metrics.instance()
+        with metrics.timer('jukebox_image_resize_seconds'):
+            if img.mode not in ('RGB', 'RGBA', 'L'):
+                img = img.convert('RGB')
+            # BOX is fast and exact for reducing, an enlarged image looks blocky with it
+            resample = Image.BOX if self._scale_(img.size) <= 1 else Image.BILINEAR
+            img = img.resize((self.width, self.height), resample, box=self.crop_box(img.size))
+
+        with metrics.timer('jukebox_image_save_seconds'):
+            return self.cache.put(self.key(image), lambda file_name: img.save(file_name,
+                                                                              format='PNG',
+                                                                              compress_level=self.PNG_COMPRESS_LEVEL))
@@ -0,0 +1,18 @@
+from kivy.uix.image import AsyncImage
+from kivy.uix.behaviors import TouchRippleButtonBehavior
+
+
+class ImageButton(TouchRippleButtonBehavior, AsyncImage):
+    """
+    The class 'ImageButton' is a subclass of class kivy.uix.image.Image and
+    kivy.uix.behaviors.TouchRippleButtonBehavior with associated actions that
+    are triggered when the image is pressed (or released after a touch/click
+    event). To configure the button, the same properties (source, size, etc.)
+    are used as for the class kivy.uix.image.Image
+    """
+
+    def on_press(self):
+        """
+        The callback function for the on_press Event, this function should always bind.
+        """
+        pass
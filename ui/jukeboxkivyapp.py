@@ -1,51 +1,31 @@
 #!/usr/bin/env python
 
 import os
-import glob
+import time
+import threading
 
-import spotipy
-import random
-import urllib.request
-
-from PIL import Image
-from screeninfo import get_monitors
+from functools import partial
 from textwrap import TextWrapper
-from spotipy.oauth2 import SpotifyClientCredentials
 from kivy.app import App
 from kivy.uix.image import AsyncImage
 from kivy.uix.screenmanager import Screen, ScreenManager
 from kivy.uix.screenmanager import FadeTransition
-from kivy.uix.behaviors import TouchRippleButtonBehavior
 from kivy.core.window import Window
 from kivy.lang import Builder
 from kivy.clock import Clock
 
-from ui.volumesliderpopup import VolumeSliderPopup
-from system.volumecontrol import VolumeControl
 from system.configuration import Config
 from system.control import Control as SystemControl
 from system.logger import Logger
+from system.healthmonitor import HealthMonitor
+from system.metrics import Metrics, MetricsExporter
+from system.startupprofiler import StartupProfiler
+from ui.spotifyviewmodel import SpotifyViewModel
 from spotify.spotifyconnectserver import SpotifyConnectServer
-from spotify.spotifyerror import MQTTConnectionRefused as MQTTConnectionRefusedError
+from spotify.nowplayingservice import NowPlayingService
 from spotify.spotifyerror import SpotifyApiError
 
 
-class ImageButton(TouchRippleButtonBehavior, AsyncImage):
-    """
-    The class 'ImageButton' is a subclass of class kivy.uix.image.Image and
-    kivy.uix.behaviors.TouchRippleButtonBehavior with associated actions that
-    are triggered when the image is pressed (or released after a touch/click
-    event). To configure the button, the same properties (source, size, etc.)
-    are used as for the class kivy.uix.image.Image
-    """
-
-    def on_press(self):
-        """
-        The callback function for the on_press Event, this function should always bind.
-        """
-        pass
-
-
 class FullAsyncImage(AsyncImage):
     pass
 
@@ -98,23 +78,31 @@ class JukeBoxKivyApp(App):
     """
     The class 'JukeBoxKivyApp' is a subclass of 'kivy.app.App'. It is the main entry to the
     application and contains the kivy run loop.
+    To show the first frame as early as possible, build() only creates the blank screen.
+    The now playing service and librespot are started in a background thread after the
+    first frame and the spotify screen and the volume popup are created when they are
+    needed. Modules with heavy imports (PIL, spotipy, screeninfo, alsaaudio) are imported
+    on first use. The duration of the phases of the start is written to the log.
     """
-    screen_manager = ScreenManager()
-    spotify_srv = SpotifyConnectServer()
+    screen_manager = None
+    spotify_srv = None
+    metadata_cache = None
+    now_playing_service = None
+    metrics_exporter = None
     kv_file_dir = Config.DEFAULT_KV_DIR
     volume_slider_popup = None
     volume_control = None
+    view_model = None
     width = 1024
     height = 480
-    log = Logger()
+    log = None
     mod_name = os.path.basename(__file__)
-    client_id = Config().parser.get('spotify', 'clientid')
-    client_secret = Config().parser.get('spotify', 'clientsecret')
     current_screen = 'blank'
-    check_clock = None
 
     _track_playing_event_ = None
-    _current_track_id_ = None
+    _texture_load_started_ = None
+    _transition_started_ = None
+    _cover_target_ = None
 
     def __init__(self):
         """
@@ -123,16 +111,40 @@ class JukeBoxKivyApp(App):
         param kwargs: empty at the moment
         """
         super(JukeBoxKivyApp, self).__init__()
+        self.log = Logger()
+        self.screen_manager = ScreenManager()
+        self.spotify_srv = SpotifyConnectServer()
+        self.view_model = SpotifyViewModel(self.get_spotify_screen)
 
     def init_volume_control(self):
         """
-        Load the kv-file 'volume-control-slider.kv' and instantiate the volume_control and
-        volume_slider_popup object.
+        Instantiate the volume_control object, which opens the mixer.
         """
-        Builder.load_file(os.path.join(self.kv_file_dir, "volume-slider-popup.kv"))
-        self.volume_slider_popup = VolumeSliderPopup(screenmanager=self.screen_manager)
+        from system.volumecontrol import VolumeControl
+
         self.volume_control = VolumeControl(screenmanager=self.screen_manager)
 
+    def init_volume_slider_popup(self):
+        """
+        Load the kv-file 'volume-control-slider.kv' and instantiate the volume_slider_popup object.
+        """
+        import ui.imagebutton  # noqa: F401 the kv-file uses ImageButton
+        from ui.volumesliderpopup import VolumeSliderPopup
+
+        Builder.load_file(os.path.join(self.kv_file_dir, "volume-slider-popup.kv"))
+        if self.volume_control is None:
+            self.init_volume_control()
+        self.volume_slider_popup = VolumeSliderPopup(screenmanager=self.screen_manager,
+                                                     volume_control=self.volume_control)
+
+    def open_volume_slider_popup(self, *args):
+        """
+        This function open the volume popup. The popup is created on the first call.
+        """
+        if self.volume_slider_popup is None:
+            self.init_volume_slider_popup()
+        self.volume_slider_popup.open()
+
     def init_volume_control_button(self):
         """
         This function set the volume control button icon source to volume-low.png (0-33),
@@ -155,12 +167,29 @@ class JukeBoxKivyApp(App):
         his corresponding functions.
         :return:
         """
+        import ui.imagebutton  # noqa: F401 the kv-file uses ImageButton
+
         Builder.load_file(os.path.join(self.kv_file_dir, "spotify.kv"))
         spotify_screen = SpotifyScreen()
         self.screen_manager.add_widget(spotify_screen)
 
-        volume_control_button = self.screen_manager.get_screen('spotify').ids.volume_control_button
-        volume_control_button.bind(on_press=self.volume_slider_popup.open)
+        ids = spotify_screen.ids
+        ids.volume_control_button.bind(on_press=self.open_volume_slider_popup)
+        ids.artist_art.bind(on_load=self.on_background_loaded)
+        ids.album_art.bind(on_load=self.on_cover_loaded, on_error=self.on_cover_loaded)
+        self.set_background_image(None)
+        if self.volume_control is None:
+            self.init_volume_control()
+
+    def get_spotify_screen(self):
+        """
+        This function return the spotify screen. The screen is created on the first call.
+        :return: the instance of SpotifyScreen
+        """
+        if not self.screen_manager.has_screen('spotify'):
+            with StartupProfiler.instance().phase('spotify screen'):
+                self.init_spotify_screen()
+        return self.screen_manager.get_screen('spotify')
 
     def init_blank_screen(self):
         """
@@ -176,6 +205,8 @@ class JukeBoxKivyApp(App):
         find the current monitor size and set this as application size. The application
         window is set to a borderless window.
         """
+        from screeninfo import get_monitors
+
         for monitor in get_monitors():
             if monitor.is_primary is True:
                 self.width = monitor.width
@@ -185,30 +216,51 @@ class JukeBoxKivyApp(App):
         Window.borderless = True
         Window.show_cursor = False
 
+    def init_now_playing_service(self):
+        """
+        Create the service which follows the track events and resolves the track information
+        and renders the background image in worker threads. This function must be called
+        after init_window(), because the background image is rendered in the application size.
+        """
+        from ui.backgroundrenderer import BackgroundRenderer
+        from spotify.metadatacache import MetadataCache
+        from spotify.metadataresolver import MetadataResolver
+        from spotify.cacheservice import CacheServiceClient
+
+        self.metadata_cache = MetadataCache()
+        resolver = MetadataResolver(cache=self.metadata_cache)
+        cache_service = CacheServiceClient.from_config(fallback=resolver)
+        self.now_playing_service = NowPlayingService(self.spotify_srv,
+                                                     resolver=cache_service or resolver,
+                                                     renderer=BackgroundRenderer(self.width, self.height,
+                                                                                 proxy=cache_service))
+        self.now_playing_service.add_listener(self.on_now_playing)
+        self.now_playing_service.start()
+
     def init_spotify_server(self):
         """
-        The spotify connect client librespot and the MQTT client is start.
+        The spotify connect client librespot and the MQTT client is start. The function may
+        be called from a background thread, the system message is set on the kivy thread.
         """
         try:
             self.spotify_srv.start()
 
-        except MQTTConnectionRefusedError as err:
-            system_message_label = self.screen_manager.get_screen(self.current_screen).ids.system_message_label
-            system_message_label.text = "Unable to connect to MQTT broker."
-            self.log.write(message=f"{err}", module=self.mod_name, level=Logger.ERROR)
-            self.check_clock = Clock.schedule_interval(self.check_system_state, 2.0)
-
         except SpotifyApiError as err:
-            system_message_label = self.screen_manager.get_screen(self.current_screen).ids.system_message_label
-            system_message_label.text = "Spotify server not started."
+            Clock.schedule_once(partial(self.set_system_message, "Spotify server not started."))
             self.log.write(message=f"{err}", module=self.mod_name, level=Logger.ERROR)
-            self.check_clock = Clock.schedule_interval(self.check_system_state, 2.0)
 
         except Exception as err:
-            system_message_label = self.screen_manager.get_screen(self.current_screen).ids.system_message_label
-            system_message_label.text = "ERR: {err}".format(err=err)
+            Clock.schedule_once(partial(self.set_system_message, "ERR: {err}".format(err=err)))
             self.log.write(message=f"{err}", module=self.mod_name, level=Logger.ERROR)
-            self.check_clock = Clock.schedule_interval(self.check_system_state, 2.0)
+
+    def set_system_message(self, text, dt):
+        """
+        This function show a message in the system message of the current screen.
+        param text: the message
+        param dt: the delta time of the clock event
+        """
+        system_message_label = self.screen_manager.get_screen(self.current_screen).ids.system_message_label
+        system_message_label.text = text
 
     def build(self):
         """
@@ -216,29 +268,74 @@ class JukeBoxKivyApp(App):
         used as the root widget and added to the window.
         :return: ScreenManager Instance as the root widget of the application
         """
+        profiler = StartupProfiler.instance()
         Window.bind(on_request_close=self.on_request_close)
         Window.bind(on_keyboard=self.on_keyboard)
+        Config().start_watching()
 
-        self.spotify_srv.bind(on_track_event=self.on_track_event)
         self.spotify_srv.bind(on_player_event=self.on_player_event)
+        self.spotify_srv.health_monitor.add_listener(self.on_health_changed)
 
-        self.init_window()
-        self.init_blank_screen()
-        self.init_volume_control()
-        self.init_spotify_screen()
-        self.init_spotify_server()
+        with profiler.phase('window'):
+            self.init_window()
+        with profiler.phase('blank screen'):
+            self.init_blank_screen()
 
-        self.set_background_image(None)
         self.screen_manager.transition = FadeTransition()
+        self.screen_manager.transition.bind(on_complete=self.on_transition_complete)
         self.screen_manager.current = 'blank'
 
+        # the services are started after the blank screen is shown
+        Clock.schedule_once(self.on_first_frame)
         return self.screen_manager
 
+    def on_first_frame(self, dt):
+        """
+        This function is called after the first frame and start the services in a background
+        thread.
+        param dt: the delta time of the clock event
+        """
+        StartupProfiler.instance().mark('first frame')
+        threading.Thread(target=self.start_services, name="jukebox-startup", daemon=True).start()
+
+    def start_services(self):
+        """
+        This function open the mixer, create the now playing service and start librespot and
+        the MQTT client. It runs in a background thread, librespot and the MQTT client are
+        started in parallel.
+        """
+        profiler = StartupProfiler.instance()
+        with profiler.phase('mixer'):
+            try:
+                from system.mixerservice import MixerService
+                MixerService.instance()
+            except Exception as err:
+                self.log.write(message="Unable to open the mixer: {err}".format(err=err),
+                               module=self.mod_name,
+                               level=Logger.ERROR)
+        with profiler.phase('now playing service'):
+            self.init_now_playing_service()
+        with profiler.phase('spotify server'):
+            self.init_spotify_server()
+        Clock.schedule_once(self.on_services_started)
+
+    def on_services_started(self, dt):
+        """
+        This function is called when the services are started and write the startup report.
+        param dt: the delta time of the clock event
+        """
+        self.metrics_exporter = MetricsExporter(publish=self.spotify_srv.publish_message)
+        self.metrics_exporter.start()
+
+        profiler = StartupProfiler.instance()
+        profiler.mark('ready')
+        profiler.report()
+
     def on_keyboard(self, window, key, scancode, codepoint, modifier):
         """
         This function is called when a keyboard key is pressed.
         """
-        self.log.write(message=f"on_keyboard({window}, {key}, {scancode}, {codepoint}, {modifier})",
+        self.log.write(message="on_keyboard({0}, {1}, {2}, {3}, {4})", args=(window, key, scancode, codepoint, modifier),
                        module=self.mod_name,
                        level=Logger.DEBUG)
 
@@ -254,7 +351,7 @@ class JukeBoxKivyApp(App):
                 system_message_label = self.screen_manager.get_screen(self.current_screen).ids.system_message_label
                 system_message_label.text = "Restart Spotify client"
                 self.spotify_srv.stop()
-                self.init_spotify_server()
+                threading.Thread(target=self.init_spotify_server, name="jukebox-restart", daemon=True).start()
 
             elif codepoint == 'r':
                 self.log.write(message="reboot the system ...",
@@ -288,314 +385,188 @@ class JukeBoxKivyApp(App):
                        module=self.mod_name,
                        level=Logger.INFO)
         self.spotify_srv.stop()
-
-    def on_track_event(self, *args):
-        """
-        This function is called when a 'track_event' event is received. If the
-        track_id is uneven to the last played track_id, the functions to get information
-        from Spotify API called. The result of this function sis used to display artist,
-        album, track, artist image and album image.
-        """
-        track_id = args[1]
-
-        if self._current_track_id_ != track_id:
-            self._current_track_id_ = track_id
-            self.log.write(message="New track id: {trackid}".format(trackid=track_id),
-                           module=self.mod_name,
-                           level=Logger.INFO)
-            try:
-                _track_ = self.get_track_information(track_id)
-                if _track_ != 404:
-                    self.set_track_information(_track_)
-                else:
-                    _track_ = self.get_episode_information(track_id)
-                    self.set_episode_information(_track_)
-
-            except SpotifyApiError:
-                pass
-
-        self.log.write("{args}".format(args=args), module=self.mod_name, level=Logger.DEBUG)
+        Config().stop_watching()
+        if self.now_playing_service is not None:
+            self.now_playing_service.stop()
+        if self.metrics_exporter is not None:
+            self.metrics_exporter.stop()
 
     def on_player_event(self, *args):
         """
-        This function is called when a 'track_event' event is received. If the event is
+        This function is called when a 'player_event' event is received. If the event is
         'started' the spotify screen is shown. If the event is stopped, the blank screen
         is shown.
         """
-        self.log.write("{args}".format(args=args), module=self.mod_name, level=Logger.DEBUG)
-
         event = args[1]
-        print("Event: {ev}".format(ev=event))
+        self.log.write(message="Player event: {0}", args=(event,), module=self.mod_name, level=Logger.DEBUG)
 
         if event == 'started':
             Clock.schedule_once(self.set_spotify_screen)
         elif event == 'stopped':
             Clock.schedule_once(self.set_blank_screen)
-        else:
-            print("player event: {ev}".format(ev=event))
-
-    def get_artist_information(self, spotify_artist_ids):
-        """
-        This funktion get the information about currently played artist from Spotify API.
-        param spotify_artist_ids:, a Spotify track ID
-        :return: Array of all artists.
-        """
-        if len(spotify_artist_ids) > 0:
-            _artist_ = []
-            for artist_id in spotify_artist_ids:
-                try:
-                    _spotify_ = spotipy.Spotify(client_credentials_manager=SpotifyClientCredentials(
-                        client_id=self.client_id,
-                        client_secret=self.client_secret
-                    ))
-                    _artist_.append(_spotify_.artist(artist_id))
-                    return _artist_
-
-                except Exception as error:
-                    self.log.write(message="{error}".format(error=error),
-                                   module=self.mod_name,
-                                   level=Logger.ERROR)
-                    raise SpotifyApiError
-
-    def get_audio_features(self, spotify_track_id):
-        """
-        This function get the audio features of the currently played track from Spotify API.
-        param spotify_track_id: a Spotify track ID
-        :return: Array with audio features
-        """
-        if spotify_track_id:
-            try:
-                _spotify_ = spotipy.Spotify(client_credentials_manager=SpotifyClientCredentials(
-                    client_id=self.client_id,
-                    client_secret=self.client_secret
-                ))
-                _audio_features_ = _spotify_.audio_features(spotify_track_id)
-                self.log.write(message="{0}".format(_audio_features_),
-                               module=self.mod_name,
-                               level=Logger.DEBUG)
-                return _audio_features_
-            except Exception as err:
-                self.log.write("Unable to get audio features from Spotify: {err}".format(err=err))
-                raise SpotifyApiError
 
-    def get_episode_information(self, spotify_id):
+    def on_now_playing(self, now_playing):
         """
-        This function get information about the current played episode of a podcast by using
-        the spotify id and return it in a dictionary
+        This function is called by the now playing service from a worker thread when the
+        information of a track or episode is resolved. The update of the screen is
+        scheduled on the kivy thread. A track which is restored from the now playing record
+        and still playing switches to the spotify screen.
+        param now_playing: the now playing dictionary of the metadata pipeline
         """
-        self.log.write(message="Episode ID: {spotify_id}".format(spotify_id=spotify_id),
-                       module=self.mod_name,
-                       level=Logger.DEBUG)
-        if spotify_id:
-            try:
-                _spotify_ = spotipy.Spotify(client_credentials_manager=SpotifyClientCredentials(
-                    client_id=self.client_id,
-                    client_secret=self.client_secret
-                ))
+        Clock.schedule_once(partial(self.set_now_playing, now_playing))
+        if now_playing.get('playing'):
+            Clock.schedule_once(self.set_spotify_screen)
 
-                _episode_ = _spotify_.episode(spotify_id, 'DE')
+    def set_now_playing(self, now_playing, dt):
+        """
+        This function display the resolved information of a track or episode and its
+        background image in one update.
+        param now_playing: the now playing record of the metadata pipeline
+        param dt: the delta time of the clock event
+        """
+        if now_playing.get('type') is None:
+            return
 
-                return _episode_
-            
-            except Exception as err:
-                if err.args[0] == 404:
-                    self.log.write(message=err.args[2],
-                                   module=self.mod_name,
-                                   level=Logger.INFO)
-                    return 404
-                else:
-                    self.log.write(message="Unable to get information from Spotify: {err}".format(err=err),
-                                   module=self.name,
-                                   level=Logger.ERROR)
-                    raise SpotifyApiError
-
-    def get_track_information(self, spotify_track_id):
-        """
-        This function get information about the current track by using the trackid and publish
-        via MQTT message with topic spotify/track_information.
-        """
-        self.log.write(message="Track ID: {trackid}".format(trackid=spotify_track_id),
-                       module=self.name,
-                       level=Logger.DEBUG)
-        if spotify_track_id:
-            try:
-                _spotify_ = spotipy.Spotify(client_credentials_manager=SpotifyClientCredentials(
-                    client_id=self.client_id,
-                    client_secret=self.client_secret
-                ))
-
-                _track_ = _spotify_.track(spotify_track_id, None)
-                track = {
-                    'artist': _track_.get('artists', None),
-                    'album': _track_.get('album', None),
-                    'track': _track_.get('name', spotify_track_id),
-                    'image': _track_.get('album', None).get('images', None)
-                }
-                self.log.write(message="Track information received from Spotify.",
-                               module=self.name,
-                               level=Logger.INFO)
-                self.log.write(message="{track}".format(track=track),
-                               module=self.name,
-                               level=Logger.DEBUG)
-                return track
+        self.set_information(now_playing)
+        self.set_background_image(now_playing.get('background'))
 
-            except Exception as err:
-                if err.args[0] == 404:
-                    self.log.write(message=err.args[2],
-                                   module=self.mod_name,
-                                   level=Logger.INFO)
-                    return 404
-
-                else:
-                    self.log.write(message="Unable to get information from Spotify: {err}".format(err=err),
-                                   module=self.name,
-                                   level=Logger.ERROR)
-                    raise SpotifyApiError(err.args)
-
-    def set_episode_information(self, episode):
-        show = episode.get('show', [])
-
-        artist_label = self.screen_manager.get_screen('spotify').ids.artist_label
-        artist_label.text = show.get('publisher', '')
-
-        album_label = self.screen_manager.get_screen('spotify').ids.album_label
-        album_label.text = show.get('name', '')
-
-        title_label = self.screen_manager.get_screen('spotify').ids.title_label
-        title_label.text = episode.get('name', '')
-
-        description_label = self.screen_manager.get_screen('spotify').ids.description_label
-        description = episode.get('description', "")
-        wrapper = TextWrapper()
-        description_label.width = self.width
-        description_label.text = "\n".join(wrapper.wrap(description))
-
-        for img in episode.get('images', []):
-            if img.get('height') == 640:  # 640, 300 or 64 possible
-                self.screen_manager.get_screen('spotify').ids.album_art.source = img.get('url')
-                break
-
-        self.set_background_image(show.get('images', []))
-
-    def set_track_information(self, track):
-        artist = track['artist']
-        artist_names = []
-        artist_ids = []
-        for item in artist:
-            artist_names.append(item.get('name'))
-            artist_ids.append(item.get('id'))
-        artist_label = self.screen_manager.get_screen('spotify').ids.artist_label
-        artist_label.text = " ".join(artist_names)
-        artists = self.get_artist_information(artist_ids)
-        self.set_background_image(artists[0].get('images'))
-
-        album = track['album']
-        self.log.write(message="New Album: {album}".format(album=album),
+    def set_information(self, now_playing):
+        """
+        This function display the artists, the album or show, the title, the description and
+        the cover of a track or episode. The labels are changed together by the view model.
+        param now_playing: the now playing record of the metadata pipeline
+        """
+        if now_playing['description']:
+            description_width = self.width
+            description = "\n".join(TextWrapper().wrap(now_playing['description']))
+        else:
+            description_width = 0
+            description = ""
+
+        self.view_model.update({
+            ('artist_label', 'text'): " ".join(name for name in now_playing['artist_names'] if name),
+            ('album_label', 'text'): now_playing['subtitle'],
+            ('title_label', 'text'): now_playing['title'],
+            ('description_label', 'width'): description_width,
+            ('description_label', 'text'): description,
+        })
+
+        self.log.write(message="Now playing: {0} - {1}", args=(now_playing['subtitle'], now_playing['title']),
                        module=self.mod_name,
                        level=Logger.INFO)
-        album_label = self.screen_manager.get_screen('spotify').ids.album_label
-        album_label.text = album['name']
-
-        title = track['track']
-        title_label = self.screen_manager.get_screen('spotify').ids.title_label
-        title_label.text = title
 
-        description_label = self.screen_manager.get_screen('spotify').ids.description_label
-        description_label.width = 0
-        description_label.text = ""
+        self.set_cover(now_playing['cover'])
 
-        for img in track['image']:
-            if img.get('height') == 640:  # 640, 300 or 64 possible
-                self.screen_manager.get_screen('spotify').ids.album_art.source = img.get('url')
-                break
-
-    def set_background_image(self, images):
+    def set_cover(self, cover):
         """
-        This function change the background image. The biggest image is downloadet and modified
-        to fit the application size.
-        param images: an array of images. Each image is a dict get from Spotify API
+        This function display the cover progressively: the smallest image is shown at once and
+        replaced by the smallest image which covers the album art, when it is loaded.
+        param cover: an array of images. Each image is a dict get from Spotify API
         """
-        file_list = glob.glob("/tmp/*_{appname}.png".format(appname=Config.DEFAULT_APPNAME))
-        for tmp_file in file_list:
-            os.remove(tmp_file)
+        from ui.backgroundrenderer import BackgroundRenderer
 
-        if images is None:
-            artist_art = self.screen_manager.get_screen('spotify').ids.artist_art
-            artist_art.source = "{0}/default/wallpapers/one_pixel.png".format(self.kv_file_dir)
+        album_art = self.get_spotify_screen().ids.album_art
+        target = BackgroundRenderer.fit_image(cover, album_art.width, album_art.height)
+        preview = min(cover or [], key=lambda img: img.get('width') or 0, default=None)
+        if target is None:
             return
 
-        # create a random string as part of the filename
-        random_string = ''
-        for _ in range(10):
-            random_integer = random.randint(97, 97 + 26 - 1)
-            flip_bit = random.randint(0, 1)
-            random_integer = random_integer - 32 if flip_bit == 1 else random_integer
-            random_string += (chr(random_integer))
-
-        bg_image = "/tmp/{rnd_str}_{appname}.png".format(rnd_str=random_string, appname=Config.DEFAULT_APPNAME)
-        image = None
-        for img in images:
-            if image is None or image.get('width') < img.get('width'):
-                image = img
-
-        self.log.write(message="Use Artist background image {image}".format(image=image),
-                       module=self.mod_name,
-                       level=Logger.DEBUG)
+        self._cover_target_ = target.get('url')
+        if preview is not None and preview is not target and \
+                self.view_model.get('album_art', 'source') != self._cover_target_:
+            self.view_model.set('album_art', 'source', preview.get('url'))
+        else:
+            self.view_model.set('album_art', 'source', self._cover_target_)
 
-        if image is not None:
-            try:
-                urllib.request.urlretrieve(image.get('url'), bg_image)
-            except Exception as err:
-                self.log.write(message="{err}".format(err=err))
-                return
+    def on_cover_loaded(self, *args):
+        """
+        This function is called when the cover image is loaded or failed to load and replace
+        the preview by the selected cover image.
+        """
+        if self._cover_target_ is not None and self.view_model.get('album_art', 'source') != self._cover_target_:
+            self.view_model.set('album_art', 'source', self._cover_target_)
 
-            img = Image.open(bg_image)
-            img = img.resize((self.width, self.width), Image.BOX)
-            img = img.crop((0, 0, self.width, self.height))
-            img.save(bg_image)
+    def set_background_image(self, bg_image):
+        """
+        This function change the background image. The image is rendered by the metadata
+        pipeline to fit the application size.
+        param bg_image: the path of the rendered background image or None
+        """
+        if bg_image is None:
+            self.view_model.set('artist_art', 'source', "{0}/default/wallpapers/one_pixel.png".format(self.kv_file_dir))
+        elif self.view_model.get('artist_art', 'source') != bg_image:
+            self._texture_load_started_ = time.perf_counter()
+            self.view_model.set('artist_art', 'source', bg_image)
 
-            artist_art = self.screen_manager.get_screen('spotify').ids.artist_art
-            artist_art.source = bg_image
+    def on_background_loaded(self, *args):
+        """
+        This function is called when the texture of the background image is loaded and
+        record the load time in the metrics.
+        """
+        if self._texture_load_started_ is not None:
+            Metrics.instance().observe('jukebox_texture_load_seconds', time.perf_counter() - self._texture_load_started_)
+            self._texture_load_started_ = None
 
     def set_spotify_screen(self, dt):
         """
         This function set the current screen to the spotify screen.
         """
-        self.current_screen = 'spotify'
-        self.screen_manager.current = self.current_screen
+        self.set_screen('spotify')
 
     def set_blank_screen(self, dt):
         """
         This function set the current screen to the blank screen.
         """
-        self.current_screen = 'blank'
+        self.set_screen('blank')
+
+    def set_screen(self, name):
+        """
+        This function change the current screen. The duration of the transition is recorded
+        in the metrics.
+        param name: the name of the screen, 'spotify' or 'blank'
+        """
+        if name == 'spotify':
+            self.get_spotify_screen()
+        if self.screen_manager.current != name:
+            self._transition_started_ = time.perf_counter()
+        self.current_screen = name
         self.screen_manager.current = self.current_screen
 
-    def check_system_state(self, dt):
+    def on_transition_complete(self, *args):
+        """
+        This function is called by the screen manager when a transition is complete.
+        """
+        if self._transition_started_ is not None:
+            Metrics.instance().observe('jukebox_screen_transition_seconds', time.perf_counter() - self._transition_started_,
+                                       {'screen': self.current_screen})
+            self._transition_started_ = None
+
+    def on_health_changed(self, state):
         """
-        This function check teh state of the spotify connect server and the
-        systemd service mosquitto.
+        This function is called by the health monitor of the spotify connect server when the
+        state of librespot or the MQTT broker changed. It is called from a background thread,
+        so the system message is updated in the next frame.
+        param state: a dictionary which maps the components to True (healthy) or False
+        """
+        Clock.schedule_once(partial(self.set_system_state, state))
+
+    def set_system_state(self, state, dt):
+        """
+        This function show the state of the spotify connect server and the MQTT broker in
+        the system message. The state of the broker is only reported, if the events are
+        transported over the MQTT broker.
+        param state: a dictionary which maps the components to True (healthy) or False
         """
-        state = {
-            'librespot': self.spotify_srv.running,
-            'mosquitto': SystemControl().get_mosquitto_status()
-        }
         system_message_label = self.screen_manager.get_screen(self.current_screen).ids.system_message_label
         spotify_message = ""
         mqtt_message = ""
-        if state['librespot'] is True and state['mosquitto'] is True:
-            system_message_label.text = ""
-            self.check_clock.cancel()
+        if state.get(HealthMonitor.LIBRESPOT) is False:
+            spotify_message = "The Spotify Server is not running. "
+        if state.get(HealthMonitor.BROKER) is False:
+            mqtt_message = "The MQTT Broker is not running. "
+
+        if spotify_message or mqtt_message:
+            system_message_label.text = "{spotify} {mqtt}".format(spotify=spotify_message, mqtt=mqtt_message)
         else:
-            if state['librespot'] is False:
-                spotify_message = "The Spotify Server is not running. "
-            else:
-                spotify_message = ""
-            if state['mosquitto'] is False:
-                mqtt_message = "The MQTT Broker is not running. "
-            else:
-                mqtt_message = ""
-        system_message_label.text = "{spotify} {mqtt}".format(spotify=spotify_message, mqtt=mqtt_message)
-
-        return state
+            system_message_label.text = ""
 
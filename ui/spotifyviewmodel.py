@@ -0,0 +1,90 @@
+import threading
+
+from kivy.clock import Clock
+
+from system.metrics import Metrics
+
+
+class SpotifyViewModel:
+    """
+    The class 'SpotifyViewModel' collects the changes of the widgets of the spotify screen,
+    e.g. the labels of a new track, its cover and its background image, and applies them
+    together in one clock trigger before the next frame. A value which is set several times
+    before the frame is written once with its last value and a value which equals the
+    property of the widget is not written, so the texture of a label is rendered once per
+    change and the screen is never shown half updated.
+    The changes are addressed by the id of the widget in spotify.kv and the name of the
+    property:
+        view_model.set('title_label', 'text', now_playing['title'])
+    """
+
+    def __init__(self, screen):
+        """
+        Initialize self. See help(self) for accurate signature.
+        param screen: a callable which returns the spotify screen, it is called on the kivy
+            thread when the changes are applied
+        """
+        self._screen_ = screen
+        self._lock_ = threading.Lock()
+        self._pending_ = {}
+        self._trigger_ = Clock.create_trigger(self.apply)
+
+    def set(self, widget_id, name, value):
+        """
+        This function set a property of a widget with the next frame.
+        param widget_id: the id of the widget in spotify.kv, e.g. title_label
+        param name: the name of the property, e.g. text
+        param value: the new value of the property
+        """
+        self.update({(widget_id, name): value})
+
+    def update(self, changes):
+        """
+        This function set several properties with the next frame. The properties are
+        written in the order of the dictionary, e.g. the width of a label before its text.
+        param changes: a dictionary which maps tuples of the widget id and the property
+            name to the new values
+        """
+        with self._lock_:
+            for key, value in changes.items():
+                # a value set again moves to the end, so the order of the last update is kept
+                self._pending_.pop(key, None)
+                self._pending_[key] = value
+        self._trigger_()
+
+    def get(self, widget_id, name):
+        """
+        This function return the value of a property, the pending value if it is not
+        applied yet, otherwise the value of the widget. It must be called on the kivy thread.
+        param widget_id: the id of the widget in spotify.kv
+        param name: the name of the property
+        :return: the value of the property
+        """
+        with self._lock_:
+            if (widget_id, name) in self._pending_:
+                return self._pending_[(widget_id, name)]
+        return getattr(self._screen_().ids[widget_id], name)
+
+    def apply(self, *args):
+        """
+        This function write the pending changes to the widgets. It is called by the clock
+        trigger once per frame.
+        """
+        with self._lock_:
+            pending = self._pending_
+            self._pending_ = {}
+        if not pending:
+            return
+
+        ids = self._screen_().ids
+        written = 0
+        for (widget_id, name), value in pending.items():
+            widget = ids[widget_id]
+            if getattr(widget, name) != value:
+                setattr(widget, name, value)
+                written += 1
+
+        metrics = Metrics.instance()
+        metrics.increment('jukebox_view_updates_total')
+        metrics.increment('jukebox_view_properties_total', {'result': 'written'}, written)
+        metrics.increment('jukebox_view_properties_total', {'result': 'unchanged'}, len(pending) - written)
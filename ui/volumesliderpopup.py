@@ -17,12 +17,15 @@ class VolumeSliderPopup(Popup):
         of his parent
         :param kwargs:
             screenmanager: the ScreenManager instance of the app
+            volume_control: the VolumeControl instance of the app, if not given a new one is created
         """
         self.screenmanager = kwargs.get('screenmanager', None)
         self.kv_file_dir = Config.DEFAULT_KV_DIR
         self.slider = ObjectProperty()
         self.mute_btn = ObjectProperty()
-        self.volume_control = VolumeControl(screenmanager=self.screenmanager)
+        self.volume_control = kwargs.get('volume_control', None)
+        if self.volume_control is None:
+            self.volume_control = VolumeControl(screenmanager=self.screenmanager)
 
         super(VolumeSliderPopup, self).__init__()
 
@@ -37,6 +40,7 @@ class VolumeSliderPopup(Popup):
         self.slider.max = 100
         self.slider.value = self.volume_control.get_volume()
         self.slider.bind(value=self.on_value)
+        self.volume_control.bind(on_volume_changed=self.on_volume_changed)
 
     def init_mute_button(self):
         """
@@ -59,6 +63,18 @@ class VolumeSliderPopup(Popup):
         """
         self.volume_control.set_volume(int(value))
 
+    def on_volume_changed(self, instance, volume):
+        """
+        The callback function will be called if the volume changed, e.g. by another program.
+        The slider follows the volume without writing it back to the mixer.
+        :param instance: reference to the volume control
+        :param volume: the current volume as integer
+        """
+        if int(self.slider.value) != volume:
+            self.slider.unbind(value=self.on_value)
+            self.slider.value = volume
+            self.slider.bind(value=self.on_value)
+
     def on_mute_toggle(self, dt):
         """
         This function is the callback for the mute button and toggle the mute state of the system.